@@ -0,0 +1,11 @@
+import pytest
+from django.conf import settings
+
+
+@pytest.fixture(autouse=True, scope='session')
+def strict_query_budgets():
+    """
+    Под py.test, как и под core.test_runner, превышение бюджета запросов
+    роняет тест.
+    """
+    settings.QUERY_BUDGET_STRICT = True
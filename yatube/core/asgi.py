@@ -0,0 +1,185 @@
+import asyncio
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+
+def environ(scope, body):
+    """Окружение WSGI для HTTP-запроса ASGI; body — файл с телом запроса."""
+    server_name, server_port = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    result = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', ''),
+        # В WSGI путь передаётся байтами, прочитанными как latin-1.
+        'PATH_INFO': scope['path'].encode().decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server_name,
+        'SERVER_PORT': str(server_port),
+        'SERVER_PROTOCOL': 'HTTP/' + scope.get('http_version', '1.1'),
+        'REMOTE_ADDR': client[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', ()):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = 'HTTP_' + name
+        value = value.decode('latin-1')
+        if name in result:
+            value = f'{result[name]},{value}'
+        result[name] = value
+    return result
+
+
+def _next_chunk(chunks):
+    # Соединения с базой у Django свои в каждом потоке, а куски потокового
+    # ответа читают разные потоки пула. Поток, открывший соединение ради
+    # куска, отдаёт его сразу, как в конце обычного запроса.
+    try:
+        return next(chunks, None)
+    finally:
+        close_old_connections()
+
+
+def _close(result):
+    # Здесь Django шлёт request_finished и закрывает соединения с базой,
+    # открытые этим потоком.
+    close = getattr(result, 'close', None)
+    if close is not None:
+        close()
+
+
+class ASGIHandler:
+    """
+    Точка входа ASGI для Django 2.2, в которой своего ASGI ещё нет.
+    Тело запроса читается и ответ отдаётся клиенту в цикле событий, а
+    Django с его синхронными представлениями и запросами к базе работает
+    в ограниченном пуле потоков. Медленный клиент поэтому занимает только
+    соединение, а не поток с представлением. Асинхронных представлений
+    в Django 2.2 нет: их даст только переход на Django 3.1+.
+    """
+
+    def __init__(self, application, threads=None):
+        self.application = application
+        self.executor = ThreadPoolExecutor(
+            max_workers=threads or settings.ASGI_THREADS,
+            thread_name_prefix='asgi',
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            raise ValueError(f'Неподдерживаемый тип {scope["type"]}')
+        body = await self.read_body(receive)
+        if body is None:
+            return
+        loop = asyncio.get_running_loop()
+        with body:
+            status, headers, result = await loop.run_in_executor(
+                self.executor, self.run, scope, body
+            )
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': headers,
+        })
+        if isinstance(result, list):
+            for chunk in result:
+                await self.send_chunk(send, chunk)
+        else:
+            await self.stream(loop, result, send)
+        await send({'type': 'http.response.body', 'body': b''})
+
+    async def send_chunk(self, send, chunk):
+        await send({
+            'type': 'http.response.body',
+            'body': chunk,
+            'more_body': True,
+        })
+
+    async def stream(self, loop, result, send):
+        """
+        Отдаёт потоковый ответ по мере чтения: каждый кусок берётся из
+        итератора в пуле потоков и сразу уходит клиенту, поток между
+        кусками свободен. Ответ закрывается и при обрыве соединения, а
+        соединения с базой каждый поток закрывает за собой.
+        """
+        chunks = iter(result)
+        try:
+            while True:
+                chunk = await loop.run_in_executor(
+                    self.executor, _next_chunk, chunks
+                )
+                if chunk is None:
+                    return
+                if chunk:
+                    await self.send_chunk(send, chunk)
+        finally:
+            await loop.run_in_executor(self.executor, _close, result)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def read_body(self, receive):
+        """
+        Тело запроса во временном файле, большие загрузки — на диске.
+        None, если клиент ушёл, не дослав тело.
+        """
+        body = tempfile.SpooledTemporaryFile(
+            max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+        )
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                body.close()
+                return None
+            body.write(message.get('body', b''))
+            if not message.get('more_body', False):
+                body.seek(0)
+                return body
+
+    def run(self, scope, body):
+        """
+        Выполняет запрос в потоке пула. Обычный ответ Django уже целиком
+        в памяти: он собирается и закрывается здесь же, в потоке
+        представления. Потоковый ответ (StreamingHttpResponse,
+        FileResponse) возвращается как есть, его читает stream().
+        """
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = [
+                (name.lower().encode('latin-1'), value.encode('latin-1'))
+                for name, value in headers
+            ]
+
+        result = self.application(environ(scope, body), start_response)
+        if getattr(result, 'streaming', False):
+            # Ответ закроет другой поток, и request_finished не дойдёт до
+            # соединений этого: они закрываются здесь.
+            close_old_connections()
+            return response['status'], response['headers'], result
+        try:
+            content = [chunk for chunk in result if chunk]
+        finally:
+            _close(result)
+        return response['status'], response['headers'], content
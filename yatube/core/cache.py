@@ -0,0 +1,639 @@
+import os
+import pickle
+import random
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.cache.backends.locmem import LocMemCache
+
+from . import metrics
+
+_missing = object()
+
+
+class InstrumentedCacheMixin:
+    """Передаёт число попаданий и промахов кэша в метрики запроса."""
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, _missing, version)
+        hit = value is not _missing
+        metrics.record_cache(hit, not hit)
+        return value if hit else default
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        values = super().get_many(keys, version)
+        metrics.record_cache(len(values), len(keys) - len(values))
+        return values
+
+
+class InstrumentedLocMemCache(InstrumentedCacheMixin, LocMemCache):
+    pass
+
+
+# Ключ в журнале сбросов, который означает «очистить L1 целиком».
+CLEAR_ALL = '*'
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS cache (
+    key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL
+);
+CREATE TABLE IF NOT EXISTS invalidations (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT NOT NULL,
+    origin INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS stats (
+    name TEXT PRIMARY KEY, value INTEGER NOT NULL
+);
+'''
+TIERS = ('l1_hits', 'l2_hits', 'misses')
+RATIOS = ('l1_ratio', 'l2_ratio', 'miss_ratio')
+# Сколько ключей читается из L2 одним запросом.
+BATCH_SIZE = 500
+
+
+class _LRU:
+    """
+    Кэш L1 одного процесса: последние прочитанные значения в памяти.
+    generation растёт при каждом изменении, по нему видно, не поменялось
+    ли что-то, пока значение читалось из L2.
+    """
+
+    def __init__(self, max_entries, timeout):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.entries = OrderedDict()
+        self.generation = 0
+
+    def get(self, key, now):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        value, expires, deadline = entry
+        if deadline <= now or (expires is not None and expires <= now):
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return value
+
+    def set(self, key, value, expires, now):
+        self.generation += 1
+        self.entries[key] = (value, expires, now + self.timeout)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def discard(self, key):
+        self.generation += 1
+        self.entries.pop(key, None)
+
+    def clear(self):
+        self.generation += 1
+        self.entries.clear()
+
+
+class TieredCache(BaseCache):
+    """
+    Двухуровневый кэш для нескольких процессов одного хоста. L2 — файл
+    SQLite в режиме WAL из LOCATION, общий для всех процессов; L1 —
+    небольшой LRU в памяти процесса перед ним. Каждая запись в L2
+    попадает в журнал сбросов. Процесс замечает чужие записи по
+    PRAGMA data_version, которая меняется после чужого коммита, и тогда
+    выбрасывает из L1 ключи из журнала. Значения хранятся в pickle, в том
+    числе в L1, поэтому изменение полученного объекта не портит кэш.
+
+    OPTIONS: MAX_ENTRIES и CULL_FREQUENCY — для L2, L1_MAX_ENTRIES,
+    L1_TIMEOUT (предельный возраст записи L1, в секундах),
+    LOG_SIZE (сколько записей журнала хранить) и STATS_INTERVAL (как часто
+    процесс добавляет свою статистику попаданий в общую).
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.path = location
+        self.log_size = int(options.get('LOG_SIZE', 10000))
+        self.stats_interval = float(options.get('STATS_INTERVAL', 10))
+        self.l1 = _LRU(
+            int(options.get('L1_MAX_ENTRIES', 1000)),
+            float(options.get('L1_TIMEOUT', 300)),
+        )
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        self._pid = None
+        # Отличает записи этого экземпляра в журнале от чужих.
+        self._origin = None
+        self._seen = 0
+        self._counts = dict.fromkeys(TIERS, 0)
+        self._flushed = time.monotonic()
+
+    # Соединение и журнал сбросов.
+
+    def _db(self):
+        local = self._local
+        pid = os.getpid()
+        if getattr(local, 'pid', None) != pid:
+            if pid != self._pid:
+                # После fork память L1 досталась от родителя, а журнал
+                # процесс будет читать со своего места.
+                with self._lock:
+                    self._pid = pid
+                    self._origin = random.getrandbits(62)
+                    self.l1.clear()
+                    self._counts = dict.fromkeys(TIERS, 0)
+            db = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            db.execute('PRAGMA journal_mode = WAL')
+            db.execute('PRAGMA synchronous = NORMAL')
+            db.executescript(SCHEMA)
+            local.db, local.pid, local.data_version = db, pid, None
+            with self._lock:
+                if not self._seen:
+                    self._seen = db.execute(
+                        'SELECT COALESCE(MAX(seq), 0) FROM invalidations'
+                    ).fetchone()[0]
+        return local.db
+
+    def _sync(self, db):
+        """Выбрасывает из L1 ключи, которые изменили другие процессы."""
+        data_version = db.execute('PRAGMA data_version').fetchone()[0]
+        if data_version == self._local.data_version:
+            return
+        self._local.data_version = data_version
+        with self._lock:
+            rows = db.execute(
+                'SELECT seq, key, origin FROM invalidations WHERE seq > ? '
+                'ORDER BY seq', (self._seen,)
+            ).fetchall()
+            if not rows:
+                return
+            if rows[0][0] > self._seen + 1:
+                # Журнал успели обрезать: неизвестно, что пропущено.
+                self.l1.clear()
+            for seq, key, origin in rows:
+                if origin == self._origin:
+                    continue
+                if key == CLEAR_ALL:
+                    self.l1.clear()
+                else:
+                    self.l1.discard(key)
+            self._seen = rows[-1][0]
+
+    @contextmanager
+    def _write(self, keys):
+        """Транзакция записи в L2, которая заносит keys в журнал."""
+        db = self._db()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            yield db
+            db.executemany(
+                'INSERT INTO invalidations (key, origin) VALUES (?, ?)',
+                [(key, self._origin) for key in keys],
+            )
+            last = db.execute('SELECT last_insert_rowid()').fetchone()[0]
+            if last // 1000 != (last - len(keys)) // 1000:
+                db.execute('DELETE FROM invalidations WHERE seq <= ?',
+                           (last - self.log_size,))
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._counts[name] += amount
+
+    def _flush_stats(self, db, force=False):
+        now = time.monotonic()
+        if not force and now - self._flushed < self.stats_interval:
+            return
+        with self._lock:
+            counts, self._counts = self._counts, dict.fromkeys(TIERS, 0)
+            self._flushed = now
+        db.executemany(
+            'INSERT INTO stats (name, value) VALUES (?, ?) '
+            'ON CONFLICT (name) DO UPDATE SET value = value + excluded.value',
+            [(name, value) for name, value in counts.items() if value],
+        )
+
+    # Значения.
+
+    def _read(self, keys):
+        """Значения keys в pickle: сначала из L1, остальное из L2."""
+        db = self._db()
+        self._sync(db)
+        now = time.time()
+        found, missing = {}, []
+        with self._lock:
+            generation = self.l1.generation
+            for key in keys:
+                value = self.l1.get(key, now)
+                if value is None:
+                    missing.append(key)
+                else:
+                    found[key] = value
+        self._count('l1_hits', len(found))
+        if missing:
+            rows = []
+            for start in range(0, len(missing), BATCH_SIZE):
+                batch = missing[start:start + BATCH_SIZE]
+                rows += db.execute(
+                    'SELECT key, value, expires FROM cache WHERE key IN ({}) '
+                    'AND (expires IS NULL OR expires > ?)'.format(
+                        ', '.join('?' * len(batch))),
+                    batch + [now],
+                ).fetchall()
+            with self._lock:
+                # Если L1 за это время менялся, прочитанное могло
+                # устареть: в L1 оно не попадает.
+                keep = self.l1.generation == generation
+                for key, value, expires in rows:
+                    if keep:
+                        self.l1.set(key, value, expires, now)
+                    found[key] = value
+            self._count('l2_hits', len(rows))
+            self._count('misses', len(missing) - len(rows))
+        self._flush_stats(db)
+        return found
+
+    def _store(self, db, key, value, expires):
+        with self._lock:
+            self.l1.set(key, value, expires, time.time())
+        if self._max_entries and random.randrange(100) == 0:
+            self._cull(db)
+
+    def _cull(self, db):
+        db.execute('DELETE FROM cache WHERE expires <= ?', (time.time(),))
+        count = db.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        if count > self._max_entries:
+            db.execute(
+                'DELETE FROM cache WHERE key IN (SELECT key FROM cache '
+                'ORDER BY expires IS NULL, expires LIMIT ?)',
+                (count // self._cull_frequency,),
+            )
+
+    def get(self, key, default=None, version=None):
+        key = self.make_key(key, version)
+        self.validate_key(key)
+        value = self._read([key]).get(key)
+        return default if value is None else pickle.loads(value)
+
+    def get_many(self, keys, version=None):
+        made = {self.make_key(key, version): key for key in keys}
+        for key in made:
+            self.validate_key(key)
+        return {
+            made[key]: pickle.loads(value)
+            for key, value in self._read(list(made)).items()
+        }
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout, version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self.get_backend_timeout(timeout)
+        rows = []
+        for key, value in data.items():
+            key = self.make_key(key, version)
+            self.validate_key(key)
+            rows.append((key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL)))
+        with self._write([key for key, _ in rows]) as db:
+            db.executemany(
+                'INSERT OR REPLACE INTO cache (key, value, expires) '
+                'VALUES (?, ?, ?)',
+                [(key, value, expires) for key, value in rows],
+            )
+            for key, value in rows:
+                self._store(db, key, value, expires)
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version)
+        self.validate_key(key)
+        value = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        expires = self.get_backend_timeout(timeout)
+        with self._write([key]) as db:
+            added = db.execute(
+                'INSERT INTO cache (key, value, expires) VALUES (?, ?, ?) '
+                'ON CONFLICT (key) DO UPDATE SET value = excluded.value, '
+                'expires = excluded.expires WHERE cache.expires <= ?',
+                (key, value, expires, time.time()),
+            ).rowcount
+            if added:
+                self._store(db, key, value, expires)
+        return bool(added)
+
+    def incr(self, key, delta=1, version=None):
+        """Атомарно для всех процессов: чтение и запись в одной транзакции."""
+        key = self.make_key(key, version)
+        self.validate_key(key)
+        with self._write([key]) as db:
+            row = db.execute(
+                'SELECT value, expires FROM cache WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)', (key, time.time())
+            ).fetchone()
+            if row is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(row[0]) + delta
+            stored = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+            db.execute('UPDATE cache SET value = ? WHERE key = ?',
+                       (stored, key))
+            self._store(db, key, stored, row[1])
+        return value
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version)
+        self.validate_key(key)
+        with self._write([key]) as db:
+            touched = db.execute(
+                'UPDATE cache SET expires = ? WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)',
+                (self.get_backend_timeout(timeout), key, time.time()),
+            ).rowcount
+            with self._lock:
+                self.l1.discard(key)
+        return bool(touched)
+
+    def has_key(self, key, version=None):
+        key = self.make_key(key, version)
+        self.validate_key(key)
+        return key in self._read([key])
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version)
+
+    def delete_many(self, keys, version=None):
+        keys = [self.make_key(key, version) for key in keys]
+        for key in keys:
+            self.validate_key(key)
+        if not keys:
+            return
+        with self._write(keys) as db:
+            db.executemany('DELETE FROM cache WHERE key = ?',
+                           [(key,) for key in keys])
+            with self._lock:
+                for key in keys:
+                    self.l1.discard(key)
+
+    def clear(self):
+        with self._write([CLEAR_ALL]) as db:
+            db.execute('DELETE FROM cache')
+            with self._lock:
+                self.l1.clear()
+
+    def stats(self):
+        """
+        Попадания в L1 и L2 и промахи всех процессов вместе, с долями.
+        Статистика этого процесса сначала добавляется к общей.
+        """
+        db = self._db()
+        self._flush_stats(db, force=True)
+        totals = dict.fromkeys(TIERS, 0)
+        totals.update(db.execute('SELECT name, value FROM stats'))
+        requests = sum(totals.values())
+        for name, ratio in zip(TIERS, RATIOS):
+            totals[ratio] = (
+                round(totals[name] / requests, 4) if requests else 0
+            )
+        totals['entries'] = db.execute(
+            'SELECT COUNT(*) FROM cache').fetchone()[0]
+        return totals
+
+
+class InstrumentedTieredCache(InstrumentedCacheMixin, TieredCache):
+    pass
+
+
+# Хранилища NamespacedLRUCache по LOCATION: экземпляры бэкенда создаются
+# в каждом потоке, а данные у них общие, как у LocMemCache.
+_stores = {}
+_stores_lock = threading.Lock()
+# Область для ключей, которые не подошли ни под один префикс.
+DEFAULT_NAMESPACE = 'default'
+
+
+class _Namespace:
+    """Записи одной области в порядке обращения, с бюджетом в байтах."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        # Ключ -> (данные, сжаты ли, срок, размер).
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key, now):
+        entry = self.entries.get(key)
+        if entry is not None and entry[2] is not None and entry[2] <= now:
+            self.pop(key)
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return entry
+
+    def put(self, key, entry):
+        self.pop(key)
+        if entry[3] > self.max_bytes:
+            # Значение больше всего бюджета вытеснило бы всё остальное.
+            self.evictions += 1
+            return
+        self.entries[key] = entry
+        self.bytes += entry[3]
+        while self.bytes > self.max_bytes:
+            _, old = self.entries.popitem(last=False)
+            self.bytes -= old[3]
+            self.evictions += 1
+
+    def pop(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry[3]
+        return entry
+
+    def clear(self):
+        self.entries.clear()
+        self.bytes = 0
+
+    def stats(self):
+        requests = self.hits + self.misses
+        return {
+            'entries': len(self.entries),
+            'bytes': self.bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / requests, 4) if requests else 0,
+            'evictions': self.evictions,
+        }
+
+
+class NamespacedLRUCache(BaseCache):
+    """
+    Кэш в памяти процесса, поделённый на области по префиксу ключа. У
+    каждой области свой бюджет в байтах и своё вытеснение давно не
+    читанных записей, поэтому большие фрагменты страниц не вытесняют
+    мелкие частые ключи вроде записей о миниатюрах. Значения больше
+    COMPRESS_MIN_SIZE байт в pickle сжимаются zlib.
+
+    OPTIONS: NAMESPACES — {имя: {'PREFIXES': [...], 'MAX_BYTES': n}},
+    MAX_BYTES — бюджет области default для остальных ключей,
+    COMPRESS_MIN_SIZE (None — не сжимать) и COMPRESS_LEVEL.
+    MAX_ENTRIES и CULL_FREQUENCY не используются.
+    """
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        namespaces = options.get('NAMESPACES', {})
+        self.compress_min_size = options.get('COMPRESS_MIN_SIZE', 4096)
+        self.compress_level = options.get('COMPRESS_LEVEL', 6)
+        # Длинные префиксы проверяются первыми.
+        self.prefixes = sorted(
+            (
+                (prefix, name)
+                for name, namespace in namespaces.items()
+                for prefix in namespace['PREFIXES']
+            ),
+            key=lambda item: -len(item[0]),
+        )
+        with _stores_lock:
+            if location not in _stores:
+                store = {
+                    name: _Namespace(namespace['MAX_BYTES'])
+                    for name, namespace in namespaces.items()
+                }
+                store.setdefault(DEFAULT_NAMESPACE, _Namespace(
+                    options.get('MAX_BYTES', 8 * 2 ** 20)
+                ))
+                _stores[location] = (store, threading.Lock())
+            self.namespaces, self._lock = _stores[location]
+
+    def namespace(self, key):
+        """Имя области для ключа, каким его передали в кэш."""
+        for prefix, name in self.prefixes:
+            if key.startswith(prefix):
+                return name
+        return DEFAULT_NAMESPACE
+
+    def _locate(self, key, version):
+        namespace = self.namespaces[self.namespace(key)]
+        key = self.make_key(key, version)
+        self.validate_key(key)
+        return namespace, key
+
+    def _entry(self, key, value, timeout):
+        data = pickle.dumps(value, self.pickle_protocol)
+        compressed = False
+        if (self.compress_min_size is not None
+                and len(data) >= self.compress_min_size):
+            packed = zlib.compress(data, self.compress_level)
+            if len(packed) < len(data):
+                data, compressed = packed, True
+        return (
+            data, compressed, self.get_backend_timeout(timeout),
+            len(data) + len(key),
+        )
+
+    def _value(self, entry):
+        data = zlib.decompress(entry[0]) if entry[1] else entry[0]
+        return pickle.loads(data)
+
+    def get(self, key, default=None, version=None):
+        namespace, key = self._locate(key, version)
+        with self._lock:
+            entry = namespace.get(key, time.time())
+        return default if entry is None else self._value(entry)
+
+    def get_many(self, keys, version=None):
+        located = [(key, *self._locate(key, version)) for key in keys]
+        now = time.time()
+        with self._lock:
+            entries = [
+                (key, namespace.get(made, now))
+                for key, namespace, made in located
+            ]
+        return {
+            key: self._value(entry)
+            for key, entry in entries if entry is not None
+        }
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        namespace, key = self._locate(key, version)
+        entry = self._entry(key, value, timeout)
+        with self._lock:
+            namespace.put(key, entry)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        namespace, key = self._locate(key, version)
+        entry = self._entry(key, value, timeout)
+        with self._lock:
+            if self._alive(namespace, key):
+                return False
+            namespace.put(key, entry)
+            return True
+
+    def _alive(self, namespace, key):
+        entry = namespace.entries.get(key)
+        if entry is None:
+            return False
+        if entry[2] is not None and entry[2] <= time.time():
+            namespace.pop(key)
+            return False
+        return True
+
+    def incr(self, key, delta=1, version=None):
+        namespace, made = self._locate(key, version)
+        with self._lock:
+            if not self._alive(namespace, made):
+                raise ValueError(f"Key '{made}' not found")
+            entry = namespace.entries[made]
+            value = self._value(entry) + delta
+            new = self._entry(made, value, None)
+            namespace.put(made, new[:2] + (entry[2],) + new[3:])
+        return value
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        namespace, key = self._locate(key, version)
+        with self._lock:
+            if not self._alive(namespace, key):
+                return False
+            entry = namespace.entries[key]
+            namespace.entries[key] = (
+                entry[:2] + (self.get_backend_timeout(timeout),) + entry[3:]
+            )
+            return True
+
+    def has_key(self, key, version=None):
+        namespace, key = self._locate(key, version)
+        with self._lock:
+            return self._alive(namespace, key)
+
+    def delete(self, key, version=None):
+        namespace, key = self._locate(key, version)
+        with self._lock:
+            namespace.pop(key)
+
+    def clear(self):
+        with self._lock:
+            for namespace in self.namespaces.values():
+                namespace.clear()
+
+    def stats(self):
+        """Записи, байты, попадания, промахи и вытеснения по областям."""
+        with self._lock:
+            return {
+                name: namespace.stats()
+                for name, namespace in self.namespaces.items()
+            }
+
+
+class InstrumentedNamespacedLRUCache(InstrumentedCacheMixin,
+                                     NamespacedLRUCache):
+    pass
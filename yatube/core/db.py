@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+def pragmas(connection, values):
+    """Выполняет PRAGMA SQLite в порядке словаря values."""
+    with connection.cursor() as cursor:
+        for name, value in values.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    """Настраивает каждое новое соединение SQLite по SQLITE_PRAGMAS."""
+    if connection.vendor == 'sqlite' and settings.SQLITE_PRAGMAS:
+        pragmas(connection, settings.SQLITE_PRAGMAS)
+
+
+@receiver(request_started)
+def check_connections(sender, **kwargs):
+    """
+    Проверка постоянных соединений перед запросом: в Django 2.2 нет
+    CONN_HEALTH_CHECKS, и оборванное соединение всплыло бы ошибкой уже
+    в представлении. Неработающее соединение закрывается, а следующий
+    запрос к базе откроет новое.
+    """
+    for connection in connections.all():
+        if (connection.connection is not None
+                and connection.settings_dict['CONN_MAX_AGE']
+                and not connection.is_usable()):
+            connection.close()
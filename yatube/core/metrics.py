@@ -0,0 +1,70 @@
+import threading
+import time
+
+_local = threading.local()
+
+
+class RequestMetrics:
+    """Счётчики одного запроса: SQL, шаблоны и кэш."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    @property
+    def total_time(self):
+        return time.perf_counter() - self.started
+
+    def as_dict(self):
+        return {
+            'queries': self.queries,
+            'db_ms': round(self.db_time * 1000, 2),
+            'template_ms': round(self.template_time * 1000, 2),
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'total_ms': round(self.total_time * 1000, 2),
+        }
+
+
+def start():
+    _local.metrics = RequestMetrics()
+    return _local.metrics
+
+
+def stop():
+    _local.metrics = None
+
+
+def current():
+    """Счётчики текущего запроса или None вне запроса."""
+    return getattr(_local, 'metrics', None)
+
+
+def record_cache(hits, misses):
+    metrics = current()
+    if metrics is not None:
+        metrics.cache_hits += hits
+        metrics.cache_misses += misses
+
+
+def record_template(seconds):
+    metrics = current()
+    if metrics is not None:
+        metrics.template_time += seconds
+
+
+def timed_query(execute, sql, params, many, context):
+    """Обёртка для connection.execute_wrapper: считает запросы и время."""
+    metrics = current()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.db_time += time.perf_counter() - started
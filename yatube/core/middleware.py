@@ -0,0 +1,74 @@
+import json
+import logging
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from . import metrics
+
+logger = logging.getLogger('core.metrics')
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def _view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match else None
+
+
+def _server_timing(figures):
+    return ', '.join([
+        'db;dur={db_ms};desc="{queries} queries"'.format(**figures),
+        'tpl;dur={template_ms}'.format(**figures),
+        'cache;desc="{cache_hits} hits, {cache_misses} misses"'.format(
+            **figures),
+        'total;dur={total_ms}'.format(**figures),
+    ])
+
+
+class MetricsMiddleware:
+    """
+    Считает SQL-запросы, время базы и шаблонов, попадания в кэш и
+    отдаёт их в заголовке Server-Timing и строкой JSON в логе
+    core.metrics. Следит за бюджетами запросов из QUERY_BUDGETS: в режиме
+    QUERY_BUDGET_STRICT превышение бюджета — ошибка, иначе предупреждение.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request_metrics = metrics.start()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(metrics.timed_query)
+                    )
+                response = self.get_response(request)
+        finally:
+            metrics.stop()
+        view = _view_name(request)
+        figures = request_metrics.as_dict()
+        response['Server-Timing'] = _server_timing(figures)
+        logger.info(json.dumps({
+            'view': view,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            **figures,
+        }))
+        self.check_budget(view, figures['queries'])
+        return response
+
+    def check_budget(self, view, queries):
+        budget = settings.QUERY_BUDGETS.get(view)
+        if budget is None or queries <= budget:
+            return
+        message = f'{view}: {queries} SQL-запросов при бюджете {budget}'
+        if settings.QUERY_BUDGET_STRICT:
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
@@ -0,0 +1,99 @@
+import math
+import random
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+
+_missing = object()
+
+
+def _lock_key(key):
+    return f'{key}:recompute'
+
+
+def _fresh(entry, version, beta):
+    """
+    Можно ли отдать запись без пересчёта. По XFetch запись считается
+    устаревшей чуть раньше срока, тем вероятнее, чем ближе срок и чем
+    дольше она считалась: пересчёт достаётся одному запросу, а не всем
+    сразу в момент истечения.
+    """
+    value, entry_version, expires, delta = entry
+    if entry_version != version:
+        return False
+    if expires is None:
+        return True
+    # 1 - random() лежит в (0, 1], логарифм не бывает бесконечным.
+    early = -delta * beta * math.log(1 - random.random())
+    return time.time() + early < expires
+
+
+def _wait(key, version):
+    """Ждёт значение, которое пересчитывает другой запрос."""
+    deadline = time.monotonic() + settings.SWR_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        entry = cache.get(key)
+        if entry is not None and entry[1] == version:
+            return entry[0]
+    return _missing
+
+
+def get_or_compute(key, compute, timeout, version=None, cacheable=None,
+                   beta=None):
+    """
+    Значение из кэша или результат compute(), который сохраняется на
+    timeout секунд. Устаревшее значение, в том числе для другой версии
+    version, хранится ещё SWR_STALE_TIMEOUT секунд. Пока один запрос
+    пересчитывает значение под коротким замком в кэше, остальные получают
+    устаревшее; если его нет, ждут до SWR_WAIT секунд. cacheable решает,
+    сохранять ли результат.
+    """
+    beta = settings.SWR_BETA if beta is None else beta
+    entry = cache.get(key)
+    if entry is not None and _fresh(entry, version, beta):
+        return entry[0]
+    lock = _lock_key(key)
+    if not cache.add(lock, 1, settings.SWR_LOCK_TIMEOUT):
+        if entry is not None:
+            return entry[0]
+        value = _wait(key, version)
+        if value is not _missing:
+            return value
+        # Пересчёт затянулся: считаем сами, без замка.
+        lock = None
+    try:
+        started = time.monotonic()
+        value = compute()
+        delta = time.monotonic() - started
+        if cacheable is None or cacheable(value):
+            expires = None if timeout is None else time.time() + timeout
+            cache.set(
+                key, (value, version, expires, delta),
+                None if timeout is None
+                else timeout + settings.SWR_STALE_TIMEOUT,
+            )
+    finally:
+        if lock is not None:
+            cache.delete(lock)
+    return value
+
+
+def cached(key, timeout, version=None):
+    """
+    Декоратор для get_or_compute. key и version — функции от аргументов
+    декорируемой функции, возвращающие ключ и версию значения.
+    """
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            return get_or_compute(
+                key(*args, **kwargs),
+                lambda: function(*args, **kwargs),
+                timeout,
+                version=None if version is None else version(*args, **kwargs),
+            )
+        return wrapper
+    return decorator
@@ -0,0 +1,24 @@
+import time
+
+from django.template.backends import django
+
+from . import metrics
+
+
+class Template(django.Template):
+    """Шаблон, время отрисовки которого попадает в метрики запроса."""
+
+    def render(self, context=None, request=None):
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.record_template(time.perf_counter() - started)
+
+
+class DjangoTemplates(django.DjangoTemplates):
+    def from_string(self, template_code):
+        return Template(super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return Template(super().get_template(template_name).template, self)
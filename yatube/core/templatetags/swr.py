@@ -0,0 +1,66 @@
+from django import template
+from django.core.cache.utils import make_template_fragment_key
+
+from core import swr
+
+register = template.Library()
+
+
+class CacheSWRNode(template.Node):
+    def __init__(self, nodelist, timeout, name, vary_on, version):
+        self.nodelist = nodelist
+        self.timeout = timeout
+        self.name = name
+        self.vary_on = vary_on
+        self.version = version
+
+    def render(self, context):
+        timeout = self.timeout.resolve(context)
+        if timeout is not None:
+            try:
+                timeout = int(timeout)
+            except (ValueError, TypeError):
+                raise template.TemplateSyntaxError(
+                    f'cache_swr: неверный срок {timeout!r}'
+                )
+        key = make_template_fragment_key(
+            self.name, [var.resolve(context) for var in self.vary_on]
+        )
+        return swr.get_or_compute(
+            'swr.' + key,
+            lambda: self.nodelist.render(context),
+            timeout,
+            version=(
+                None if self.version is None
+                else str(self.version.resolve(context))
+            ),
+        )
+
+
+@register.tag('cache_swr')
+def do_cache_swr(parser, token):
+    """
+    Как {% cache %}, но с защитой от одновременного пересчёта: пока один
+    запрос рендерит фрагмент заново, остальные получают прежний.
+
+        {% cache_swr timeout name [var ...] [version=expr] %}
+        ...
+        {% endcache_swr %}
+
+    Фрагмент другой версии version считается устаревшим, но отдаётся,
+    пока новый рендерится.
+    """
+    nodelist = parser.parse(('endcache_swr',))
+    parser.delete_first_token()
+    tokens = token.split_contents()
+    version = None
+    if len(tokens) > 3 and tokens[-1].startswith('version='):
+        version = parser.compile_filter(tokens.pop()[len('version='):])
+    if len(tokens) < 3:
+        raise template.TemplateSyntaxError(
+            f'{tokens[0]}: нужны срок и имя фрагмента'
+        )
+    return CacheSWRNode(
+        nodelist, parser.compile_filter(tokens[1]), tokens[2],
+        [parser.compile_filter(var) for var in tokens[3:]], version,
+    )
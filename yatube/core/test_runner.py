@@ -0,0 +1,13 @@
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+
+class StrictBudgetRunner(DiscoverRunner):
+    """
+    Запускает тесты со строгими бюджетами запросов: превышение бюджета
+    роняет тест, а при обычной работе сайта только пишется в лог.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        settings.QUERY_BUDGET_STRICT = True
@@ -1,3 +1,6 @@
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.cache import caches
 from django.shortcuts import render
 
 
@@ -11,3 +14,27 @@ def csrf_failure(request, reason=''):
 
 def server_error(request):
     return render(request, 'core/500.html', status=500)
+
+
+def _cache_rows(backend):
+    """Строки таблицы статистики кэша: по областям или одна на бэкенд."""
+    stats = backend.stats()
+    if all(isinstance(value, dict) for value in stats.values()):
+        return list(stats.items())
+    return [('', stats)]
+
+
+@staff_member_required
+def cache_stats(request):
+    """Статистика кэшей из CACHES, у бэкендов которых есть stats()."""
+    backends = []
+    for alias in settings.CACHES:
+        backend = caches[alias]
+        rows = _cache_rows(backend) if hasattr(backend, 'stats') else []
+        backends.append({
+            'alias': alias,
+            'backend': type(backend).__name__,
+            'columns': list(rows[0][1]) if rows else [],
+            'rows': rows,
+        })
+    return render(request, 'core/cache_stats.html', {'backends': backends})
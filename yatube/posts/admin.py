@@ -1,14 +1,22 @@
 from django.contrib import admin
+from .forms import PostAdminForm
 from .models import Group, Post
+from . import search
 
 
 class PostAdmin(admin.ModelAdmin):
+    form = PostAdminForm
     list_display = ('pk', 'text', 'pub_date', 'author', 'group')
     list_editable = ('group',)
     search_fields = ('text',)
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        return queryset.filter(pk__in=search.post_ids(search_term)), False
+
 
 admin.site.register(Post, PostAdmin)
 admin.site.register(Group)
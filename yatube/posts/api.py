@@ -0,0 +1,144 @@
+from functools import wraps
+from http import HTTPStatus
+
+from django.contrib.auth import get_user_model
+from django.http import Http404, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_safe
+
+from . import timeline, utils
+from .models import Group, Post
+from .serializers import (CommentSerializer, GroupSerializer,
+                          InvalidFields, PostSerializer, ProfileSerializer)
+from .views import is_following
+
+User = get_user_model()
+
+# Больше стольких записей на страницу не отдаётся, сколько ни проси.
+MAX_LIMIT = 100
+POST_ORDERING = ('pub_date', 'id')
+COMMENT_ORDERING = ('created', 'id')
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=HTTPStatus.BAD_REQUEST):
+        super().__init__(message)
+        self.status = status
+
+
+def _error(message, status):
+    return JsonResponse(
+        {'detail': message}, status=status,
+        json_dumps_params={'ensure_ascii': False},
+    )
+
+
+def api_view(view):
+    """
+    Представление API только для чтения: возвращает словарь, который
+    отдаётся как JSON; ошибки тоже превращаются в JSON.
+    """
+    @require_safe
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            data = view(request, *args, **kwargs)
+        except Http404:
+            return _error('Не найдено', HTTPStatus.NOT_FOUND)
+        except InvalidFields as error:
+            return _error(f'Неизвестные поля: {error}', HTTPStatus.BAD_REQUEST)
+        except ApiError as error:
+            return _error(str(error), error.status)
+        return JsonResponse(data, json_dumps_params={'ensure_ascii': False})
+    return wrapper
+
+
+def _limit(request):
+    try:
+        limit = int(request.GET.get('limit', utils.COUNT))
+    except ValueError:
+        raise ApiError('limit должен быть числом')
+    return min(max(limit, 1), MAX_LIMIT)
+
+
+def _link(request, token):
+    if token is None:
+        return None
+    query = request.GET.copy()
+    query['cursor'] = token
+    return f'{request.path}?{query.urlencode()}'
+
+
+def _page(request, queryset, serializer_class, ordering=POST_ORDERING):
+    """Страница списка по курсору: results и ссылки next/previous."""
+    serializer = serializer_class(request.GET.get('fields'))
+    paginator = utils.CursorPaginator(
+        serializer.values(queryset, *ordering), _limit(request),
+        ordering=ordering,
+    )
+    page = paginator.cursor_page(request.GET.get('cursor'))
+    return {
+        'results': [serializer.row(row) for row in page],
+        'next': _link(request, page.next_cursor),
+        'previous': _link(request, page.previous_cursor),
+    }
+
+
+def _detail(request, queryset, serializer_class):
+    serializer = serializer_class(request.GET.get('fields'))
+    return serializer.row(get_object_or_404(serializer.values(queryset)))
+
+
+@api_view
+def post_list(request):
+    return _page(request, Post.objects.all(), PostSerializer)
+
+
+@api_view
+def post_detail(request, post_id):
+    return _detail(request, Post.objects.filter(pk=post_id), PostSerializer)
+
+
+@api_view
+def comment_list(request, post_id):
+    post = get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    return _page(request, post.comments.all(), CommentSerializer,
+                 ordering=COMMENT_ORDERING)
+
+
+@api_view
+def group_detail(request, slug):
+    return _detail(request, Group.objects.filter(slug=slug), GroupSerializer)
+
+
+@api_view
+def group_posts(request, slug):
+    group = get_object_or_404(Group.objects.only('pk'), slug=slug)
+    return _page(request, group.posts.all(), PostSerializer)
+
+
+@api_view
+def profile_detail(request, username):
+    # id нужен для проверки подписки, даже если его не просили в fields.
+    serializer = ProfileSerializer(request.GET.get('fields'))
+    author = get_object_or_404(
+        serializer.values(User.objects.filter(username=username), 'id')
+    )
+    return {
+        **serializer.row(author),
+        'following': is_following(request.user, author['id']),
+    }
+
+
+@api_view
+def profile_posts(request, username):
+    author = get_object_or_404(User.objects.only('pk'), username=username)
+    return _page(request, author.posts.all(), PostSerializer)
+
+
+@api_view
+def follow_list(request):
+    if not request.user.is_authenticated:
+        raise ApiError('Нужно войти на сайт', HTTPStatus.UNAUTHORIZED)
+    return _page(request, timeline.feed(request.user), PostSerializer,
+                 ordering=timeline.ORDERING)
@@ -0,0 +1,375 @@
+import asyncio
+import logging
+import math
+import random
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import OperationalError, connection, transaction
+from django.db.models import Max
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.asgi import ASGIHandler, environ
+from core.db import pragmas
+from .models import Comment, Follow, Group, Post, User, UserStats
+from .utils import COUNT
+
+VIEWS = ('index', 'group_posts', 'profile', 'post_detail', 'follow_index')
+# Страницы, доступные без входа: серверы сравниваются на анонимах.
+PUBLIC_VIEWS = ('index', 'group_posts', 'profile', 'post_detail')
+PERCENTILES = (50, 95, 99)
+POPULAR_AUTHORS = 100
+
+
+class BenchmarkError(Exception):
+    pass
+
+
+def percentile(values, rank):
+    """Перцентиль по методу ближайшего ранга."""
+    ordered = sorted(values)
+    return ordered[max(math.ceil(rank / 100 * len(ordered)) - 1, 0)]
+
+
+def _random_row(model, rng, **filters):
+    """Случайная строка без ORDER BY RANDOM() по всей таблице."""
+    last = model.objects.aggregate(last=Max('pk'))['last']
+    if last is None:
+        return None
+    return (
+        model.objects.filter(pk__gte=rng.randint(1, last), **filters)
+        .order_by('pk').first()
+        or model.objects.filter(**filters).order_by('pk').first()
+    )
+
+
+class Target:
+    """Адреса страниц для замеров, выбранные воспроизводимо по seed."""
+
+    def __init__(self, seed=0):
+        self.random = random.Random(seed)
+        follow = _random_row(Follow, self.random)
+        self.reader = follow.user if follow else User.objects.first()
+        # Профили смотрят в основном у популярных авторов.
+        self.authors = list(
+            UserStats.objects.filter(posts_count__gt=0)
+            .order_by('-followers_count')
+            .values_list('user__username', flat=True)[:POPULAR_AUTHORS]
+        )
+
+    def url(self, view):
+        rng = self.random
+        if view == 'index':
+            return reverse('posts:index')
+        if view == 'group_posts':
+            group = _random_row(Group, rng)
+            return reverse('posts:groups', args=[group.slug])
+        if view == 'profile':
+            return reverse('posts:profile', args=[rng.choice(self.authors)])
+        if view == 'post_detail':
+            post = _random_row(Post, rng)
+            return reverse('posts:post_detail', args=[post.pk])
+        if view == 'follow_index':
+            return reverse('posts:follow_index')
+        raise ValueError(view)
+
+
+def measure(views=VIEWS, requests=100, warmup=5, seed=0, cold=False):
+    """
+    Замеряет время ответа и число SQL-запросов страниц от имени читателя
+    с подписками. С cold=True кэш очищается перед каждым запросом.
+    """
+    target = Target(seed)
+    client = Client()
+    if target.reader is not None:
+        client.force_login(target.reader)
+    with _quiet():
+        return {view: _measure_view(client, target, view, requests,
+                                    warmup, cold) for view in views}
+
+
+@contextmanager
+def _quiet():
+    # Замер не должен обрываться на превышении бюджета запросов, а строки
+    # метрик каждого запроса только засоряли бы вывод.
+    metrics_log = logging.getLogger('core.metrics')
+    level = metrics_log.level
+    metrics_log.setLevel(logging.WARNING)
+    try:
+        with override_settings(QUERY_BUDGET_STRICT=False):
+            yield
+    finally:
+        metrics_log.setLevel(level)
+
+
+def _measure_view(client, target, view, requests, warmup, cold):
+    timings, queries = [], []
+    for number in range(warmup + requests):
+        url = target.url(view)
+        if cold:
+            cache.clear()
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = client.get(url)
+            elapsed = time.perf_counter() - started
+        if response.status_code != 200:
+            raise BenchmarkError(f'{url}: код ответа {response.status_code}')
+        if number >= warmup:
+            timings.append(elapsed * 1000)
+            queries.append(len(captured))
+    return {
+        'requests': requests,
+        **{
+            f'p{rank}_ms': round(percentile(timings, rank), 3)
+            for rank in PERCENTILES
+        },
+        'mean_ms': round(statistics.mean(timings), 3),
+        'queries_mean': round(statistics.mean(queries), 2),
+        'queries_max': max(queries),
+    }
+
+
+def _summary(timings, elapsed):
+    timings = [seconds * 1000 for seconds in timings]
+    return {
+        'requests': len(timings),
+        'requests_per_second': round(len(timings) / elapsed, 1),
+        **{
+            f'p{rank}_ms': round(percentile(timings, rank), 3)
+            for rank in PERCENTILES
+        },
+    }
+
+
+def _scope(url):
+    path, _, query = url.partition('?')
+    return {
+        'type': 'http',
+        'method': 'GET',
+        'path': path,
+        'query_string': query.encode(),
+        'headers': [(b'host', b'localhost')],
+        'server': ('localhost', 80),
+        'client': ('127.0.0.1', 0),
+    }
+
+
+def _run_wsgi(application, scopes, concurrency, threads, client_delay):
+    """
+    Потоковый WSGI-сервер с threads рабочими потоками: поток занят, пока
+    клиент не дочитает ответ.
+    """
+    workers = threading.BoundedSemaphore(threads)
+
+    def request(scope):
+        started = time.perf_counter()
+        statuses = []
+        with workers:
+            result = application(
+                environ(scope, BytesIO()),
+                lambda status, headers, exc_info=None: statuses.append(
+                    status),
+            )
+            try:
+                for _ in result:
+                    pass
+                time.sleep(client_delay)
+            finally:
+                result.close()
+        if not statuses[0].startswith('200'):
+            raise BenchmarkError(f'{scope["path"]}: {statuses[0]}')
+        return time.perf_counter() - started
+
+    with ThreadPoolExecutor(concurrency) as clients:
+        return list(clients.map(request, scopes))
+
+
+async def _run_asgi(handler, scopes, concurrency, client_delay):
+    """ASGI: медленный клиент ждёт в цикле событий, а не в потоке."""
+    clients = asyncio.Semaphore(concurrency)
+
+    async def receive():
+        return {'type': 'http.request', 'body': b''}
+
+    async def request(scope):
+        async with clients:
+            started = time.perf_counter()
+            statuses = []
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    statuses.append(message['status'])
+                elif not message.get('more_body'):
+                    await asyncio.sleep(client_delay)
+
+            await handler(scope, receive, send)
+            if statuses[0] != 200:
+                raise BenchmarkError(f'{scope["path"]}: {statuses[0]}')
+            return time.perf_counter() - started
+
+    return await asyncio.gather(*(request(scope) for scope in scopes))
+
+
+def compare_servers(views=PUBLIC_VIEWS, requests=200, concurrency=50,
+                    threads=8, client_delay=0.05, seed=0):
+    """
+    Пропускная способность и время ответа одного и того же приложения за
+    WSGI и за ASGI при concurrency одновременных анонимных клиентах.
+    Каждый клиент читает ответ client_delay секунд, как медленное
+    мобильное соединение; у обоих серверов по threads потоков.
+    """
+    target = Target(seed)
+    scopes = [
+        _scope(target.url(views[number % len(views)]))
+        for number in range(requests)
+    ]
+    application = WSGIHandler()
+    handler = ASGIHandler(application, threads)
+    results = {}
+    with _quiet():
+        # Прогрев: страницы попадают в кэш до замера обоих серверов.
+        _run_wsgi(application, scopes[:len(views)], 1, 1, 0)
+        started = time.perf_counter()
+        timings = _run_wsgi(
+            application, scopes, concurrency, threads, client_delay
+        )
+        results['wsgi'] = _summary(timings, time.perf_counter() - started)
+        started = time.perf_counter()
+        timings = asyncio.run(
+            _run_asgi(handler, scopes, concurrency, client_delay)
+        )
+        results['asgi'] = _summary(timings, time.perf_counter() - started)
+    handler.executor.shutdown()
+    return results
+
+
+def _db_worker(operation, deadline, persistent):
+    """
+    Повторяет operation до deadline в своём соединении. Без persistent
+    соединение закрывается после каждой операции, как при CONN_MAX_AGE=0.
+    """
+    timings, errors = [], 0
+    try:
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                operation()
+            except OperationalError:
+                errors += 1
+            else:
+                timings.append(time.perf_counter() - started)
+            if not persistent:
+                connection.close()
+    finally:
+        connection.close()
+    return timings, errors
+
+
+def _db_summary(results, elapsed):
+    timings = [seconds for result in results for seconds in result[0]]
+    summary = {'errors': sum(result[1] for result in results)}
+    if timings:
+        summary.update(_summary(timings, elapsed))
+    return summary
+
+
+def _run_db_profile(pragma_values, persistent, duration, readers, writers,
+                    seed):
+    rng = random.Random(seed)
+    lock = threading.Lock()
+    last_post = Post.objects.aggregate(last=Max('pk'))['last'] or 0
+    author = User.objects.values_list('pk', flat=True).first()
+    created = []
+
+    def read():
+        with lock:
+            position = rng.randint(0, last_post)
+        list(Post.objects.for_feed().filter(pk__lte=position)
+             .order_by('-pk')[:COUNT])
+
+    def write():
+        with lock:
+            post_id = rng.randint(1, last_post)
+        # Запись вместе с работой сигналов — одна транзакция: при ошибке
+        # не остаётся комментария, который нечем было бы убрать.
+        with transaction.atomic():
+            comment = Comment.objects.create(
+                post_id=post_id, author_id=author, text='Замер записи')
+        with lock:
+            created.append(comment.pk)
+
+    connection.close()
+    with override_settings(SQLITE_PRAGMAS=pragma_values):
+        started = time.perf_counter()
+        deadline = started + duration
+        with ThreadPoolExecutor(readers + writers) as pool:
+            reads = [
+                pool.submit(_db_worker, read, deadline, persistent)
+                for _ in range(readers)
+            ]
+            writes = [
+                pool.submit(_db_worker, write, deadline, persistent)
+                for _ in range(writers)
+            ]
+            reads = [future.result() for future in reads]
+            writes = [future.result() for future in writes]
+        elapsed = time.perf_counter() - started
+    for start in range(0, len(created), 500):
+        Comment.objects.filter(pk__in=created[start:start + 500]).delete()
+    return {
+        'read': _db_summary(reads, elapsed),
+        'write': _db_summary(writes, elapsed),
+    }
+
+
+def compare_databases(duration=10, readers=8, writers=2, seed=0):
+    """
+    Одновременные чтения ленты и запись комментариев в двух режимах базы:
+    как по умолчанию (журнал DELETE, соединение на каждый запрос) и как
+    в профиле production (SQLITE_TUNED_PRAGMAS и постоянные соединения).
+    Созданные при замере комментарии потом удаляются.
+    """
+    if connection.vendor != 'sqlite':
+        raise BenchmarkError('Замер режимов рассчитан на SQLite')
+    if not Post.objects.exists():
+        raise BenchmarkError('В базе нет постов, сначала запустите seed')
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA journal_mode')
+        journal = cursor.fetchone()[0]
+    tuned = settings.SQLITE_TUNED_PRAGMAS
+    profiles = (
+        ('default', {'journal_mode': 'DELETE'}, False),
+        ('production', tuned, True),
+    )
+    results = {}
+    try:
+        with _quiet():
+            for name, pragma_values, persistent in profiles:
+                # Журнал переключается, пока другие соединения закрыты.
+                pragmas(connection, {
+                    'journal_mode': pragma_values['journal_mode']
+                })
+                results[name] = _run_db_profile(
+                    pragma_values, persistent, duration, readers, writers,
+                    seed,
+                )
+    finally:
+        pragmas(connection, {'journal_mode': journal})
+    return results
+
+
+def dataset():
+    """Объём данных, на котором шёл замер."""
+    return {
+        model.__name__.lower(): model.objects.count()
+        for model in (User, Group, Post, Comment, Follow)
+    }
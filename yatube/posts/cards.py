@@ -0,0 +1,67 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+
+from . import feed_cache, thumbnails
+
+# Виды карточек: шаблон и миниатюра, которую он показывает. Ленты
+# показывают посты по-разному, у каждого вида свои карточки в кэше.
+KINDS = {
+    'feed': ('posts/includes/feed_card.html', '960x339', {'upscale': True}),
+    'group': (
+        'posts/includes/group_card.html',
+        '960x339', {'crop': 'center', 'upscale': True},
+    ),
+    'profile': (
+        'posts/includes/profile_card.html', '960x339', {'upscale': True},
+    ),
+}
+
+
+def card_key(post, site_version, kind='feed'):
+    """
+    Ключ карточки: меняется с updated_at поста, общим поколением лент
+    (правка групп) и именем автора, которое карточка тоже показывает.
+    """
+    version = '|'.join((
+        post.updated_at.isoformat(), site_version,
+        post.author.username, post.author.get_full_name(),
+    ))
+    return 'card:{}:{}:{}'.format(
+        kind, post.pk, hashlib.md5(version.encode()).hexdigest()
+    )
+
+
+def _complete(post, geometry, options):
+    # Пока миниатюры нет, карточка показывает саму картинку: такую
+    # карточку не кэшируем, чтобы миниатюра появилась, когда будет готова.
+    return not post.image or thumbnails.ready(
+        post.image.name, geometry, **options
+    ) is not None
+
+
+def render(posts, kind='feed'):
+    """
+    HTML карточек постов вида kind из KINDS. Готовые карточки читаются
+    из кэша одним get_many, недостающие рендерятся и сохраняются одним
+    set_many.
+    """
+    posts = list(posts)
+    site_version = feed_cache.version()
+    template, geometry, options = KINDS[kind]
+    keys = [card_key(post, site_version, kind) for post in posts]
+    cards = cache.get_many(keys)
+    missing = [
+        (key, post) for key, post in zip(keys, posts) if key not in cards
+    ]
+    if missing:
+        thumbnails.prefetch(post.image.name for _, post in missing)
+        rendered = {}
+        for key, post in missing:
+            cards[key] = render_to_string(template, {'post': post})
+            if _complete(post, geometry, options):
+                rendered[key] = cards[key]
+        cache.set_many(rendered, settings.FEED_CACHE_TIMEOUT)
+    return [cards[key] for key in keys]
@@ -0,0 +1,92 @@
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Comment, Follow, Post, StoredImage, User, UserStats
+
+
+def change_user(user_id, field, delta):
+    """Атомарно меняет счётчик пользователя на delta через F()."""
+    stats = UserStats.objects.filter(user_id=user_id)
+    if delta < 0:
+        stats.filter(**{f'{field}__gte': -delta}).update(
+            **{field: F(field) + delta}
+        )
+        return
+    if not stats.update(**{field: F(field) + delta}):
+        UserStats.objects.get_or_create(user_id=user_id)
+        stats.update(**{field: F(field) + delta})
+
+
+def change_post(post_id, delta):
+    """Атомарно меняет число комментариев поста на delta через F()."""
+    posts = Post.objects.filter(pk=post_id)
+    if delta < 0:
+        posts = posts.filter(comments_count__gte=-delta)
+    posts.update(comments_count=F('comments_count') + delta)
+
+
+def change_image(name, delta):
+    """Атомарно меняет число ссылок на файл картинки на delta."""
+    if not name:
+        return
+    images = StoredImage.objects.filter(name=name)
+    changes = {
+        'references': F('references') + delta,
+        'changed': timezone.now(),
+    }
+    if delta < 0:
+        images.filter(references__gte=-delta).update(**changes)
+        return
+    if not images.update(**changes):
+        StoredImage.objects.get_or_create(name=name)
+        images.update(**changes)
+
+
+def _count(queryset, field, outer='pk'):
+    return Coalesce(Subquery(
+        queryset.filter(**{field: OuterRef(outer)})
+        .order_by()
+        .values(field)
+        .annotate(total=Count('pk'))
+        .values('total')
+    ), 0)
+
+
+def _repair(queryset, field, actual):
+    drifted = queryset.annotate(actual=actual).exclude(
+        **{field: F('actual')}
+    ).count()
+    if drifted:
+        queryset.update(**{field: actual})
+    return drifted
+
+
+def recount():
+    """
+    Пересчитывает все хранимые счётчики по реальным данным.
+    Возвращает число исправленных значений.
+    """
+    UserStats.objects.bulk_create(
+        (UserStats(user_id=user_id) for user_id in User.objects.filter(
+            stats__isnull=True).values_list('pk', flat=True).iterator()),
+        batch_size=500,
+    )
+    StoredImage.objects.bulk_create(
+        (StoredImage(name=name) for name in Post.objects.exclude(
+            image='').values_list('image', flat=True).distinct().iterator()),
+        batch_size=500, ignore_conflicts=True,
+    )
+    stats = UserStats.objects.all()
+    return sum((
+        _repair(stats, 'posts_count',
+                _count(Post.objects, 'author', 'user_id')),
+        _repair(stats, 'followers_count',
+                _count(Follow.objects, 'author', 'user_id')),
+        _repair(stats, 'following_count',
+                _count(Follow.objects, 'user', 'user_id')),
+        _repair(Post.objects.all(), 'comments_count',
+                _count(Comment.objects, 'post')),
+        _repair(StoredImage.objects.all(), 'references',
+                _count(Post.objects, 'image', 'name')),
+    ))
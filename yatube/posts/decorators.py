@@ -0,0 +1,55 @@
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import quote_etag
+
+from core import swr
+
+from . import feed_cache
+
+
+def _cacheable(request, response):
+    return (
+        response.status_code == 200
+        and not response.cookies
+        and not request.META.get('CSRF_COOKIE_USED')
+    )
+
+
+def cache_for_anonymous(view):
+    """
+    Кэширует страницу целиком для анонимных посетителей и отвечает 304 на
+    условные запросы. Версия страницы — общее поколение страниц, которое
+    сдвигают сигналы моделей; пока одна страница рендерится заново, другие
+    анонимы получают прежнюю. Авторизованные пользователи кэш обходят.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if (request.method not in ('GET', 'HEAD')
+                or request.user.is_authenticated):
+            return view(request, *args, **kwargs)
+        path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+
+        def render():
+            response = view(request, *args, **kwargs)
+            if _cacheable(request, response):
+                response['ETag'] = quote_etag(
+                    hashlib.md5(response.content).hexdigest()
+                )
+            return response
+
+        response = swr.get_or_compute(
+            f'page:{path}', render, settings.FEED_CACHE_TIMEOUT,
+            version=feed_cache.version(feed_cache.PAGES),
+            cacheable=lambda response: _cacheable(request, response),
+        )
+        patch_vary_headers(response, ('Cookie',))
+        # Только ETag: дата поста не меняется при правке, комментарии и
+        # переименовании группы, и Last-Modified по ней дал бы 304
+        # на устаревшую страницу.
+        return get_conditional_response(
+            request, etag=response.get('ETag'), response=response,
+        )
+    return wrapper
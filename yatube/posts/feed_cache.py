@@ -0,0 +1,86 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from core import swr
+
+from .models import Post
+from .utils import COUNT, CursorPaginator
+
+# Общее поколение всех лент: меняется, когда правят группы.
+SITE = 'site'
+# Поколение страниц, закэшированных целиком для анонимов: меняется при
+# любой правке содержимого.
+PAGES = 'pages'
+
+
+def _key(name):
+    return f'feed_version:{name}'
+
+
+def _fresh():
+    # Новое значение не совпадает ни с одним из прежних, даже если
+    # счётчик был вытеснен из кэша.
+    return int(time.time() * 1000)
+
+
+def version(*names):
+    """Строка поколений ленты: общий счётчик и счётчики из names."""
+    keys = [_key(name) for name in (SITE,) + names]
+    versions = cache.get_many(keys)
+    missing = {key: _fresh() for key in keys if key not in versions}
+    for key, value in missing.items():
+        if not cache.add(key, value, None):
+            value = cache.get(key, value)
+        versions[key] = value
+    return '.'.join(str(versions[key]) for key in keys)
+
+
+def bump(*names):
+    """Сдвигает поколения, после чего старые фрагменты не используются."""
+    for name in names:
+        try:
+            cache.incr(_key(name))
+        except ValueError:
+            cache.set(_key(name), _fresh(), None)
+
+
+def context(*names):
+    """Переменные шаблона для {% cache feed_timeout ... feed_version %}."""
+    return {
+        'feed_timeout': settings.FEED_CACHE_TIMEOUT,
+        'feed_version': version(*names),
+    }
+
+
+def post_names(post, *group_ids):
+    names = [
+        PAGES, 'index', f'profile:{post.author_id}', f'post:{post.pk}',
+    ]
+    names.extend(
+        f'group:{group_id}' for group_id in set(group_ids) if group_id
+    )
+    return names
+
+
+def _latest_key(group_id):
+    return f'group_latest:{group_id}'
+
+
+@swr.cached(_latest_key, settings.FEED_CACHE_TIMEOUT)
+def group_latest(group_id):
+    """
+    Первая страница ленты группы вместе с постом, по которому видно, что
+    есть следующая. Список хранится в кэше, пока пост не добавят в группу,
+    не уберут из неё или не удалят.
+    """
+    return list(CursorPaginator(
+        Post.objects.filter(group_id=group_id).for_feed(), COUNT
+    ).page_queryset())
+
+
+def forget_group_latest(*group_ids):
+    cache.delete_many([
+        _latest_key(group_id) for group_id in set(group_ids) if group_id
+    ])
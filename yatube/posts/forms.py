@@ -1,8 +1,19 @@
 from django.forms import ModelForm
+from .images import normalize
 from .models import Comment, Post
 
 
-class PostForm(ModelForm):
+class ImageUploadMixin:
+    """Новые картинки постов проходят обработку из posts.images."""
+
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        if image and image != self.initial.get('image'):
+            return normalize(image)
+        return image
+
+
+class PostForm(ImageUploadMixin, ModelForm):
     class Meta():
         model = Post
         fields = ['text', 'group', 'image']
@@ -11,6 +22,12 @@ class PostForm(ModelForm):
                      'group': 'Группа которой будет присвоен пост'}
 
 
+class PostAdminForm(ImageUploadMixin, ModelForm):
+    class Meta():
+        model = Post
+        fields = '__all__'
+
+
 class CommentForm(ModelForm):
     class Meta():
         model = Comment
@@ -0,0 +1,72 @@
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image, ImageOps
+
+# Форматы, которые не хранят прозрачность: такие картинки сохраняются в PNG.
+OPAQUE_FORMATS = ('JPEG',)
+EXTENSIONS = {'JPEG': '.jpg', 'PNG': '.png', 'WEBP': '.webp'}
+
+
+def _has_alpha(image):
+    if image.mode == 'P':
+        return 'transparency' in image.info
+    if image.mode in ('RGBA', 'LA'):
+        return image.getchannel('A').getextrema()[0] < 255
+    return False
+
+
+def _open(upload):
+    upload.seek(0)
+    try:
+        image = Image.open(upload)
+    except Image.DecompressionBombError:
+        image = None
+    # Размер известен из заголовка, до распаковки пикселей.
+    if image is None or (image.width * image.height
+                         > settings.POST_IMAGE_MAX_PIXELS):
+        raise ValidationError(
+            'Картинка слишком большая: не больше %(pixels)s мегапикселей.',
+            code='too_many_pixels',
+            params={'pixels': settings.POST_IMAGE_MAX_PIXELS // 10 ** 6},
+        )
+    return image
+
+
+def normalize(upload):
+    """
+    Готовит загруженную картинку к хранению: уменьшает до
+    POST_IMAGE_MAX_SIZE, поворачивает по EXIF и сохраняет заново в
+    POST_IMAGE_FORMAT без метаданных. Анимация при перекодировании
+    потерялась бы, поэтому анимированные картинки только проверяются.
+    """
+    image = _open(upload)
+    if getattr(image, 'is_animated', False):
+        upload.seek(0)
+        return upload
+    # JPEG распаковывается сразу в уменьшенном масштабе: это в разы
+    # быстрее, чем распаковать целиком и уменьшать потом.
+    image.draft('RGB', settings.POST_IMAGE_MAX_SIZE)
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail(settings.POST_IMAGE_MAX_SIZE, Image.LANCZOS)
+    image_format = settings.POST_IMAGE_FORMAT
+    if _has_alpha(image):
+        if image_format in OPAQUE_FORMATS:
+            image_format = 'PNG'
+        image = image.convert('RGBA')
+    elif image.mode != 'L':
+        image = image.convert('RGB')
+    content = BytesIO()
+    image.save(
+        content, image_format,
+        quality=settings.POST_IMAGE_QUALITY, optimize=True,
+        icc_profile=image.info.get('icc_profile'),
+    )
+    name = os.path.splitext(os.path.basename(upload.name))[0]
+    return SimpleUploadedFile(
+        name + EXTENSIONS[image_format], content.getvalue(),
+        content_type=Image.MIME[image_format],
+    )
@@ -0,0 +1,102 @@
+import json
+import subprocess
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from posts import benchmark, seeding
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет p50/p95/p99 времени ответа и число SQL-запросов страниц '
+        'ленты и пишет результат в JSON. С --seed сначала наполняет базу '
+        'синтетическими данными.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--seed', action='store_true',
+            help='Перед замером наполнить базу данными.',
+        )
+        for name, default in seeding.SIZES.items():
+            parser.add_argument(f'--{name}', type=int, default=default)
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help='Сколько процессов наполняют базу.',
+        )
+        parser.add_argument(
+            '--random-seed', type=int, default=0,
+            help='Зерно генератора данных и выбора страниц.',
+        )
+        parser.add_argument(
+            '--views', nargs='+', choices=benchmark.VIEWS,
+            default=benchmark.VIEWS,
+        )
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--warmup', type=int, default=10)
+        parser.add_argument(
+            '--cold', action='store_true',
+            help='Очищать кэш перед каждым запросом.',
+        )
+        parser.add_argument(
+            '--output', default='bench.json',
+            help='Файл для результатов; «-» — вывести в консоль.',
+        )
+
+    def log(self, message):
+        self.stdout.write(message)
+
+    def handle(self, *args, **options):
+        if options['seed']:
+            seeding.seed(
+                users=options['users'],
+                groups=options['groups'],
+                posts=options['posts'],
+                comments=options['comments'],
+                follows=options['follows'],
+                seed=options['random_seed'],
+                workers=options['workers'],
+                log=self.log,
+            )
+        try:
+            views = benchmark.measure(
+                views=options['views'],
+                requests=options['requests'],
+                warmup=options['warmup'],
+                seed=options['random_seed'],
+                cold=options['cold'],
+            )
+        except benchmark.BenchmarkError as error:
+            raise CommandError(error)
+        report = json.dumps({
+            'commit': _commit(),
+            'created': timezone.now().isoformat(),
+            'cold_cache': options['cold'],
+            'dataset': benchmark.dataset(),
+            'views': views,
+        }, indent=2, ensure_ascii=False)
+        if options['output'] == '-':
+            self.stdout.write(report)
+            return
+        with open(options['output'], 'w') as output:
+            output.write(report + '\n')
+        for view, figures in views.items():
+            self.log(
+                '{:<14} p50 {p50_ms:>8} мс  p95 {p95_ms:>8} мс  '
+                'p99 {p99_ms:>8} мс  запросов {queries_max}'.format(
+                    view, **figures)
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Результаты записаны в {options["output"]}'
+        ))
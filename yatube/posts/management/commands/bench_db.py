@@ -0,0 +1,53 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает одновременные чтение и запись в SQLite с настройками '
+        'по умолчанию и с профилем production. Пишет в базу комментарии '
+        'и потом удаляет их.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--duration', type=float, default=10,
+            help='Сколько секунд длится замер каждого режима.',
+        )
+        parser.add_argument('--readers', type=int, default=8)
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument('--random-seed', type=int, default=0)
+        parser.add_argument(
+            '--output', default='-',
+            help='Файл для результатов в JSON; «-» — только таблица.',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            results = benchmark.compare_databases(
+                duration=options['duration'],
+                readers=options['readers'],
+                writers=options['writers'],
+                seed=options['random_seed'],
+            )
+        except benchmark.BenchmarkError as error:
+            raise CommandError(error)
+        for profile, kinds in results.items():
+            for kind, figures in kinds.items():
+                self.stdout.write(
+                    '{:<10} {:<5} {:>9} оп/с  p50 {:>9} мс  p99 {:>9} мс  '
+                    'ошибок {}'.format(
+                        profile, kind,
+                        figures.get('requests_per_second', 0),
+                        figures.get('p50_ms', '-'),
+                        figures.get('p99_ms', '-'),
+                        figures['errors'],
+                    )
+                )
+        if options['output'] != '-':
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2)
+                output.write('\n')
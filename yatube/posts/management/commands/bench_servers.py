@@ -0,0 +1,59 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пропускную способность сайта за WSGI и за ASGI при '
+        'одновременных медленных клиентах.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--views', nargs='+', choices=benchmark.PUBLIC_VIEWS,
+            default=benchmark.PUBLIC_VIEWS,
+        )
+        parser.add_argument('--requests', type=int, default=400)
+        parser.add_argument(
+            '--concurrency', type=int, default=50,
+            help='Сколько клиентов ждут ответа одновременно.',
+        )
+        parser.add_argument(
+            '--threads', type=int, default=8,
+            help='Сколько потоков выполняют представления у каждого сервера.',
+        )
+        parser.add_argument(
+            '--client-delay', type=float, default=50,
+            help='Сколько миллисекунд клиент читает ответ.',
+        )
+        parser.add_argument('--random-seed', type=int, default=0)
+        parser.add_argument(
+            '--output', default='-',
+            help='Файл для результатов в JSON; «-» — только таблица.',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            results = benchmark.compare_servers(
+                views=options['views'],
+                requests=options['requests'],
+                concurrency=options['concurrency'],
+                threads=options['threads'],
+                client_delay=options['client_delay'] / 1000,
+                seed=options['random_seed'],
+            )
+        except benchmark.BenchmarkError as error:
+            raise CommandError(error)
+        for server, figures in results.items():
+            self.stdout.write(
+                '{:<5} {requests_per_second:>8} запр/с  p50 {p50_ms:>8} мс  '
+                'p95 {p95_ms:>8} мс  p99 {p99_ms:>8} мс'.format(
+                    server, **figures)
+            )
+        if options['output'] != '-':
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2)
+                output.write('\n')
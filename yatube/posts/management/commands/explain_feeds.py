@@ -0,0 +1,77 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from posts import timeline, utils
+from posts.models import Follow, Group, Post, User
+
+# Признаки плана, которых в лентах быть не должно.
+FULL_SCAN = 'SCAN '
+TEMP_SORT = 'TEMP B-TREE'
+
+
+def is_problem(line):
+    """Шаг плана читает таблицу целиком или сортирует во временном B-дереве."""
+    return FULL_SCAN in line and ' USING ' not in line or TEMP_SORT in line
+
+
+def _pages(queryset, ordering=None):
+    """Запросы первой и глубокой страницы ленты через курсорный пагинатор."""
+    paginator = utils.CursorPaginator(
+        queryset, utils.COUNT, ordering=ordering or ('pub_date', 'id')
+    )
+    deep = utils.encode_cursor([timezone.now(), 0])
+    return [
+        ('первая страница', paginator.page_queryset()),
+        ('страница по курсору', paginator.page_queryset(deep)),
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        'Печатает планы запросов всех лент из posts/views.py и отмечает '
+        'полные просмотры таблиц и сортировки во временном B-дереве.'
+    )
+
+    def feed_queries(self):
+        group = Group.objects.first() or Group(pk=0)
+        author = User.objects.first() or User(pk=0)
+        reader = (
+            User.objects.filter(pk__in=Follow.objects.values('user')).first()
+            or author
+        )
+        post = Post.objects.first() or Post(pk=0)
+        queries = []
+        for view, queryset, ordering in (
+            ('index', Post.objects.for_feed(), None),
+            ('group_posts', group.posts.for_feed(), None),
+            ('profile', author.posts.for_feed(), None),
+            ('follow_index', timeline.feed(reader).for_feed(),
+             timeline.ORDERING),
+        ):
+            queries.extend(
+                (f'{view}: {title}', page)
+                for title, page in _pages(queryset, ordering)
+            )
+        queries.append(('post_detail: комментарии',
+                        post.comments.select_related('author')))
+        queries.append(('profile: подписка', Follow.objects.filter(
+            author=author, user=reader)))
+        return queries
+
+    def handle(self, *args, **options):
+        problems = 0
+        for title, queryset in self.feed_queries():
+            self.stdout.write(self.style.MIGRATE_HEADING(title))
+            for line in queryset.explain().splitlines():
+                bad = is_problem(line)
+                problems += bad
+                style = self.style.WARNING if bad else str
+                self.stdout.write(style(f'  {line}'))
+        if problems:
+            self.stdout.write(self.style.WARNING(
+                f'Найдено проблемных шагов плана: {problems}'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                'Все ленты читаются по индексам'
+            ))
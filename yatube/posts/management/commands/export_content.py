@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает пользователей, группы, посты, комментарии и подписки '
+        'в NDJSON, сжатый gzip. Файлы картинок не копируются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', help='Файл выгрузки, например content.ndjson.gz',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=transfer.CHUNK_SIZE,
+            help='Сколько строк читать из базы за один раз.',
+        )
+
+    def handle(self, *args, **options):
+        counts = transfer.export(options['path'], options['chunk_size'])
+        for kind, count in counts.items():
+            self.stdout.write(f'{kind}: {count}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Выгрузка записана в {options["path"]}'
+        ))
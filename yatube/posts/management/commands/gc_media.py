@@ -0,0 +1,32 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from posts import orphans
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет файлы картинок, на которые не ссылается ни один пост, '
+        'вместе с их миниатюрами.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-age', type=int, default=60,
+            help='Не трогать файлы, изменённые за столько минут.',
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только посчитать, ничего не удаляя.',
+        )
+
+    def handle(self, *args, **options):
+        removed, freed = orphans.collect(
+            min_age=timedelta(minutes=options['min_age']),
+            dry_run=options['dry_run'],
+        )
+        verb = 'Можно удалить' if options['dry_run'] else 'Удалено'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} файлов: {removed}, {freed / 2 ** 20:.1f} МБ'
+        ))
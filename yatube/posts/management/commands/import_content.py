@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import seeding, transfer
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает выгрузку export_content. Прерванная загрузка '
+        'продолжается с места остановки при повторном запуске.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл выгрузки export_content.')
+        parser.add_argument(
+            '--batch-size', type=int, default=transfer.CHUNK_SIZE,
+            help='Сколько объектов записывать одной транзакцией.',
+        )
+        parser.add_argument(
+            '--restart', action='store_true',
+            help='Начать загрузку заново, а не продолжать прерванную.',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            counts = transfer.Importer(
+                options['path'],
+                batch_size=options['batch_size'],
+                restart=options['restart'],
+            ).run()
+        except (OSError, transfer.TransferError) as error:
+            raise CommandError(error)
+        for kind, count in counts.items():
+            self.stdout.write(f'{kind}: {count}')
+        seeding.repair(self.stdout.write)
+        self.stdout.write(self.style.SUCCESS('Загрузка завершена'))
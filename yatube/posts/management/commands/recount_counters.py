@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from posts import counters
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает хранимые счётчики постов, комментариев и подписок.'
+
+    def handle(self, *args, **options):
+        fixed = counters.recount()
+        self.stdout.write(self.style.SUCCESS(
+            f'Счётчики пересчитаны, исправлено значений: {fixed}'
+        ))
@@ -0,0 +1,59 @@
+from datetime import date, datetime, time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from posts import seeding
+
+
+class Command(BaseCommand):
+    help = (
+        'Наполняет базу синтетическими пользователями, группами, постами, '
+        'комментариями и подписками через bulk_create.'
+    )
+
+    def add_arguments(self, parser):
+        for name, default in seeding.SIZES.items():
+            parser.add_argument(f'--{name}', type=int, default=default)
+        parser.add_argument(
+            '--images', type=float, default=0.0,
+            help='Доля постов с картинкой, от 0 до 1.',
+        )
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Зерно генератора: с одним зерном данные совпадают.',
+        )
+        parser.add_argument(
+            '--end', type=date.fromisoformat,
+            default=seeding.END.date(),
+            help='Дата ГГГГ-ММ-ДД, к которой заканчивается год постов.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=seeding.BATCH_SIZE,
+            help='Сколько объектов вставлять одной транзакцией.',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help='Сколько процессов пишут пачки параллельно.',
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1 or options['workers'] < 1:
+            raise CommandError('--batch-size и --workers должны быть больше 0')
+        try:
+            seeding.seed(
+                users=options['users'],
+                groups=options['groups'],
+                posts=options['posts'],
+                comments=options['comments'],
+                follows=options['follows'],
+                seed=options['seed'],
+                images=options['images'],
+                batch_size=options['batch_size'],
+                workers=options['workers'],
+                log=self.stdout.write,
+                end=datetime.combine(options['end'], time(), timezone.utc),
+            )
+        except seeding.SeedError as error:
+            raise CommandError(error)
+        self.stdout.write(self.style.SUCCESS('База наполнена'))
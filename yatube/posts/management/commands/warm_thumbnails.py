@@ -0,0 +1,29 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Создаёт недостающие миниатюры картинок всех постов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=4,
+            help='Сколько картинок обрабатывать параллельно.',
+        )
+
+    def handle(self, *args, **options):
+        names = (
+            Post.objects.exclude(image='')
+            .order_by().values_list('image', flat=True).distinct()
+        )
+        done = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            for _ in pool.map(thumbnails.generate, names.iterator()):
+                done += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано картинок: {done}'
+        ))
@@ -0,0 +1,67 @@
+# Generated by Django 2.2.16 on 2026-10-17 06:48
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.utils import OperationalError
+
+
+def create_fts_table(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        try:
+            cursor.execute(
+                "CREATE VIRTUAL TABLE posts_search USING fts5("
+                "body, post_id UNINDEXED, tokenize='unicode61')"
+            )
+        except OperationalError:
+            # SQLite собран без FTS5: поиск работает по SearchTerm.
+            return
+        cursor.execute(
+            'INSERT INTO posts_search(rowid, body, post_id) '
+            'SELECT id * 2, text, id FROM posts_post'
+        )
+        cursor.execute(
+            'INSERT INTO posts_search(rowid, body, post_id) '
+            'SELECT id * 2 + 1, text, post_id FROM posts_comment'
+        )
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS posts_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0007_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchTerm',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64, verbose_name='Слово')),
+                ('kind', models.CharField(choices=[('post', 'Пост'), ('comment', 'Комментарий')], max_length=7, verbose_name='Источник')),
+                ('object_id', models.PositiveIntegerField(verbose_name='Номер источника')),
+                ('weight', models.PositiveIntegerField(default=1, verbose_name='Число вхождений')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='posts.Post', verbose_name='Пост')),
+            ],
+            options={
+                'verbose_name': 'Слово поискового индекса',
+                'verbose_name_plural': 'Поисковый индекс',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='searchterm',
+            index=models.Index(fields=['term'], name='posts_searc_term_0ea2b5_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='searchterm',
+            index=models.Index(fields=['kind', 'object_id'], name='posts_searc_kind_2f4051_idx'),
+        ),
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
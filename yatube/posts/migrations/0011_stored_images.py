@@ -0,0 +1,48 @@
+# Generated by Django 2.2.16 on 2026-10-17 07:41
+
+from django.db import migrations, models
+import posts.storage
+
+
+def fill_stored_images(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    StoredImage = apps.get_model('posts', 'StoredImage')
+    totals = Post.objects.exclude(image='').order_by().values_list(
+        'image').annotate(models.Count('pk'))
+    StoredImage.objects.bulk_create(
+        (StoredImage(name=name, references=total) for name, total in totals),
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0010_post_group_related_name'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredImage',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True, verbose_name='Файл')),
+                ('references', models.PositiveIntegerField(default=0, verbose_name='Постов с картинкой')),
+                ('changed', models.DateTimeField(auto_now=True, verbose_name='Изменено')),
+            ],
+            options={
+                'verbose_name': 'Файл картинки',
+                'verbose_name_plural': 'Файлы картинок',
+            },
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, storage=posts.storage.ContentAddressedStorage(), upload_to='posts/', verbose_name='Картинка'),
+        ),
+        migrations.AddIndex(
+            model_name='storedimage',
+            index=models.Index(fields=['references', 'changed'], name='posts_store_referen_cd34b8_idx'),
+        ),
+        migrations.RunPython(fill_stored_images, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 2.2.16 on 2026-10-17 08:05
+
+from django.db import migrations, models
+
+
+def fill_updated_at(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    Post.objects.update(updated_at=models.F('pub_date'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0011_stored_images'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Изменён'),
+        ),
+        migrations.RunPython(fill_updated_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 2.2.16 on 2026-10-17 08:24
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def mark_prolific(apps, schema_editor):
+    UserStats = apps.get_model('posts', 'UserStats')
+    UserStats.objects.filter(
+        followers_count__gte=settings.TIMELINE_FANOUT_LIMIT
+    ).update(prolific=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0012_post_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userstats',
+            name='prolific',
+            field=models.BooleanField(default=False, help_text='Посты не раскладываются по лентам, а подмешиваются при чтении. Снимается только при timeline.rebuild().', verbose_name='Популярный автор'),
+        ),
+        migrations.RunPython(mark_prolific, migrations.RunPython.noop),
+    ]
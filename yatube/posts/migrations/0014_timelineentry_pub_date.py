@@ -0,0 +1,33 @@
+# Generated by Django 2.2.16 on 2026-10-17 08:25
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def fill_pub_date(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    TimelineEntry = apps.get_model('posts', 'TimelineEntry')
+    TimelineEntry.objects.update(pub_date=models.Subquery(
+        Post.objects.filter(pk=models.OuterRef('post')).values('pub_date')
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_userstats_prolific'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='timelineentry',
+            name='pub_date',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Дата публикации поста'),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_pub_date, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['user', 'pub_date', 'post'], name='posts_timel_user_id_55febf_idx'),
+        ),
+    ]
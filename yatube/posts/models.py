@@ -1,6 +1,8 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 
+from .storage import post_image_storage
+
 User = get_user_model()
 
 
@@ -13,9 +15,22 @@ class Group(models.Model):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    def for_feed(self):
+        """Посты со всем, что нужно шаблонам лент, за один запрос."""
+        return self.select_related('author', 'group').only(
+            'id', 'text', 'pub_date', 'updated_at', 'image', 'author_id',
+            'group_id', 'comments_count',
+            'author__username', 'author__first_name', 'author__last_name',
+            'group__title', 'group__slug',
+        )
+
+
 class Post(models.Model):
     text = models.TextField()
     pub_date = models.DateTimeField(auto_now_add=True)
+    # Меняется при каждом сохранении: по нему сбрасывается кэш карточки.
+    updated_at = models.DateTimeField('Изменён', auto_now=True)
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -24,18 +39,34 @@ class Post(models.Model):
     group = models.ForeignKey(Group,
                               blank=True,
                               null=True,
-                              on_delete=models.SET_NULL
+                              on_delete=models.SET_NULL,
+                              related_name='posts'
                               )
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=post_image_storage,
         blank=True
     )
+    comments_count = models.PositiveIntegerField(
+        'Число комментариев',
+        default=0,
+        editable=False,
+    )
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ('-pub_date',)
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        # Ленты сортируются по (pub_date, id) в обратном порядке: SQLite
+        # читает такие индексы с конца и обходится без сортировки.
+        indexes = [
+            models.Index(fields=['pub_date', 'id']),
+            models.Index(fields=['group', 'pub_date', 'id']),
+            models.Index(fields=['author', 'pub_date', 'id']),
+        ]
 
     def __str__(self):
         return self.text[:15]
@@ -67,6 +98,9 @@ class Comment(models.Model):
         ordering = ('-created',)
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
+        indexes = [
+            models.Index(fields=['post', 'created']),
+        ]
 
     def __str__(self):
         return self.text[0:15]
@@ -94,3 +128,112 @@ class Follow(models.Model):
                 fields=['user', 'author']
             ),
         ]
+
+
+class UserStats(models.Model):
+    """Хранимые счётчики пользователя, чтобы не считать их в шаблонах."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name='stats',
+        verbose_name='Пользователь',
+    )
+    posts_count = models.PositiveIntegerField('Постов', default=0)
+    followers_count = models.PositiveIntegerField('Подписчиков', default=0)
+    following_count = models.PositiveIntegerField('Подписок', default=0)
+    prolific = models.BooleanField(
+        'Популярный автор',
+        default=False,
+        help_text='Посты не раскладываются по лентам, а подмешиваются '
+                  'при чтении. Снимается только при timeline.rebuild().',
+    )
+
+    class Meta:
+        verbose_name = 'Счётчики пользователя'
+        verbose_name_plural = 'Счётчики пользователей'
+
+    def __str__(self):
+        return str(self.user)
+
+
+class TimelineEntry(models.Model):
+    """Запись предрассчитанной ленты подписок пользователя."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Читатель',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост',
+    )
+    # Копия даты поста: лента сортируется и листается по индексу этой
+    # таблицы, без соединения с постами и сортировки во временном B-дереве.
+    pub_date = models.DateTimeField('Дата публикации поста')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        constraints = [
+            models.UniqueConstraint(
+                name='unique_timeline_entry',
+                fields=['user', 'post']
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'pub_date', 'post']),
+        ]
+
+
+class SearchTerm(models.Model):
+    """
+    Переносимый обратный индекс для поиска на базах без FTS5:
+    слово, пост и текст (сам пост или комментарий), где оно встретилось.
+    """
+    POST = 'post'
+    COMMENT = 'comment'
+    KINDS = (
+        (POST, 'Пост'),
+        (COMMENT, 'Комментарий'),
+    )
+    term = models.CharField('Слово', max_length=64)
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='search_terms',
+        verbose_name='Пост',
+    )
+    kind = models.CharField('Источник', max_length=7, choices=KINDS)
+    object_id = models.PositiveIntegerField('Номер источника')
+    weight = models.PositiveIntegerField('Число вхождений', default=1)
+
+    class Meta:
+        verbose_name = 'Слово поискового индекса'
+        verbose_name_plural = 'Поисковый индекс'
+        indexes = [
+            models.Index(fields=['term']),
+            models.Index(fields=['kind', 'object_id']),
+        ]
+
+
+class StoredImage(models.Model):
+    """
+    Файл картинки и число постов, которые на него ссылаются. Одинаковые
+    картинки хранятся одним файлом, а файлы без ссылок удаляет gc_media.
+    """
+    name = models.CharField('Файл', max_length=100, unique=True)
+    references = models.PositiveIntegerField('Постов с картинкой', default=0)
+    changed = models.DateTimeField('Изменено', auto_now=True)
+
+    class Meta:
+        verbose_name = 'Файл картинки'
+        verbose_name_plural = 'Файлы картинок'
+        indexes = [
+            models.Index(fields=['references', 'changed']),
+        ]
+
+    def __str__(self):
+        return self.name
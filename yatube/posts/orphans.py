@@ -0,0 +1,104 @@
+import os
+from datetime import datetime, timedelta
+
+from django.utils import timezone
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+from .models import Post, StoredImage
+from .storage import post_image_storage
+
+# Каталог картинок постов в хранилище, как в upload_to.
+ROOT = 'posts'
+
+
+def _changed(name):
+    return timezone.make_aware(datetime.fromtimestamp(
+        os.path.getmtime(post_image_storage.path(name))
+    ))
+
+
+def _walk(directory):
+    directories, files = post_image_storage.listdir(directory)
+    for name in files:
+        yield f'{directory}/{name}'
+    for subdirectory in directories:
+        yield from _walk(f'{directory}/{subdirectory}')
+
+
+def remove(name):
+    """Удаляет файл картинки и все её миниатюры вместе с записями sorl."""
+    # Миниатюры создаются по имени через хранилище sorl, под тем же
+    # ключом их и нужно искать.
+    default.kvstore.delete(ImageFile(name))
+    post_image_storage.delete(name)
+
+
+def unreferenced(cutoff):
+    """
+    Картинки, на которые не ссылается ни один пост с момента cutoff:
+    их оставили после post_edit или удаления постов.
+    """
+    # Список читается заранее: по ходу обхода записи удаляются.
+    for image in list(StoredImage.objects.filter(
+            references=0, changed__lt=cutoff)):
+        exists = post_image_storage.exists(image.name)
+        if exists and _changed(image.name) >= cutoff:
+            continue
+        if Post.objects.filter(image=image.name).exists():
+            continue
+        yield image, exists
+
+
+def untracked(cutoff):
+    """
+    Файлы каталога картинок, о которых нет записи: загрузки, чей пост так
+    и не сохранился, и брошенные временные файлы.
+    """
+    if not post_image_storage.exists(ROOT):
+        return
+    batch = []
+    for name in _walk(ROOT):
+        if _changed(name) < cutoff:
+            batch.append(name)
+        if len(batch) >= 500:
+            yield from _untracked(batch)
+            batch = []
+    yield from _untracked(batch)
+
+
+def _untracked(names):
+    unknown = set(names) - set(StoredImage.objects.filter(
+        name__in=names).values_list('name', flat=True))
+    if unknown:
+        # Посты, загруженные в обход сигналов, могли ещё не попасть в учёт.
+        unknown -= set(Post.objects.filter(
+            image__in=unknown).values_list('image', flat=True))
+    for name in names:
+        if name in unknown:
+            yield name
+
+
+def collect(min_age=timedelta(hours=1), dry_run=False):
+    """
+    Удаляет файлы картинок без ссылок старше min_age вместе с миниатюрами.
+    Возвращает число удалённых файлов и освобождённые байты.
+    """
+    cutoff = timezone.now() - min_age
+    removed = freed = 0
+    for image, exists in unreferenced(cutoff):
+        if exists:
+            freed += post_image_storage.size(image.name)
+        if not dry_run:
+            # Запись удаляется, только если ссылок так и не появилось.
+            if not StoredImage.objects.filter(
+                    pk=image.pk, references=0).delete()[0]:
+                continue
+            remove(image.name)
+        removed += 1
+    for name in untracked(cutoff):
+        freed += post_image_storage.size(name)
+        if not dry_run:
+            remove(name)
+        removed += 1
+    return removed, freed
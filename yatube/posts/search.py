@@ -0,0 +1,267 @@
+import re
+from collections import Counter
+
+from django.db import connection, transaction
+from django.db.models import IntegerField, OuterRef, Q, Subquery, Sum
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Comment, Post, SearchTerm
+
+FTS_TABLE = 'posts_search'
+# Сколько результатов показывает поиск.
+LIMIT = 50
+BATCH_SIZE = 500
+SNIPPET_WORDS = 12
+TERM_LENGTH = SearchTerm._meta.get_field('term').max_length
+# Маркеры подсветки не встречаются в тексте и переживают экранирование.
+MARK_START, MARK_END = '\x02', '\x03'
+
+_use_fts = None
+
+
+def uses_fts():
+    """Поиск идёт через FTS5, если таблица posts_search есть в базе."""
+    global _use_fts
+    if _use_fts is None:
+        _use_fts = (
+            connection.vendor == 'sqlite'
+            and FTS_TABLE in connection.introspection.table_names()
+        )
+    return _use_fts
+
+
+def _rowid(kind, object_id):
+    # Посты и комментарии делят одну FTS-таблицу: чётные rowid у постов,
+    # нечётные у комментариев.
+    return object_id * 2 + (kind == SearchTerm.COMMENT)
+
+
+def _words(text):
+    return re.findall(r'\w+', text.lower())
+
+
+def parse_query(query):
+    """Слова запроса; «слово*» означает поиск по префиксу."""
+    return [
+        (word.lower(), prefix == '*')
+        for word, prefix in re.findall(r'(\w+)(\*?)', query)
+    ][:10]
+
+
+def _fts_write(rows):
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT OR REPLACE INTO {FTS_TABLE}(rowid, body, post_id) '
+            'VALUES (%s, %s, %s)',
+            rows,
+        )
+
+
+def _terms(kind, object_id, post_id, text):
+    return [
+        SearchTerm(term=term[:TERM_LENGTH], post_id=post_id, kind=kind,
+                   object_id=object_id, weight=weight)
+        for term, weight in Counter(_words(text)).items()
+    ]
+
+
+def index(kind, object_id, post_id, text):
+    """Заносит в индекс текст поста или комментария."""
+    if uses_fts():
+        _fts_write([(_rowid(kind, object_id), text, post_id)])
+        return
+    remove(kind, object_id)
+    SearchTerm.objects.bulk_create(
+        _terms(kind, object_id, post_id, text), batch_size=BATCH_SIZE
+    )
+
+
+def remove(kind, object_id):
+    """Убирает из индекса текст поста или комментария."""
+    if uses_fts():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                [_rowid(kind, object_id)],
+            )
+        return
+    SearchTerm.objects.filter(kind=kind, object_id=object_id).delete()
+
+
+def rebuild():
+    """Переиндексирует все посты и комментарии пачками."""
+    sources = (
+        (SearchTerm.POST, Post.objects.values_list('id', 'id', 'text')),
+        (SearchTerm.COMMENT,
+         Comment.objects.values_list('id', 'post_id', 'text')),
+    )
+    if uses_fts():
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+    else:
+        SearchTerm.objects.all().delete()
+    total = 0
+    for kind, rows in sources:
+        batch = []
+        for object_id, post_id, text in rows.order_by().iterator():
+            batch.append((kind, object_id, post_id, text))
+            if len(batch) >= BATCH_SIZE:
+                _write_batch(batch)
+                total += len(batch)
+                batch = []
+        _write_batch(batch)
+        total += len(batch)
+    return total
+
+
+@transaction.atomic
+def _write_batch(batch):
+    # Пачка пишется одной транзакцией, а не отдельной на каждую строку.
+    if uses_fts():
+        _fts_write([
+            (_rowid(kind, object_id), text, post_id)
+            for kind, object_id, post_id, text in batch
+        ])
+        return
+    SearchTerm.objects.bulk_create(
+        [term for row in batch for term in _terms(*row)],
+        batch_size=BATCH_SIZE,
+    )
+
+
+def _highlight(snippet):
+    return mark_safe(
+        escape(snippet)
+        .replace(MARK_START, '<mark>')
+        .replace(MARK_END, '</mark>')
+    )
+
+
+def _match(words):
+    return ' '.join(
+        '"{}"{}'.format(word, '*' if prefix else '') for word, prefix in words
+    )
+
+
+def _fts_search(words, limit):
+    found = {}
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT post_id, snippet({FTS_TABLE}, 0, %s, %s, %s, %s) '
+            f'FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+            f'ORDER BY bm25({FTS_TABLE})',
+            [MARK_START, MARK_END, '…', SNIPPET_WORDS, _match(words)],
+        )
+        for post_id, snippet in cursor:
+            found.setdefault(post_id, _highlight(snippet))
+            if len(found) >= limit:
+                break
+    return found
+
+
+def _term_filter(word, prefix):
+    return Q(term__startswith=word) if prefix else Q(term=word)
+
+
+def _fallback_posts(words):
+    posts = Post.objects.all()
+    for word, prefix in words:
+        posts = posts.filter(pk__in=SearchTerm.objects.filter(
+            _term_filter(word, prefix)).values('post'))
+    return posts
+
+
+def _text_snippet(text, words):
+    """Фрагмент текста вокруг первого совпадения с подсвеченными словами."""
+    tokens = re.split(r'(\w+)', text)
+    matched = [
+        i for i, token in enumerate(tokens)
+        if any(token.lower() == word
+               or prefix and token.lower().startswith(word)
+               for word, prefix in words)
+    ]
+    if not matched:
+        return None
+    start = max(matched[0] - SNIPPET_WORDS, 0)
+    end = matched[0] + SNIPPET_WORDS
+    parts = [
+        f'{MARK_START}{token}{MARK_END}' if i in matched else token
+        for i, token in enumerate(tokens[start:end], start)
+    ]
+    return _highlight(
+        ('…' if start else '') + ''.join(parts)
+        + ('…' if end < len(tokens) else '')
+    )
+
+
+def _fallback_search(words, limit):
+    terms = Q()
+    for word, prefix in words:
+        terms |= _term_filter(word, prefix)
+    rank = Coalesce(Subquery(
+        SearchTerm.objects.filter(terms, post=OuterRef('pk'))
+        .order_by()
+        .values('post')
+        .annotate(total=Sum('weight'))
+        .values('total'),
+        output_field=IntegerField(),
+    ), 0)
+    ranked = _fallback_posts(words).annotate(rank=rank).order_by(
+        '-rank', '-pub_date'
+    )
+    found = {}
+    for post in ranked.only('id', 'text')[:limit]:
+        texts = [post.text] + list(
+            post.comments.order_by().values_list('text', flat=True)
+        )
+        snippets = (_text_snippet(text, words) for text in texts)
+        found[post.pk] = next(filter(None, snippets), None)
+    return found
+
+
+def search(query, limit=LIMIT):
+    """
+    Посты по запросу в порядке релевантности. Каждому посту добавлен
+    атрибут snippet с подсвеченным фрагментом найденного текста.
+    """
+    words = parse_query(query)
+    if not words:
+        return []
+    if uses_fts():
+        found = _fts_search(words, limit)
+    else:
+        found = _fallback_search(words, limit)
+    posts = Post.objects.for_feed().in_bulk(list(found))
+    results = []
+    for post_id, snippet in found.items():
+        if post_id in posts:
+            post = posts[post_id]
+            post.snippet = snippet
+            results.append(post)
+    return results
+
+
+class _RawSubquery(RawSQL):
+    # Лукап pk__in сам берёт подзапрос в скобки, а RawSQL добавляет свои,
+    # и SQLite читает «IN ((SELECT ...))» как скалярный подзапрос.
+    def as_sql(self, compiler, connection):
+        return self.sql, self.params
+
+
+def post_ids(query):
+    """
+    Подзапрос с номерами найденных постов для фильтра pk__in, например
+    в админке: номера не выгружаются в Python, фильтр остаётся в SQL.
+    """
+    words = parse_query(query)
+    if not words:
+        return Post.objects.none().values('pk')
+    if not uses_fts():
+        return _fallback_posts(words).values('pk')
+    return _RawSubquery(
+        f'SELECT post_id FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+        [_match(words)],
+    )
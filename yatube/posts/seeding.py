@@ -0,0 +1,355 @@
+import math
+import multiprocessing
+import random
+from bisect import bisect
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from io import BytesIO
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.color import no_style
+from django.db import connection, connections, transaction
+from django.utils import timezone
+from faker import Faker
+from PIL import Image, ImageDraw
+
+from . import counters, search, timeline
+from .models import Comment, Follow, Group, Post, User
+
+BATCH_SIZE = 5000
+# Объём данных по умолчанию: при нём видны проблемы производительности.
+SIZES = {
+    'users': 100_000,
+    'groups': 1_000,
+    'posts': 1_000_000,
+    'comments': 5_000_000,
+    'follows': 30,
+}
+# Сколько разных фраз Faker генерирует для текстов: дальше они
+# комбинируются случайно, это в сотни раз быстрее генерации каждого текста.
+PHRASES = 5000
+# Показатель степенного закона популярности авторов: немногие авторы
+# собирают большинство подписчиков, постов и комментариев.
+POPULARITY_EXPONENT = 1.1
+# Сколько разных картинок получают посты: файлы общие для всех постов.
+IMAGES = 20
+IMAGE_SIZE = (960, 540)
+# Даты постов и комментариев отсчитываются назад от этой даты, а не от
+# текущей: с одним зерном данные совпадают, когда бы их ни создали.
+END = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+class SeedError(Exception):
+    pass
+
+
+@contextmanager
+def manual_dates(*fields):
+    """
+    Отключает auto_now_add у полей на время bulk_create, чтобы сохранились
+    даты, заданные при генерации.
+    """
+    saved = [(field, field.auto_now_add) for field in fields]
+    for field, _ in saved:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, value in saved:
+            field.auto_now_add = value
+
+
+def last_id(model):
+    return model.objects.order_by('-pk').values_list(
+        'pk', flat=True).first() or 0
+
+
+def reset_sequences(model):
+    """После вставки с явными id счётчик первичного ключа сдвигается."""
+    statements = connection.ops.sequence_reset_sql(no_style(), [model])
+    if statements:
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+
+
+def _work(insert, chunks):
+    try:
+        for chunk in chunks:
+            insert(chunk)
+    finally:
+        connections.close_all()
+
+
+class Seeder:
+    """
+    Генератор связанного набора пользователей, групп, постов, комментариев
+    и подписок. Данные создаются пачками по batch_size, каждая пачка —
+    одной транзакцией. Содержимое пачки зависит только от seed и номера
+    пачки, поэтому результат не меняется от числа процессов workers:
+    процессы берут пачки по очереди и пишут в свои диапазоны id. Имена и
+    даты не зависят ни от уже созданных строк, ни от текущего времени.
+    """
+
+    def __init__(self, seed=0, days=365, batch_size=BATCH_SIZE, workers=1,
+                 images=0.0, log=None, end=END):
+        self.seed = seed
+        self.batch_size = batch_size
+        self.workers = workers
+        self.images = images
+        self.log = log or (lambda message: None)
+        self.end = end
+        self.start = self.end - timedelta(days=days)
+        self.span = (self.end - self.start).total_seconds()
+        faker = Faker('ru_RU')
+        faker.seed_instance(seed)
+        self.phrases = [faker.sentence() for _ in range(PHRASES)]
+        self.titles = [faker.catch_phrase()[:200] for _ in range(PHRASES)]
+        self.people = [
+            (faker.first_name(), faker.last_name(), faker.user_name())
+            for _ in range(PHRASES)
+        ]
+        self.user_ids = []
+        self.user_weights = []
+        self.group_ids = []
+        self.post_ids = range(0)
+        self.image_names = []
+        self.run = 0
+
+    def rng(self, phase, chunk=0):
+        return random.Random(f'{self.seed}:{phase}:{chunk}')
+
+    def text(self, rng, low, high):
+        return ' '.join(rng.choices(self.phrases, k=rng.randint(low, high)))
+
+    def popular(self, rng):
+        """Случайный пользователь с учётом популярности."""
+        point = rng.random() * self.user_weights[-1]
+        return self.user_ids[bisect(self.user_weights, point)]
+
+    def _run(self, chunks, insert):
+        if self.workers <= 1 or chunks <= 1:
+            for chunk in range(chunks):
+                insert(chunk)
+            return
+        # Процессы-потомки открывают свои соединения с базой.
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        processes = [
+            context.Process(
+                target=_work,
+                args=(insert, range(index, chunks, self.workers)),
+            )
+            for index in range(min(self.workers, chunks))
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        if any(process.exitcode for process in processes):
+            raise SeedError('Не все процессы завершились успешно')
+
+    def _fill_chunks(self, model, phase, chunks, build):
+        """Создаёт объекты пачками: build(rng, chunk) возвращает пачку."""
+        def insert(chunk):
+            objects = build(self.rng(phase, chunk), chunk)
+            with transaction.atomic():
+                model.objects.bulk_create(objects)
+        self._run(chunks, insert)
+        reset_sequences(model)
+
+    def _fill(self, model, phase, count, build):
+        """
+        Создаёт count объектов с id подряд после последнего в таблице;
+        build(rng, number, pk) строит объект по его сквозному номеру.
+        """
+        first = last_id(model) + 1
+
+        def build_chunk(rng, chunk):
+            start = chunk * self.batch_size
+            return [
+                build(rng, number, first + number)
+                for number in range(start, min(start + self.batch_size, count))
+            ]
+        self._fill_chunks(
+            model, phase, math.ceil(count / self.batch_size), build_chunk
+        )
+        return range(first, first + count)
+
+    def suffix(self, number, run):
+        # Повторный запуск с тем же зерном дописывает данные: у его имён
+        # номер запуска в конце.
+        return f'{self.seed}_{number}' + (f'_{run}' if run else '')
+
+    def next_run(self):
+        """Номер запуска с этим зерном: 0, если данных с ним ещё нет."""
+        name = self.rng('users').choice(self.people)[2]
+        run = 0
+        while (User.objects.filter(
+                username=f'{name}_{self.suffix(0, run)}').exists()
+               or Group.objects.filter(
+                   slug=f'group-{self.suffix(0, run)}').exists()):
+            run += 1
+        return run
+
+    def users(self, count):
+        password = make_password(None)
+
+        def build(rng, number, pk):
+            first_name, last_name, username = rng.choice(self.people)
+            return User(
+                pk=pk,
+                username=f'{username}_{self.suffix(number, self.run)}',
+                first_name=first_name,
+                last_name=last_name,
+                password=password,
+            )
+        order = list(self._fill(User, 'users', count, build))
+        self.rng('popularity').shuffle(order)
+        self.user_ids = order
+        self.user_weights = list(accumulate(
+            1 / (rank + 1) ** POPULARITY_EXPONENT
+            for rank in range(len(order))
+        ))
+        self.log(f'Пользователей: {count}')
+
+    def groups(self, count):
+        def build(rng, number, pk):
+            return Group(
+                pk=pk,
+                title=rng.choice(self.titles),
+                slug=f'group-{self.suffix(number, self.run)}',
+                description=self.text(rng, 1, 3),
+            )
+        self.group_ids = list(self._fill(Group, 'groups', count, build))
+        self.log(f'Групп: {count}')
+
+    def make_images(self):
+        """Картинки для постов: цветные прямоугольники, по одной на номер."""
+        for number in range(IMAGES):
+            rng = self.rng('images', number)
+            name = f'posts/seed/{self.seed}-{number}.jpg'
+            colors = [
+                tuple(rng.randrange(256) for _ in range(3))
+                for _ in range(4)
+            ]
+            if not default_storage.exists(name):
+                image = Image.new('RGB', IMAGE_SIZE, colors[0])
+                draw = ImageDraw.Draw(image)
+                width, height = IMAGE_SIZE
+                for color in colors[1:]:
+                    left, top = rng.randrange(width), rng.randrange(height)
+                    draw.rectangle(
+                        [left, top, left + width // 3, top + height // 3],
+                        fill=color,
+                    )
+                content = BytesIO()
+                image.save(content, 'JPEG', quality=80)
+                default_storage.save(name, ContentFile(content.getvalue()))
+            self.image_names.append(name)
+
+    def posts(self, count, with_group=0.7):
+        if self.images:
+            self.make_images()
+
+        def build(rng, number, pk):
+            group_id = None
+            if self.group_ids and rng.random() < with_group:
+                group_id = rng.choice(self.group_ids)
+            image = ''
+            if self.image_names and rng.random() < self.images:
+                image = rng.choice(self.image_names)
+            return Post(
+                pk=pk,
+                text=self.text(rng, 1, 8),
+                author_id=self.popular(rng),
+                group_id=group_id,
+                image=image,
+                pub_date=self.start + timedelta(
+                    seconds=self.span * (number + rng.random()) / count
+                ),
+            )
+        with manual_dates(Post._meta.get_field('pub_date')):
+            self.post_ids = self._fill(Post, 'posts', count, build)
+        self.log(f'Постов: {count}')
+
+    def comments(self, count):
+        ids = self.post_ids
+        if not ids:
+            return
+
+        def build(rng, number, pk):
+            # Свежие посты комментируют чаще старых.
+            position = len(ids) - 1 - int(len(ids) * rng.random() ** 3)
+            age = self.span * position / len(ids)
+            return Comment(
+                pk=pk,
+                post_id=ids[position],
+                author_id=self.popular(rng),
+                text=self.text(rng, 1, 3),
+                created=self.start + timedelta(
+                    seconds=age + (self.span - age) * rng.random()
+                ),
+            )
+        with manual_dates(Comment._meta.get_field('created')):
+            self._fill(Comment, 'comments', count, build)
+        self.log(f'Комментариев: {count}')
+
+    def follows(self, average):
+        """
+        Подписки: число подписок у читателей распределено по Парето со
+        средним average, а авторов выбирают с учётом популярности.
+        """
+        alpha = 1.5
+        scale = average * (alpha - 1) / alpha
+        readers = sorted(self.user_ids)
+
+        def build(rng, chunk):
+            start = chunk * self.batch_size
+            follows = []
+            for user_id in readers[start:start + self.batch_size]:
+                wanted = min(
+                    int(scale * rng.paretovariate(alpha)), len(readers) - 1
+                )
+                authors = {self.popular(rng) for _ in range(wanted)}
+                authors.discard(user_id)
+                follows.extend(
+                    Follow(user_id=user_id, author_id=author_id)
+                    for author_id in sorted(authors)
+                )
+            return follows
+        self._fill_chunks(
+            Follow, 'follows', math.ceil(len(readers) / self.batch_size),
+            build,
+        )
+        self.log(f'Подписок: {Follow.objects.count()}')
+
+
+def repair(log=None):
+    """
+    Восстанавливает то, что обычно делают сигналы моделей: bulk_create их
+    не вызывает. Пересчитывает счётчики, ленты подписок и поисковый индекс.
+    """
+    log = log or (lambda message: None)
+    log(f'Исправлено счётчиков: {counters.recount()}')
+    log(f'Записей в лентах: {timeline.rebuild()}')
+    log(f'Проиндексировано текстов: {search.rebuild()}')
+    cache.clear()
+
+
+def seed(users, groups, posts, comments, follows, seed=0, images=0.0,
+         batch_size=BATCH_SIZE, workers=1, log=None, end=END):
+    """Наполняет базу связанными данными и приводит в порядок производные."""
+    seeder = Seeder(seed=seed, batch_size=batch_size, workers=workers,
+                    images=images, log=log, end=end)
+    seeder.run = seeder.next_run()
+    seeder.users(users)
+    seeder.groups(groups)
+    seeder.posts(posts)
+    seeder.comments(comments)
+    seeder.follows(follows)
+    repair(log)
@@ -0,0 +1,85 @@
+from .models import Post
+
+
+class InvalidFields(Exception):
+    pass
+
+
+def _image_url(name):
+    # Картинки лежат в хранилище поля image, а не в default_storage.
+    return Post._meta.get_field('image').storage.url(name) if name else None
+
+
+class Serializer:
+    """
+    Описание ответа API: имя поля в ответе — путь для values(). Строки
+    читаются из базы словарями, без создания объектов моделей, и только
+    с теми столбцами, которые запросили в ?fields=.
+    """
+    fields = {}
+    converters = {}
+
+    def __init__(self, requested=None):
+        names = [name.strip() for name in (requested or '').split(',')]
+        names = [name for name in names if name]
+        unknown = [name for name in names if name not in self.fields]
+        if unknown:
+            raise InvalidFields(', '.join(unknown))
+        self.selected = names or list(self.fields)
+
+    def values(self, queryset, *required):
+        """Запрос выбранных полей; required нужны, например, курсору."""
+        lookups = {self.fields[name] for name in self.selected}
+        return queryset.values(*lookups.union(required))
+
+    def row(self, values):
+        result = {}
+        for name in self.selected:
+            value = values[self.fields[name]]
+            convert = self.converters.get(name)
+            result[name] = convert(value) if convert else value
+        return result
+
+
+class PostSerializer(Serializer):
+    fields = {
+        'id': 'id',
+        'text': 'text',
+        'pub_date': 'pub_date',
+        'author': 'author__username',
+        'group': 'group__slug',
+        'image': 'image',
+        'comments_count': 'comments_count',
+    }
+    converters = {'image': _image_url}
+
+
+class CommentSerializer(Serializer):
+    fields = {
+        'id': 'id',
+        'post': 'post_id',
+        'text': 'text',
+        'created': 'created',
+        'author': 'author__username',
+    }
+
+
+class GroupSerializer(Serializer):
+    fields = {
+        'id': 'id',
+        'slug': 'slug',
+        'title': 'title',
+        'description': 'description',
+    }
+
+
+class ProfileSerializer(Serializer):
+    fields = {
+        'id': 'id',
+        'username': 'username',
+        'first_name': 'first_name',
+        'last_name': 'last_name',
+        'posts_count': 'stats__posts_count',
+        'followers_count': 'stats__followers_count',
+        'following_count': 'stats__following_count',
+    }
@@ -0,0 +1,186 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import counters, feed_cache, search, thumbnails, timeline
+from .models import Comment, Follow, Group, Post, SearchTerm, User
+
+
+# Счётчики обновляются раньше лент: раскладка постов по лентам
+# сверяется с числом подписчиков автора.
+@receiver(post_save, sender=Post)
+def count_post(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.change_user(instance.author_id, 'posts_count', 1)
+
+
+@receiver(post_delete, sender=Post)
+def uncount_post(sender, instance, **kwargs):
+    counters.change_user(instance.author_id, 'posts_count', -1)
+
+
+@receiver(post_save, sender=Comment)
+def count_comment(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.change_post(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def uncount_comment(sender, instance, **kwargs):
+    counters.change_post(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Post)
+def count_image(sender, instance, raw=False, **kwargs):
+    image = instance.image.name
+    previous = getattr(instance, '_previous_image', None)
+    if not raw and image != previous:
+        counters.change_image(image, 1)
+        counters.change_image(previous, -1)
+
+
+@receiver(post_delete, sender=Post)
+def uncount_image(sender, instance, **kwargs):
+    counters.change_image(instance.image.name, -1)
+
+
+@receiver(post_save, sender=Follow)
+def count_follow(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.change_user(instance.user_id, 'following_count', 1)
+        counters.change_user(instance.author_id, 'followers_count', 1)
+        timeline.promote(instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def uncount_follow(sender, instance, **kwargs):
+    counters.change_user(instance.user_id, 'following_count', -1)
+    counters.change_user(instance.author_id, 'followers_count', -1)
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        timeline.fan_out(instance)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        timeline.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def prune_timeline(sender, instance, **kwargs):
+    timeline.prune(instance.user_id, instance.author_id)
+
+
+@receiver(pre_save, sender=Post)
+def remember_previous(sender, instance, raw=False, **kwargs):
+    instance._previous_group_id = instance._previous_image = None
+    if not instance._state.adding and not raw:
+        instance._previous_group_id, instance._previous_image = (
+            sender.objects.filter(pk=instance.pk)
+            .values_list('group_id', 'image').first() or (None, None)
+        )
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def bump_post_feeds(sender, instance, **kwargs):
+    feed_cache.bump(*feed_cache.post_names(
+        instance,
+        instance.group_id,
+        getattr(instance, '_previous_group_id', None),
+    ))
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def bump_comment_feeds(sender, instance, **kwargs):
+    feed_cache.bump(feed_cache.PAGES, f'post:{instance.post_id}')
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def bump_group_feeds(sender, instance, **kwargs):
+    feed_cache.bump(feed_cache.SITE)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def forget_group_latest(sender, instance, **kwargs):
+    feed_cache.forget_group_latest(
+        instance.group_id, getattr(instance, '_previous_group_id', None)
+    )
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def forget_renamed_group_latest(sender, instance, **kwargs):
+    feed_cache.forget_group_latest(instance.pk)
+
+
+# Имя автора показывают карточки, ленты и комментарии.
+USER_NAME_FIELDS = ('username', 'first_name', 'last_name')
+
+
+@receiver(pre_save, sender=User)
+def remember_previous_name(sender, instance, raw=False, update_fields=None,
+                           **kwargs):
+    instance._previous_name = None
+    if (instance._state.adding or raw or update_fields is not None
+            and not set(update_fields) & set(USER_NAME_FIELDS)):
+        return
+    instance._previous_name = sender.objects.filter(
+        pk=instance.pk).values_list(*USER_NAME_FIELDS).first()
+
+
+@receiver(post_save, sender=User)
+def bump_renamed_author_feeds(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous_name', None)
+    current = tuple(getattr(instance, field) for field in USER_NAME_FIELDS)
+    if previous is None or previous == current:
+        return
+    # Посты и комментарии автора могут быть в любой ленте: переименование
+    # редкое, поэтому сдвигается общее поколение, а не поколения лент
+    # каждого его поста.
+    feed_cache.bump(feed_cache.SITE, feed_cache.PAGES)
+    feed_cache.forget_group_latest(*Post.objects.filter(
+        author=instance
+    ).values_list('group_id', flat=True).order_by().distinct())
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def bump_follow_pages(sender, instance, **kwargs):
+    feed_cache.bump(feed_cache.PAGES)
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index(SearchTerm.POST, instance.pk, instance.pk, instance.text)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    search.remove(SearchTerm.POST, instance.pk)
+
+
+@receiver(post_save, sender=Comment)
+def index_comment(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index(SearchTerm.COMMENT, instance.pk, instance.post_id,
+                     instance.text)
+
+
+@receiver(post_delete, sender=Comment)
+def unindex_comment(sender, instance, **kwargs):
+    search.remove(SearchTerm.COMMENT, instance.pk)
+
+
+@receiver(post_save, sender=Post)
+def schedule_thumbnails(sender, instance, raw=False, **kwargs):
+    image = instance.image.name
+    if not raw and image and image != instance._previous_image:
+        thumbnails.schedule(image)
@@ -0,0 +1,62 @@
+import hashlib
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage, get_storage_class
+
+# Сколько символов хэша уходит в имя подкаталога: иначе все картинки
+# лежали бы в одном каталоге.
+PREFIX_LENGTH = 2
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Хранилище картинок постов по хэшу содержимого: файл получает имя
+    posts/ab/<sha256>.<расширение>. Хэш считается, пока загрузка пишется
+    во временный файл, поэтому файл читается один раз. Если такое
+    содержимое уже есть, второй копии не появляется, а миниатюры sorl,
+    привязанные к имени, не приходится создавать заново.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # Имя выберет _save по содержимому, одинаковые имена не конфликтуют.
+        return name
+
+    def hashed_name(self, name, digest):
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        return os.path.join(
+            directory, digest[:PREFIX_LENGTH], digest + extension
+        ).replace('\\', '/')
+
+    def _save(self, name, content):
+        directory = self.path(os.path.dirname(name))
+        os.makedirs(directory, exist_ok=True)
+        handle, temporary = tempfile.mkstemp(dir=directory, prefix='.upload-')
+        digest = hashlib.sha256()
+        try:
+            with os.fdopen(handle, 'wb') as output:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    output.write(chunk)
+            name = self.hashed_name(name, digest.hexdigest())
+            path = self.path(name)
+            if os.path.exists(path):
+                os.remove(temporary)
+                # Свежее время изменения не даёт gc_media удалить файл,
+                # который только что загрузили снова.
+                os.utime(path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(temporary, path)
+                # mkstemp создаёт файл, доступный только владельцу.
+                os.chmod(path, self.file_permissions_mode or 0o644)
+        except BaseException:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+        return name
+
+
+post_image_storage = get_storage_class(settings.POST_IMAGE_STORAGE)()
@@ -0,0 +1,27 @@
+from django import template
+
+from posts import thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_image(image, geometry, **options):
+    """
+    Миниатюра картинки поста, если она уже создана, иначе сама картинка.
+    Недостающие миниатюры создаются в фоне, а не во время запроса.
+    """
+    if not image:
+        return None
+    thumbnail = thumbnails.ready(image.name, geometry, **options)
+    if thumbnail is None:
+        thumbnails.schedule(image.name)
+        return image
+    return thumbnail
+
+
+@register.simple_tag
+def prefetch_post_images(posts):
+    """Заранее узнаёт, какие миниатюры картинок постов уже готовы."""
+    thumbnails.prefetch(post.image.name for post in posts)
+    return ''
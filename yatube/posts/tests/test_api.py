@@ -0,0 +1,161 @@
+from http import HTTPStatus
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+from posts.tests.test_views import HOSTILE_CURSORS, hostile
+
+User = get_user_model()
+
+
+class ApiTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        cls.posts = [
+            Post.objects.create(
+                author=cls.author, text=f'Пост {number}',
+                group=cls.group if number % 2 else None,
+            )
+            for number in range(15)
+        ]
+        cls.post = cls.posts[-1]
+        for number in range(3):
+            Comment.objects.create(
+                post=cls.post, author=cls.reader, text=f'Ответ {number}'
+            )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def get(self, name, *args, client=None, **params):
+        response = (client or self.client).get(
+            reverse(f'api:{name}', args=args), params
+        )
+        return response, response.json()
+
+    def test_post_list_pages_by_cursor(self):
+        """Посты отдаются от новых к старым, страницы связаны курсором."""
+        response, data = self.get('post_list', limit=10)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(len(data['results']), 10)
+        self.assertIsNone(data['previous'])
+        self.assertEqual(data['results'][0]['id'], self.post.pk)
+        second = self.client.get(data['next']).json()
+        ids = [post['id'] for post in data['results'] + second['results']]
+        self.assertEqual(
+            ids, [post.pk for post in reversed(self.posts)]
+        )
+        self.assertIsNone(second['next'])
+        self.assertIsNotNone(second['previous'])
+
+    def test_sparse_fieldsets(self):
+        """?fields= оставляет в ответе только перечисленные поля."""
+        _, data = self.get('post_list', fields='id,author')
+        self.assertEqual(
+            data['results'][0], {'id': self.post.pk, 'author': 'author'}
+        )
+        _, data = self.get('post_detail', self.post.pk, fields='text')
+        self.assertEqual(data, {'text': self.post.text})
+
+    def test_image_url_comes_from_field_storage(self):
+        """Адрес картинки строит хранилище поля image."""
+        Post.objects.filter(pk=self.post.pk).update(image='posts/ab/cd.gif')
+        storage = Post._meta.get_field('image').storage
+        with mock.patch.object(storage, 'url', return_value='/img/cd.gif'):
+            _, data = self.get('post_detail', self.post.pk, fields='image')
+        self.assertEqual(data, {'image': '/img/cd.gif'})
+
+    def test_hostile_cursor_returns_first_page(self):
+        for payload in HOSTILE_CURSORS:
+            with self.subTest(payload=payload):
+                response, data = self.get(
+                    'post_list', cursor=hostile(payload))
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                self.assertEqual(data['results'][0]['id'], self.post.pk)
+
+    def test_unknown_field_is_rejected(self):
+        response, data = self.get('post_list', fields='id,password')
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        self.assertIn('password', data['detail'])
+
+    def test_group_and_profile(self):
+        _, group = self.get('group_detail', 'group')
+        self.assertEqual(group['title'], 'Группа')
+        _, posts = self.get('group_posts', 'group', limit=100)
+        self.assertEqual(len(posts['results']), 7)
+        self.assertTrue(all(
+            post['group'] == 'group' for post in posts['results']
+        ))
+        _, profile = self.get(
+            'profile_detail', 'author', client=self.reader_client
+        )
+        self.assertEqual(profile['posts_count'], 15)
+        self.assertTrue(profile['following'])
+        _, profile = self.get('profile_detail', 'author', fields='username')
+        self.assertEqual(profile, {'username': 'author', 'following': False})
+
+    def test_comments(self):
+        _, data = self.get('comment_list', self.post.pk)
+        self.assertEqual(
+            [comment['text'] for comment in data['results']],
+            ['Ответ 2', 'Ответ 1', 'Ответ 0'],
+        )
+
+    def test_follow_feed_requires_login(self):
+        response, _ = self.get('follow_list')
+        self.assertEqual(response.status_code, HTTPStatus.UNAUTHORIZED)
+        _, data = self.get('follow_list', client=self.reader_client)
+        self.assertEqual(data['results'][0]['id'], self.post.pk)
+
+    def test_missing_objects(self):
+        for name, args in (
+            ('post_detail', [0]),
+            ('comment_list', [0]),
+            ('group_posts', ['missing']),
+            ('profile_posts', ['missing']),
+        ):
+            with self.subTest(name=name):
+                response, data = self.get(name, *args)
+                self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+                self.assertIn('detail', data)
+
+    def test_read_only(self):
+        response = self.client.post(reverse('api:post_list'))
+        self.assertEqual(
+            response.status_code, HTTPStatus.METHOD_NOT_ALLOWED
+        )
+
+    def test_list_is_one_query(self):
+        """Список постов читается одним запросом, без объектов моделей."""
+        with self.assertNumQueries(1):
+            self.get('post_list')
+
+    def test_query_budgets(self):
+        """Ни один адрес API не выходит за бюджет и для вошедших."""
+        for name, args in (
+            ('post_list', []),
+            ('post_detail', [self.post.pk]),
+            ('comment_list', [self.post.pk]),
+            ('group_detail', ['group']),
+            ('group_posts', ['group']),
+            ('profile_detail', ['author']),
+            ('profile_posts', ['author']),
+            ('follow_list', []),
+        ):
+            with self.subTest(name=name):
+                cache.clear()
+                response, _ = self.get(name, *args, client=self.reader_client)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
@@ -0,0 +1,311 @@
+import asyncio
+import shutil
+import tempfile
+import threading
+from datetime import date, datetime
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection
+from django.test import (SimpleTestCase, TestCase, TransactionTestCase,
+                         override_settings)
+from django.utils import timezone
+
+from core import db
+from core.asgi import ASGIHandler
+from posts import benchmark, seeding
+from posts.models import (Comment, Group, Post, TimelineEntry, User,
+                          UserStats)
+
+
+class BenchmarkTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        seeding.seed(users=30, groups=3, posts=60, comments=120, follows=4)
+
+    def test_seeded_data_is_consistent(self):
+        """Данные сида связаны, а производные таблицы пересчитаны."""
+        self.assertEqual(Post.objects.count(), 60)
+        self.assertEqual(Comment.objects.count(), 120)
+        self.assertTrue(TimelineEntry.objects.exists())
+        stats = UserStats.objects.get(user=Post.objects.first().author)
+        self.assertGreater(stats.posts_count, 0)
+        dates = Post.objects.values_list('pub_date', flat=True)
+        self.assertGreater(len(set(dates)), 1)
+
+    def test_views_fit_query_budgets(self):
+        """Замер даёт перцентили, а страницы укладываются в бюджет."""
+        results = benchmark.measure(requests=3, warmup=1)
+        budgets = {
+            'index': 'posts:index',
+            'group_posts': 'posts:groups',
+            'profile': 'posts:profile',
+            'post_detail': 'posts:post_detail',
+            'follow_index': 'posts:follow_index',
+        }
+        self.assertEqual(set(results), set(benchmark.VIEWS))
+        for view, figures in results.items():
+            with self.subTest(view=view):
+                self.assertLessEqual(figures['p50_ms'], figures['p99_ms'])
+                self.assertLessEqual(
+                    figures['queries_max'],
+                    settings.QUERY_BUDGETS[budgets[view]],
+                )
+
+    def test_percentile(self):
+        """Перцентиль считается по ближайшему рангу."""
+        values = list(range(1, 101))
+        self.assertEqual(benchmark.percentile(values, 50), 50)
+        self.assertEqual(benchmark.percentile(values, 99), 99)
+        self.assertEqual(benchmark.percentile([7], 95), 7)
+
+
+class ASGIHandlerTest(SimpleTestCase):
+    def call(self, scope, messages):
+        def echo(environ, start_response):
+            start_response('201 Created', [('X-Path', environ['PATH_INFO'])])
+            return [
+                environ['wsgi.input'].read(), environ['HTTP_ACCEPT'].encode()
+            ]
+
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message)
+
+        handler = ASGIHandler(echo, threads=1)
+        asyncio.run(handler(scope, receive, send))
+        handler.executor.shutdown()
+        return sent
+
+    def test_request_runs_in_thread_pool(self):
+        """Тело и заголовки доходят до WSGI-приложения, ответ — клиенту."""
+        sent = self.call(
+            {
+                'type': 'http', 'method': 'POST', 'path': '/путь/',
+                'headers': [(b'accept', b'a'), (b'accept', b'b')],
+            },
+            [
+                {'type': 'http.request', 'body': b'te', 'more_body': True},
+                {'type': 'http.request', 'body': b'xt'},
+            ],
+        )
+        self.assertEqual(sent[0]['status'], 201)
+        self.assertEqual(
+            dict(sent[0]['headers'])[b'x-path'],
+            '/путь/'.encode(),
+        )
+        self.assertEqual(
+            b''.join(message['body'] for message in sent[1:]), b'texta,b'
+        )
+
+    def test_streaming_response_sent_by_chunks(self):
+        """Потоковый ответ уходит по кускам, а не собирается целиком."""
+        sent = []
+
+        class Streaming:
+            streaming = True
+            closed = False
+
+            def __iter__(self):
+                for chunk in (b'first', b'', b'second'):
+                    # Предыдущий кусок уже у клиента.
+                    sent_before.append(len(sent))
+                    yield chunk
+
+            def close(self):
+                self.closed = True
+
+        sent_before = []
+        result = Streaming()
+
+        def application(environ, start_response):
+            start_response('200 OK', [])
+            return result
+
+        async def receive():
+            return {'type': 'http.request'}
+
+        async def send(message):
+            sent.append(message)
+
+        handler = ASGIHandler(application, threads=1)
+        asyncio.run(handler(
+            {'type': 'http', 'method': 'GET', 'path': '/'}, receive, send
+        ))
+        handler.executor.shutdown()
+        self.assertEqual(
+            [message.get('body') for message in sent],
+            [None, b'first', b'second', b''],
+        )
+        self.assertEqual(sent_before, [1, 2, 2])
+        self.assertTrue(result.closed)
+
+    def test_streaming_threads_release_connections(self):
+        """Каждый поток, работавший с потоковым ответом, закрывает базу."""
+        touched, released = set(), set()
+
+        def chunks():
+            for chunk in (b'a', b'b', b'c'):
+                touched.add(threading.get_ident())
+                yield chunk
+
+        class Streaming:
+            streaming = True
+
+            def __iter__(self):
+                return chunks()
+
+        def application(environ, start_response):
+            touched.add(threading.get_ident())
+            start_response('200 OK', [])
+            return Streaming()
+
+        async def receive():
+            return {'type': 'http.request'}
+
+        async def send(message):
+            pass
+
+        handler = ASGIHandler(application, threads=3)
+        with mock.patch(
+            'core.asgi.close_old_connections',
+            side_effect=lambda: released.add(threading.get_ident()),
+        ):
+            asyncio.run(handler(
+                {'type': 'http', 'method': 'GET', 'path': '/'}, receive, send
+            ))
+        handler.executor.shutdown()
+        self.assertTrue(touched)
+        self.assertLessEqual(touched, released)
+
+    def test_disconnect_before_body(self):
+        sent = self.call(
+            {'type': 'http', 'method': 'POST', 'path': '/'},
+            [{'type': 'http.disconnect'}],
+        )
+        self.assertEqual(sent, [])
+
+
+class CompareServersTest(TransactionTestCase):
+    # Потоки сервера ходят в базу через свои соединения и видят только
+    # зафиксированные данные.
+    def setUp(self):
+        seeding.seed(users=10, groups=2, posts=20, comments=20, follows=2)
+
+    def test_both_servers_answer(self):
+        """WSGI и ASGI отдают страницы, замер даёт пропускную способность."""
+        results = benchmark.compare_servers(
+            requests=8, concurrency=4, threads=2, client_delay=0
+        )
+        self.assertEqual(set(results), {'wsgi', 'asgi'})
+        for figures in results.values():
+            self.assertEqual(figures['requests'], 8)
+            self.assertGreater(figures['requests_per_second'], 0)
+
+    def test_database_profiles(self):
+        """Замер режимов базы не оставляет в ней своих комментариев."""
+        comments = Comment.objects.count()
+        results = benchmark.compare_databases(
+            duration=0.2, readers=2, writers=1
+        )
+        self.assertEqual(set(results), {'default', 'production'})
+        for kinds in results.values():
+            self.assertGreater(kinds['read']['requests'], 0)
+        self.assertEqual(Comment.objects.count(), comments)
+
+
+class DatabaseProfileTest(TestCase):
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas_applied_to_new_connections(self):
+        cache_size = self.pragma('cache_size')
+        try:
+            with override_settings(SQLITE_PRAGMAS={'cache_size': -1234}):
+                db.configure_sqlite(sender=None, connection=connection)
+            self.assertEqual(self.pragma('cache_size'), -1234)
+        finally:
+            db.pragmas(connection, {'cache_size': cache_size})
+
+    def test_broken_persistent_connection_closed(self):
+        """Перед запросом оборванное постоянное соединение закрывается."""
+        connection.ensure_connection()
+        with mock.patch.dict(connection.settings_dict, CONN_MAX_AGE=600), \
+                mock.patch.object(connection, 'is_usable',
+                                  return_value=False), \
+                mock.patch.object(connection, 'close') as close:
+            db.check_connections(sender=None)
+        close.assert_called_once_with()
+
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class SeedYatubeTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def seed(self, **options):
+        call_command(
+            'seed_yatube', users=20, groups=2, posts=40, comments=30,
+            follows=3, batch_size=7, stdout=StringIO(), **options
+        )
+
+    def texts(self):
+        return list(Post.objects.order_by('pk').values_list('text', flat=True))
+
+    def test_same_seed_gives_same_data(self):
+        """Одно зерно даёт одинаковые данные, другое — другие."""
+        self.seed(seed=3)
+        first = self.texts()
+        self.seed(seed=3)
+        self.assertEqual(self.texts(), first * 2)
+        self.seed(seed=4)
+        self.assertNotEqual(self.texts()[80:], first)
+
+    def snapshot(self):
+        return (
+            list(User.objects.order_by('pk').values_list('username')),
+            list(Group.objects.order_by('pk').values_list('slug')),
+            list(Post.objects.order_by('pk').values_list(
+                'text', 'pub_date', 'author__username')),
+        )
+
+    def test_data_independent_of_existing_rows(self):
+        """Имена и даты не зависят от строк в базе и от времени запуска."""
+        self.seed(seed=3)
+        first = self.snapshot()
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        User.objects.create_user(username='somebody')
+        Group.objects.create(title='Чужая', slug='group-0')
+        self.seed(seed=3)
+        users, groups, posts = self.snapshot()
+        self.assertEqual((users[1:], groups[1:], posts), first)
+
+    def test_end_date(self):
+        self.seed(end=date(2020, 1, 1))
+        dates = Post.objects.values_list('pub_date', flat=True)
+        self.assertLess(max(dates), datetime(2020, 1, 1, tzinfo=timezone.utc))
+        self.assertGreater(
+            min(dates), datetime(2019, 1, 1, tzinfo=timezone.utc)
+        )
+
+    def test_posts_with_images(self):
+        """С --images часть постов получает картинки."""
+        self.seed(images=1)
+        self.assertFalse(Post.objects.filter(image='').exists())
+        self.assertTrue(Post.objects.first().image.storage.exists(
+            Post.objects.first().image.name))
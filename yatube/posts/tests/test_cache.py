@@ -0,0 +1,295 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache, caches
+from django.template import Context, Template
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from core import swr
+from core.cache import InstrumentedTieredCache, NamespacedLRUCache
+
+User = get_user_model()
+
+
+class TieredCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.cache = self.worker()
+
+    def worker(self, **options):
+        """Экземпляр кэша, как у отдельного процесса сервера."""
+        return InstrumentedTieredCache(
+            os.path.join(self.directory, 'cache.sqlite3'),
+            {'OPTIONS': options},
+        )
+
+    def test_values_round_trip(self):
+        self.cache.set('answer', {'value': 42})
+        self.cache.set_many({'a': 1, 'b': None})
+        self.assertEqual(self.cache.get('answer'), {'value': 42})
+        self.assertEqual(
+            self.cache.get_many(['a', 'b', 'c']), {'a': 1, 'b': None}
+        )
+        self.assertEqual(self.cache.get('c', 'default'), 'default')
+        self.cache.delete_many(['a', 'b'])
+        self.assertEqual(self.cache.get_many(['a', 'b']), {})
+
+    def test_values_are_copies(self):
+        """Изменение полученного объекта не меняет значение в кэше."""
+        self.cache.set('list', [1])
+        self.cache.get('list').append(2)
+        self.assertEqual(self.cache.get('list'), [1])
+
+    def test_writes_reach_other_workers(self):
+        """Запись одного процесса сбрасывает L1 другого."""
+        other = self.worker()
+        self.cache.set('key', 'old')
+        self.assertEqual(other.get('key'), 'old')
+        self.cache.set('key', 'new')
+        self.assertEqual(other.get('key'), 'new')
+        self.cache.delete('key')
+        self.assertIsNone(other.get('key'))
+        other.set('key', 'other')
+        self.cache.clear()
+        self.assertIsNone(other.get('key'))
+
+    def test_add_and_incr_are_shared(self):
+        other = self.worker()
+        self.assertTrue(self.cache.add('counter', 1))
+        self.assertFalse(other.add('counter', 5))
+        self.assertEqual(other.incr('counter'), 2)
+        self.assertEqual(self.cache.incr('counter', 10), 12)
+        self.assertEqual(other.get('counter'), 12)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_expired_values(self):
+        self.cache.set('short', 'value', 1)
+        self.assertTrue(self.cache.has_key('short'))
+        self.assertTrue(self.cache.touch('short', 60))
+        self.cache.set('gone', 'value', -1)
+        self.assertFalse(self.cache.has_key('gone'))
+        self.assertTrue(self.cache.add('gone', 'again'))
+
+    def test_l1_timeout(self):
+        """Запись L1 живёт не дольше L1_TIMEOUT, дальше читается L2."""
+        cache = self.worker(L1_TIMEOUT=0.05)
+        cache.set('key', 'value')
+        time.sleep(0.1)
+        self.assertEqual(cache.get('key'), 'value')
+        self.assertEqual(cache.stats()['l2_hits'], 1)
+
+    def test_stats_by_tier(self):
+        other = self.worker()
+        self.cache.set('key', 'value')
+        self.cache.get('key')
+        other.get('key')
+        other.get('key')
+        other.get('missing')
+        other.stats()
+        stats = self.cache.stats()
+        self.assertEqual(
+            (stats['l1_hits'], stats['l2_hits'], stats['misses']), (2, 1, 1)
+        )
+        self.assertEqual(stats['l1_ratio'], 0.5)
+        self.assertEqual(stats['entries'], 1)
+
+
+class StaleWhileRevalidateTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.calls = []
+
+    def compute(self, value='fresh', delay=0):
+        def compute():
+            self.calls.append(value)
+            time.sleep(delay)
+            return value
+        return compute
+
+    def test_value_computed_once(self):
+        for _ in range(2):
+            value = swr.get_or_compute('key', self.compute(), 60)
+            self.assertEqual(value, 'fresh')
+        self.assertEqual(self.calls, ['fresh'])
+        self.assertIsNone(cache.get('key:recompute'))
+
+    def test_stale_value_served_during_recompute(self):
+        """Пока другой запрос держит замок, отдаётся прежняя версия."""
+        swr.get_or_compute('key', self.compute('old'), 60, version=1)
+        cache.add('key:recompute', 1)
+        value = swr.get_or_compute('key', self.compute('new'), 60, version=2)
+        self.assertEqual(value, 'old')
+        cache.delete('key:recompute')
+        value = swr.get_or_compute('key', self.compute('new'), 60, version=2)
+        self.assertEqual(value, 'new')
+        self.assertEqual(self.calls, ['old', 'new'])
+
+    @override_settings(SWR_WAIT=0.1)
+    def test_computes_when_lock_holder_is_slow(self):
+        cache.add('key:recompute', 1)
+        value = swr.get_or_compute('key', self.compute(), 60)
+        self.assertEqual(value, 'fresh')
+
+    def test_concurrent_misses_compute_once(self):
+        """Одновременные промахи ждут один пересчёт, а не делают свои."""
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(
+                swr.get_or_compute('key', self.compute(delay=0.2), 60)
+            ))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ['fresh'] * 5)
+        self.assertEqual(self.calls, ['fresh'])
+
+    def test_early_expiration(self):
+        """XFetch пересчитывает значение до срока, если ему так выпало."""
+        swr.get_or_compute('key', self.compute('old', delay=0.05), 1)
+        with mock.patch('core.swr.random.random', return_value=0.5):
+            swr.get_or_compute('key', self.compute('new'), 1)
+        # Пересчёт шёл 0,05 с, а выпавший множитель — около 28.
+        with mock.patch('core.swr.random.random', return_value=1 - 1e-12):
+            value = swr.get_or_compute('key', self.compute('new'), 1)
+        self.assertEqual(value, 'new')
+        self.assertEqual(self.calls, ['old', 'new'])
+
+    def test_uncacheable_result_not_stored(self):
+        swr.get_or_compute('key', self.compute(), 60, cacheable=bool)
+        swr.get_or_compute('key', self.compute(''), 60, cacheable=bool)
+        self.assertEqual(cache.get('key')[0], 'fresh')
+
+    def test_decorator(self):
+        @swr.cached(lambda number: f'square:{number}', 60)
+        def square(number):
+            self.calls.append(number)
+            return number * number
+        self.assertEqual([square(3), square(3), square(4)], [9, 9, 16])
+        self.assertEqual(self.calls, [3, 4])
+
+    def test_template_tag(self):
+        template = Template(
+            '{% load swr %}{% cache_swr 60 fragment name version=version %}'
+            '{{ value }}{% endcache_swr %}'
+        )
+
+        def render(**context):
+            return template.render(Context({'name': 'a', **context}))
+
+        self.assertEqual(render(value=1, version=1), '1')
+        self.assertEqual(render(value=2, version=1), '1')
+        self.assertEqual(render(value=3, version=2), '3')
+        self.assertEqual(render(value=4, version=2, name='b'), '4')
+
+
+class NamespacedLRUCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.cache = NamespacedLRUCache(self.id(), {'OPTIONS': {
+            'NAMESPACES': {
+                'feeds': {'PREFIXES': ['page:'], 'MAX_BYTES': 1000},
+                'thumbnails': {'PREFIXES': ['thumb:'], 'MAX_BYTES': 1000},
+            },
+            'MAX_BYTES': 1000,
+            'COMPRESS_MIN_SIZE': 100,
+        }})
+
+    def test_namespaces_by_prefix(self):
+        self.assertEqual(self.cache.namespace('page:1'), 'feeds')
+        self.assertEqual(self.cache.namespace('thumb:1'), 'thumbnails')
+        self.assertEqual(self.cache.namespace('other'), 'default')
+
+    def test_large_values_evict_only_their_namespace(self):
+        """Большие страницы не вытесняют мелкие ключи других областей."""
+        self.cache.set('thumb:hot', 'small')
+        for number in range(10):
+            self.cache.set(f'page:{number}', os.urandom(300))
+        self.assertEqual(self.cache.get('thumb:hot'), 'small')
+        stats = self.cache.stats()
+        self.assertLessEqual(stats['feeds']['bytes'], 1000)
+        self.assertGreater(stats['feeds']['evictions'], 0)
+        self.assertEqual(stats['thumbnails']['evictions'], 0)
+
+    def test_least_recently_used_is_evicted(self):
+        for number in range(3):
+            self.cache.set(f'page:{number}', os.urandom(250))
+        self.cache.get('page:0')
+        self.cache.set('page:3', os.urandom(250))
+        self.assertEqual(
+            set(self.cache.get_many([f'page:{n}' for n in range(4)])),
+            {'page:0', 'page:2', 'page:3'},
+        )
+
+    def test_compression(self):
+        """Большие значения сжимаются и читаются без изменений."""
+        text = 'лента ' * 1000
+        self.cache.set('page:text', text)
+        self.assertEqual(self.cache.get('page:text'), text)
+        self.assertLess(self.cache.stats()['feeds']['bytes'], 1000)
+
+    def test_cache_api(self):
+        self.assertTrue(self.cache.add('counter', 1))
+        self.assertFalse(self.cache.add('counter', 5))
+        self.assertEqual(self.cache.incr('counter', 2), 3)
+        self.cache.set('short', 'value', -1)
+        self.assertFalse(self.cache.has_key('short'))
+        self.assertTrue(self.cache.touch('counter', 60))
+        self.cache.delete('counter')
+        self.assertIsNone(self.cache.get('counter'))
+        with self.assertRaises(ValueError):
+            self.cache.incr('counter')
+
+    def test_stats(self):
+        self.cache.set('page:1', 'value')
+        self.cache.get('page:1')
+        self.cache.get_many(['page:1', 'page:2'])
+        stats = self.cache.stats()['feeds']
+        self.assertEqual(
+            (stats['entries'], stats['hits'], stats['misses']), (1, 2, 1)
+        )
+        self.assertEqual(stats['hit_ratio'], round(2 / 3, 4))
+
+
+class CacheStatsPageTest(TestCase):
+    def setUp(self):
+        self.url = reverse('core:cache_stats')
+        self.staff = User.objects.create_user(username='staff', is_staff=True)
+
+    def test_staff_only(self):
+        self.assertEqual(self.client.get(self.url).status_code, 302)
+        self.client.force_login(
+            User.objects.create_user(username='reader')
+        )
+        self.assertEqual(self.client.get(self.url).status_code, 302)
+        self.client.force_login(self.staff)
+        response = self.client.get(self.url)
+        for alias in settings.CACHES:
+            with self.subTest(alias=alias):
+                self.assertContains(response, alias)
+                self.assertContains(response, type(caches[alias]).__name__)
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'core.cache.InstrumentedNamespacedLRUCache',
+        'LOCATION': 'stats-page',
+        'OPTIONS': {
+            'NAMESPACES': {
+                'thumbnails': {'PREFIXES': ['thumb:'], 'MAX_BYTES': 1000},
+            },
+        },
+    }})
+    def test_namespaces_listed(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(self.url)
+        self.assertContains(response, 'thumbnails')
+        self.assertContains(response, 'evictions')
@@ -1,12 +1,14 @@
 import shutil
 import tempfile
 # from http import HTTPStatus
+from io import BytesIO
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
-# from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 # from django.urls import reverse
+from PIL import Image
 
 from posts.forms import PostForm
 from posts.models import Group, Post
@@ -146,3 +148,58 @@ class PostFormTests(TestCase):
     #     self.assertEqual(title_help_text, 'Введите текст поста')
     #     self.assertEqual
     #     (group_help_text, 'Выберите группу в которой будет опубликован пост')
+
+
+def image_file(name, size, image_format, mode='RGB', **params):
+    content = BytesIO()
+    Image.new(mode, size, 'red').save(content, image_format, **params)
+    return SimpleUploadedFile(name, content.getvalue())
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, POST_IMAGE_MAX_SIZE=(100, 100))
+class ImageUploadTests(TestCase):
+    def form(self, image):
+        return PostForm(data={'text': 'С картинкой'}, files={'image': image})
+
+    def test_image_downscaled_and_stripped(self):
+        """Картинка уменьшается, поворачивается по EXIF и теряет метаданные."""
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        exif[0x010F] = 'Камера'
+        form = self.form(image_file(
+            'photo.jpeg', (400, 200), 'JPEG', exif=exif.tobytes()))
+        self.assertTrue(form.is_valid(), form.errors)
+        upload = form.cleaned_data['image']
+        self.assertEqual(upload.name, 'photo.jpg')
+        saved = Image.open(upload)
+        self.assertEqual(saved.size, (50, 100))
+        self.assertEqual(dict(saved.getexif()), {})
+
+    def test_transparent_image_kept_as_png(self):
+        """Прозрачность сохраняется в PNG, непрозрачный PNG станет JPEG."""
+        form = self.form(image_file('logo.png', (40, 40), 'PNG', mode='LA'))
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(form.cleaned_data['image'].name, 'logo.jpg')
+        content = BytesIO()
+        Image.new('RGBA', (40, 40), (255, 0, 0, 0)).save(content, 'PNG')
+        form = self.form(SimpleUploadedFile('clear.png', content.getvalue()))
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(form.cleaned_data['image'].name, 'clear.png')
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=10_000)
+    def test_huge_image_rejected(self):
+        """Картинка с огромным числом пикселей отклоняется до распаковки."""
+        form = self.form(image_file('huge.png', (200, 200), 'PNG'))
+        self.assertFalse(form.is_valid())
+        self.assertEqual(
+            form.errors.as_data()['image'][0].code, 'too_many_pixels'
+        )
+
+    def test_unchanged_image_not_processed(self):
+        """При правке поста без новой картинки старая не перекодируется."""
+        user = User.objects.create_user(username='painter')
+        post = Post.objects.create(
+            author=user, text='Пост', image='posts/legacy.gif')
+        form = PostForm(data={'text': 'Правка'}, instance=post)
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(form.save().image.name, 'posts/legacy.gif')
@@ -0,0 +1,100 @@
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from posts import counters, orphans
+from posts.models import Post, StoredImage
+from posts.storage import post_image_storage
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x01\x00\x01\x00\x00\x00\x00\x21\xf9\x04'
+    b'\x01\x0a\x00\x01\x00\x2c\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02'
+    b'\x02\x4c\x01\x00\x3b'
+)
+
+
+def upload(name='small.gif', content=SMALL_GIF):
+    return SimpleUploadedFile(name, content, content_type='image/gif')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ContentAddressedStorageTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='painter')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def create_post(self, image):
+        return Post.objects.create(author=self.user, text='Пост', image=image)
+
+    def references(self, name):
+        return StoredImage.objects.get(name=name).references
+
+    def test_same_content_stored_once(self):
+        """Одинаковые картинки хранятся одним файлом с именем по хэшу."""
+        first = self.create_post(upload('one.gif'))
+        second = self.create_post(upload('two.GIF'))
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertRegex(first.image.name, r'^posts/[0-9a-f]{2}/[0-9a-f]{64}'
+                                           r'\.gif$')
+        self.assertEqual(
+            os.listdir(os.path.dirname(first.image.path)),
+            [os.path.basename(first.image.name)],
+        )
+        self.assertEqual(self.references(first.image.name), 2)
+
+    def test_references_follow_edits_and_deletes(self):
+        post = self.create_post(upload())
+        old = post.image.name
+        post.image = upload(content=SMALL_GIF + b'\0')
+        post.save()
+        self.assertEqual(self.references(old), 0)
+        self.assertEqual(self.references(post.image.name), 1)
+        post.delete()
+        self.assertEqual(self.references(post.image.name), 0)
+
+    def test_recount_repairs_references(self):
+        post = self.create_post(upload())
+        StoredImage.objects.all().delete()
+        counters.recount()
+        self.assertEqual(self.references(post.image.name), 1)
+
+    def test_gc_media_removes_orphans_with_thumbnails(self):
+        """gc_media удаляет файлы без ссылок и их миниатюры, но не свежие."""
+        kept = self.create_post(upload())
+        post = self.create_post(upload(content=SMALL_GIF + b'\0'))
+        orphan = post.image.name
+        post.delete()
+        stray = post_image_storage.save('posts/stray.gif', upload())
+        later = post_image_storage.save(
+            'posts/stray.gif', upload(content=SMALL_GIF + b'\0\0'))
+        call_command('gc_media', stdout=StringIO())
+        self.assertTrue(post_image_storage.exists(orphan))
+
+        # Миниатюры и записи о них удаляет хранилище ключей sorl.
+        with mock.patch.object(orphans.default.kvstore, 'delete') as forget:
+            removed, _ = orphans.collect(min_age=timedelta(minutes=-1))
+        self.assertEqual(
+            {call.args[0].name for call in forget.call_args_list},
+            {orphan, later},
+        )
+        self.assertEqual(removed, 2)
+        self.assertFalse(post_image_storage.exists(orphan))
+        self.assertFalse(StoredImage.objects.filter(name=orphan).exists())
+        self.assertTrue(post_image_storage.exists(kept.image.name))
+        self.assertEqual(stray, kept.image.name)
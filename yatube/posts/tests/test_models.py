@@ -1,7 +1,14 @@
+import os
+from io import StringIO
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
 from django.test import TestCase
 
-from ..models import Group, Post
+from ..management.commands import explain_feeds
+from ..models import Comment, Follow, Group, Post, UserStats
 
 User = get_user_model()
 
@@ -29,3 +36,68 @@ class PostModelTest(TestCase):
         expected_object_name = group.title
         self.assertEqual(expected_object_post, str(post))
         self.assertEqual(expected_object_name, str(group))
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='counted')
+        cls.reader = User.objects.create_user(username='reader')
+
+    def test_counters_follow_writes(self):
+        """Счётчики меняются вместе с постами, комментариями и подписками."""
+        post = Post.objects.create(author=self.author, text='Пост')
+        comment = Comment.objects.create(
+            post=post, author=self.reader, text='Комментарий')
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        stats = UserStats.objects.get(user=self.author)
+        self.assertEqual(stats.posts_count, 1)
+        self.assertEqual(stats.followers_count, 1)
+        self.assertEqual(
+            UserStats.objects.get(user=self.reader).following_count, 1)
+        comment.delete()
+        follow.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).followers_count, 0)
+
+    def test_recount_counters_repairs_drift(self):
+        """Команда recount_counters исправляет расхождения."""
+        Post.objects.create(author=self.author, text='Пост')
+        UserStats.objects.filter(user=self.author).update(posts_count=7)
+        call_command('recount_counters', stdout=StringIO())
+        stats = UserStats.objects.get(user=self.author)
+        self.assertEqual(stats.posts_count, 1)
+
+
+class FixtureTest(TestCase):
+    def test_data_fixture_loads(self):
+        """Фикстура data.json из репозитория загружается целиком."""
+        call_command(
+            'loaddata', os.path.join(settings.BASE_DIR, 'data.json'),
+            stdout=StringIO(),
+        )
+        self.assertTrue(Post.objects.filter(updated_at__isnull=False).exists())
+        self.assertFalse(Post.objects.filter(updated_at__isnull=True).exists())
+
+
+class FeedIndexesTest(TestCase):
+    def test_feeds_use_indexes(self):
+        """Ленты, включая ленту подписок, читаются по индексам."""
+        cache.clear()
+        author = User.objects.create_user(username='indexed')
+        reader = User.objects.create_user(username='indexed_reader')
+        Follow.objects.create(user=reader, author=author)
+        Post.objects.create(author=author, text='Пост')
+        queries = explain_feeds.Command().feed_queries()
+        for title, queryset in queries:
+            with self.subTest(title=title):
+                plan = queryset.explain().splitlines()
+                self.assertEqual(
+                    [line for line in plan if explain_feeds.is_problem(line)],
+                    [],
+                )
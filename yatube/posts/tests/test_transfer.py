@@ -0,0 +1,92 @@
+import gzip
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.test import TestCase
+
+from posts import transfer
+from posts.models import Comment, Follow, Group, Post, User
+
+
+class ContentTransferTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='writer')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(title='Группа', slug='moved')
+        for i in range(5):
+            post = Post.objects.create(
+                author=cls.author, group=cls.group, text=f'Пост {i}')
+            Comment.objects.create(
+                post=post, author=cls.reader, text=f'Ответ {i}')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.directory = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        cls.path = os.path.join(cls.directory, 'content.ndjson.gz')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(cls.directory, ignore_errors=True)
+
+    def export(self):
+        call_command('export_content', self.path, stdout=StringIO())
+
+    def load(self, **options):
+        call_command('import_content', self.path, stdout=StringIO(),
+                     **options)
+
+    def test_export_is_gzipped_ndjson(self):
+        """Выгрузка — gzip с заголовком и объектом JSON на строку."""
+        self.export()
+        with gzip.open(self.path, 'rt', encoding='utf-8') as lines:
+            rows = [json.loads(line) for line in lines]
+        self.assertEqual(rows[0]['format'], transfer.FORMAT)
+        kinds = [row['kind'] for row in rows[1:]]
+        self.assertEqual(kinds.count('post'), 5)
+        self.assertEqual(kinds.count('follow'), 1)
+
+    def test_import_remaps_posts_and_keeps_dates(self):
+        """Загрузка сдвигает id постов, а комментарии идут за постами."""
+        self.export()
+        dates = set(Post.objects.values_list('pub_date', flat=True))
+        self.load(batch_size=2)
+        self.assertEqual(Post.objects.count(), 10)
+        self.assertEqual(Comment.objects.count(), 10)
+        self.assertEqual(User.objects.count(), 2)
+        self.assertEqual(Follow.objects.count(), 1)
+        copies = Post.objects.order_by('-pk')[:5]
+        for copy in copies:
+            self.assertEqual(copy.author, self.author)
+            self.assertEqual(copy.group, self.group)
+            self.assertEqual(copy.comments.get().text,
+                             copy.text.replace('Пост', 'Ответ'))
+            self.assertEqual(copy.comments_count, 1)
+        self.assertEqual(set(copy.pub_date for copy in copies), dates)
+        self.assertFalse(os.path.exists(f'{self.path}.state'))
+
+    def test_import_resumes(self):
+        """Прерванная загрузка продолжается с сохранённой строки."""
+        self.export()
+        importer = transfer.Importer(self.path, batch_size=1)
+        importer.flush = self.fail_after(importer.flush, 6)
+        with self.assertRaises(RuntimeError):
+            importer.run()
+        self.assertEqual(Post.objects.count(), 8)
+        self.load()
+        self.assertEqual(Post.objects.count(), 10)
+        self.assertEqual(Comment.objects.count(), 10)
+
+    def fail_after(self, flush, calls):
+        def wrapper(*args):
+            wrapper.calls += 1
+            if wrapper.calls > calls:
+                raise RuntimeError('Сбой загрузки')
+            return flush(*args)
+        wrapper.calls = 0
+        return wrapper
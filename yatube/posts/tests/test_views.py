@@ -1,7 +1,20 @@
+import base64
+import json
+import time
+from http import HTTPStatus
+from unittest import mock
+
 from django import forms
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase, override_settings
+from django.core.paginator import EmptyPage, Page
+from django.db import transaction
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
+from core.middleware import QueryBudgetExceeded
+from posts import cards, feed_cache, search, thumbnails, timeline, utils
 from posts.models import Group, Post, Follow, Comment
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.cache import cache
@@ -11,6 +24,21 @@ import shutil
 
 
 User = get_user_model()
+# Курсоры, которые можно собрать вручную: значения не тех типов.
+HOSTILE_CURSORS = (
+    [[1, 2], False],
+    [[True, True], False],
+    [[None, None], False],
+    [['2020-01-01T00:00:00', '1'], False],
+    [{'a': 1, 'b': 2}, False],
+    [[[1], [2]], True],
+)
+
+
+def hostile(payload):
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
 
@@ -183,13 +211,55 @@ class PostTests(TestCase):
         """Проверяем работу кэша"""
         url = reverse('posts:index')
         responce = self.client.get(url)
-        Post.objects.last().delete()
+        Post.objects.filter(pk=self.post.pk).update(text='Без сигналов')
         cached_responce = self.client.get(url)
         cache.clear()
         not_cached_responce = self.client.get(url)
         self.assertEqual(cached_responce.content, responce.content)
         self.assertNotEqual(not_cached_responce.content, responce.content)
 
+    def test_cache_dropped_on_changes(self):
+        """Изменения постов, групп и комментариев сразу видны на страницах."""
+        author = self.post2.author
+        changes = {
+            reverse('posts:index'): lambda: Post.objects.create(
+                author=self.user, text='Новый пост'),
+            reverse('posts:groups', kwargs={'slug': self.post2.group.slug}):
+            lambda: Post.objects.get(pk=self.post2.pk).save(),
+            reverse('posts:profile', kwargs={'username': author.username}):
+            lambda: Post.objects.create(author=author, text='Новый пост'),
+        }
+        for url, change in changes.items():
+            with self.subTest(url=url):
+                # Правка в обход сигналов: страница узнает о ней только
+                # после change(), а карточка поста — по updated_at.
+                Post.objects.filter(pk=self.post2.pk).update(
+                    text='Старый', updated_at=timezone.now())
+                self.client.get(url)
+                Post.objects.filter(pk=self.post2.pk).update(
+                    text='Правка', updated_at=timezone.now())
+                self.assertNotContains(self.client.get(url), 'Правка')
+                change()
+                self.assertContains(self.client.get(url), 'Правка')
+
+    def test_cache_dropped_on_comment(self):
+        """Новый комментарий сбрасывает кэш страницы поста."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post2.id})
+        self.client.get(url)
+        Comment.objects.bulk_create([
+            Comment(post=self.post2, author=self.user, text='Тихий')])
+        self.assertNotContains(self.client.get(url), 'Тихий')
+        Comment.objects.create(post=self.post2, author=self.user, text='Да')
+        self.assertContains(self.client.get(url), 'Тихий')
+
+    def test_cache_dropped_on_group_change(self):
+        """Правка группы сбрасывает кэш всех лент."""
+        url = reverse('posts:index')
+        self.client.get(url)
+        Post.objects.filter(pk=self.post2.pk).update(text='Правка')
+        self.post2.group.save()
+        self.assertContains(self.client.get(url), 'Правка')
+
     def test_post_for_follower(self):
         """
         Новая запись пользователя появляется в ленте тех,
@@ -266,6 +336,89 @@ class PostTests(TestCase):
             ).exists())
 
 
+class TimelineTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='timeline_author')
+        cls.reader = User.objects.create_user(username='timeline_reader')
+        cls.old_post = Post.objects.create(
+            author=cls.author,
+            text='Пост до подписки',
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def feed(self):
+        response = self.reader_client.get(reverse('posts:follow_index'))
+        return list(response.context['page_obj'])
+
+    def test_follow_backfills_and_unfollow_prunes(self):
+        """Подписка заполняет ленту, отписка очищает её."""
+        self.reader_client.get(reverse(
+            'posts:profile_follow', kwargs={'username': self.author}))
+        new_post = Post.objects.create(author=self.author, text='Новый пост')
+        self.assertEqual(self.feed(), [new_post, self.old_post])
+        self.reader_client.get(reverse(
+            'posts:profile_unfollow', kwargs={'username': self.author}))
+        self.assertEqual(self.feed(), [])
+        self.assertFalse(self.reader.timeline.exists())
+
+    def test_feed_pages_by_timeline_keyset(self):
+        """Лента подписок листается курсором по датам записей ленты."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        posts = [self.old_post] + [
+            Post.objects.create(author=self.author, text=f'Пост {number}')
+            for number in range(utils.COUNT + 2)
+        ]
+        self.assertEqual(
+            list(self.reader.timeline.values_list('pub_date', flat=True)
+                 .order_by('post_id')),
+            [post.pub_date for post in posts],
+        )
+        url = reverse('posts:follow_index')
+        page = self.reader_client.get(url).context['page_obj']
+        self.assertEqual(list(page), posts[::-1][:utils.COUNT])
+        page = self.reader_client.get(
+            url, {'cursor': page.next_cursor}
+        ).context['page_obj']
+        self.assertEqual(list(page), posts[::-1][utils.COUNT:])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_prolific_author_merged_on_read(self):
+        """Посты популярного автора подмешиваются в ленту при чтении."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        cache.clear()
+        new_post = Post.objects.create(author=self.author, text='Новый пост')
+        self.assertFalse(self.reader.timeline.exists())
+        self.assertEqual(self.feed(), [new_post, self.old_post])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=2)
+    def test_posts_kept_when_author_drops_below_limit(self):
+        """
+        Посты и подписки, пропущенные при раскладке, пока автор был
+        популярным, не пропадают из ленты после отписок.
+        """
+        others = [
+            User.objects.create_user(username=f'timeline_other_{number}')
+            for number in range(2)
+        ]
+        for user in others:
+            Follow.objects.create(user=user, author=self.author)
+        new_post = Post.objects.create(author=self.author, text='Новый пост')
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.filter(user__in=others).delete()
+        self.assertEqual(self.feed(), [new_post, self.old_post])
+        cache.clear()
+        self.assertEqual(self.feed(), [new_post, self.old_post])
+        timeline.rebuild()
+        self.assertEqual(self.feed(), [new_post, self.old_post])
+        self.assertEqual(self.reader.timeline.count(), 2)
+
+
 class TestComment(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -336,6 +489,7 @@ class PaginatorViewsTest(TestCase):
         Post.objects.bulk_create(cls.posts)
 
     def setUp(self):
+        cache.clear()
         self.guest_client = Client()
         self.user = User.objects.create_user(username='max888')
         self.authorized_client = Client()
@@ -367,3 +521,562 @@ class PaginatorViewsTest(TestCase):
         for tested_url in list_urls.keys():
             response = self.client.get(tested_url)
             self.assertEqual(len(response.context['page_obj']), 3)
+
+    def test_cursor_pages(self):
+        """Курсорная пагинация листает ленту вперёд и назад."""
+        url = reverse('posts:groups', kwargs={'slug': self.group.slug})
+        first_page = self.client.get(url).context['page_obj']
+        self.assertIsNone(first_page.previous_cursor)
+        second_page = self.client.get(
+            url, {'cursor': first_page.next_cursor}).context['page_obj']
+        self.assertEqual(len(second_page), 3)
+        self.assertIsNone(second_page.next_cursor)
+        self.assertFalse(set(first_page) & set(second_page))
+        back_page = self.client.get(
+            url, {'cursor': second_page.previous_cursor}).context['page_obj']
+        self.assertEqual(list(back_page), list(first_page))
+
+    def test_cursor_page_helpers(self):
+        """Помощники Page работают и на курсорной странице."""
+        url = reverse('posts:groups', kwargs={'slug': self.group.slug})
+        first_page = self.client.get(url).context['page_obj']
+        self.assertIs(type(first_page), Page)
+        self.assertTrue(first_page.has_next())
+        self.assertFalse(first_page.has_previous())
+        self.assertTrue(first_page.has_other_pages())
+        self.assertEqual(first_page.next_page_number(),
+                         first_page.next_cursor)
+        self.assertEqual(
+            (first_page.start_index(), first_page.end_index()), (1, 10))
+        second_page = self.client.get(
+            url, {'cursor': first_page.next_cursor}).context['page_obj']
+        self.assertFalse(second_page.has_next())
+        self.assertTrue(second_page.has_previous())
+        self.assertIsNone(second_page.start_index())
+        with self.assertRaises(EmptyPage):
+            second_page.next_page_number()
+
+    def test_approximate_count(self):
+        """Число записей оценивается без COUNT(*) по всей таблице."""
+        paginator = utils.CursorPaginator(Post.objects.all(), 10)
+        with self.assertNumQueries(1) as queries:
+            self.assertGreaterEqual(paginator.approximate_count(), 13)
+        self.assertNotIn('COUNT', queries.captured_queries[0]['sql'])
+        grouped = utils.CursorPaginator(self.group.posts.all(), 10)
+        self.assertEqual(grouped.approximate_count(), 13)
+
+    def test_invalid_cursor_returns_first_page(self):
+        """Повреждённый курсор открывает первую страницу."""
+        response = self.client.get(reverse('posts:index'), {'cursor': 'bad'})
+        self.assertEqual(len(response.context['page_obj']), 10)
+
+    def test_hostile_cursors_return_first_page(self):
+        """Курсор с чужими типами значений не роняет ленту."""
+        for payload in HOSTILE_CURSORS:
+            with self.subTest(payload=payload):
+                response = self.client.get(
+                    reverse('posts:index'), {'cursor': hostile(payload)})
+                self.assertEqual(len(response.context['page_obj']), 10)
+
+
+class QueryCountTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(title='Группа', slug='queries')
+        for i in range(12):
+            author = User.objects.create_user(username=f'author{i}')
+            post = Post.objects.create(
+                author=author, group=cls.group, text=f'Пост {i}')
+            Comment.objects.create(post=post, author=cls.reader, text='Да')
+            Follow.objects.create(user=cls.reader, author=author)
+        cls.post = post
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_pages_make_fixed_number_of_queries(self):
+        """Число запросов страницы не зависит от числа постов на ней."""
+        # Адрес: (число запросов, сколько всего постов в ленте).
+        pages = {
+            reverse('posts:index'): (2, 12),
+            reverse('posts:groups', kwargs={'slug': self.group.slug}): (2, 12),
+            reverse('posts:profile', kwargs={'username': 'author0'}): (2, 1),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}):
+                (2, None),
+        }
+        for count in (5, 10):
+            cache.clear()
+            with mock.patch.object(utils, 'COUNT', count):
+                for url, (queries, total) in pages.items():
+                    with self.subTest(url=url, count=count), \
+                            self.assertNumQueries(queries):
+                        response = self.client.get(url)
+                    if total is not None:
+                        self.assertEqual(
+                            len(response.context['page_obj']),
+                            min(count, total),
+                        )
+
+    def test_follow_index_makes_fixed_number_of_queries(self):
+        """Лента подписок строится за фиксированное число запросов."""
+        # Сессия читается из кэша, а пользователь — из базы, пока его
+        # нет в кэше.
+        for count in (5, 10):
+            cache.clear()
+            self.reader_client.force_login(self.reader)
+            with self.subTest(count=count), \
+                    mock.patch.object(utils, 'COUNT', count), \
+                    self.assertNumQueries(3):
+                response = self.reader_client.get(
+                    reverse('posts:follow_index'))
+            self.assertEqual(len(response.context['page_obj']), count)
+
+
+class QueryBudgetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='measured')
+        Post.objects.create(author=cls.user, text='Пост')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_server_timing_header(self):
+        """Ответ содержит число запросов, время базы, шаблонов и кэш."""
+        timing = self.client.get(reverse('posts:index'))['Server-Timing']
+        self.assertIn('desc="2 queries"', timing)
+        for metric in ('db;dur=', 'tpl;dur=', 'cache;desc=', 'total;dur='):
+            self.assertIn(metric, timing)
+
+    @override_settings(QUERY_BUDGETS={'posts:index': 1})
+    def test_budget_exceeded(self):
+        """Превышение бюджета запросов — ошибка в строгом режиме."""
+        with self.assertRaises(QueryBudgetExceeded):
+            self.client.get(reverse('posts:index'))
+        cache.clear()
+        with override_settings(QUERY_BUDGET_STRICT=False), \
+                self.assertLogs('core.metrics', 'WARNING'):
+            self.client.get(reverse('posts:index'))
+
+
+class ColdCacheBudgetTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='cold', password='pw')
+        cls.author = User.objects.create_user(username='pictured')
+        cls.group = Group.objects.create(title='Холодная', slug='cold')
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='С картинкой',
+            image='posts/cold.gif',
+        )
+        Comment.objects.create(post=cls.post, author=cls.user, text='Да')
+        Follow.objects.create(user=cls.user, author=cls.author)
+
+    def test_pages_fit_budgets_with_cold_cache(self):
+        """
+        С пустым кэшем сессия, пользователь и записи о миниатюрах читаются
+        из базы, но страницы укладываются в бюджеты.
+        """
+        self.assertTrue(settings.QUERY_BUDGET_STRICT)
+        self.client.login(username='cold', password='pw')
+        pages = (
+            reverse('posts:index'),
+            reverse('posts:groups', args=[self.group.slug]),
+            reverse('posts:profile', args=[self.author.username]),
+            reverse('posts:post_detail', args=[self.post.pk]),
+            reverse('posts:comments', args=[self.post.pk]),
+            reverse('posts:follow_index'),
+            reverse('posts:search') + '?q=картинкой',
+        )
+        for url in pages:
+            with self.subTest(url=url), \
+                    mock.patch.object(thumbnails, 'schedule'):
+                cache.clear()
+                self.assertEqual(
+                    self.client.get(url).status_code, HTTPStatus.OK)
+
+
+class AnonymousPageCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='cached')
+        cls.post = Post.objects.create(author=cls.user, text='Кэш')
+
+    def setUp(self):
+        cache.clear()
+        self.url = reverse('posts:index')
+
+    def test_anonymous_page_served_from_cache(self):
+        """Повторный запрос анонима не обращается к базе."""
+        self.client.get(self.url)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertContains(response, 'Кэш')
+        self.assertTrue(response.has_header('ETag'))
+
+    def test_conditional_get(self):
+        """На совпадающий If-None-Match отдаётся 304."""
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        Post.objects.create(author=self.user, text='Новый')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_edit_not_hidden_by_if_modified_since(self):
+        """Правка поста не прячется за 304 по If-Modified-Since."""
+        response = self.client.get(self.url)
+        self.assertFalse(response.has_header('Last-Modified'))
+        self.post.text = 'Правка'
+        self.post.save()
+        response = self.client.get(
+            self.url, HTTP_IF_MODIFIED_SINCE=http_date(time.time() + 60)
+        )
+        self.assertContains(response, 'Правка')
+
+    def test_authorized_user_bypasses_cache(self):
+        """Авторизованный пользователь получает свою страницу."""
+        self.client.get(self.url)
+        self.client.force_login(self.user)
+        response = self.client.get(self.url)
+        self.assertContains(response, 'Новая запись')
+        self.assertFalse(response.has_header('ETag'))
+
+
+class GroupFeedTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='grouped')
+        cls.group = Group.objects.create(title='Своя', slug='own')
+        cls.other = Group.objects.create(title='Чужая', slug='other')
+        cls.post = Post.objects.create(
+            author=cls.user, group=cls.group, text='Свой пост')
+        Post.objects.create(author=cls.user, group=cls.other, text='Чужой')
+        Post.objects.create(author=cls.user, text='Без группы')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+        self.url = reverse('posts:groups', kwargs={'slug': self.group.slug})
+
+    def latest_texts(self):
+        return [post.text for post in feed_cache.group_latest(self.group.pk)]
+
+    def test_group_page_shows_only_group_posts(self):
+        """Лента группы содержит только посты этой группы."""
+        for url in (self.url, self.url + '?page=1'):
+            with self.subTest(url=url):
+                page_obj = self.client.get(url).context['page_obj']
+                self.assertEqual(list(page_obj), [self.post])
+
+    def test_latest_posts_cached(self):
+        """Свежие посты группы берутся из кэша до изменений в группе."""
+        self.assertEqual(self.latest_texts(), ['Свой пост'])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.latest_texts(), ['Свой пост'])
+
+    def test_latest_posts_follow_changes(self):
+        """Кэш свежих постов сбрасывается при переносе и удалении постов."""
+        self.latest_texts()
+        moved = Post.objects.get(text='Чужой')
+        moved.group = self.group
+        moved.save()
+        self.assertEqual(self.latest_texts(), ['Чужой', 'Свой пост'])
+        moved.group = self.other
+        moved.save()
+        self.assertEqual(self.latest_texts(), ['Свой пост'])
+        Post.objects.get(pk=self.post.pk).delete()
+        self.assertEqual(self.latest_texts(), [])
+
+    def test_author_rename_refreshes_feeds(self):
+        """Новое имя автора видно в свежих постах группы и на страницах."""
+        self.client.logout()
+        self.client.get(self.url)
+        feed_cache.group_latest(self.group.pk)
+        version = feed_cache.version()
+        user = User.objects.get(pk=self.user.pk)
+        user.last_login = timezone.now()
+        user.save(update_fields=['last_login'])
+        self.assertEqual(feed_cache.version(), version)
+        user.first_name = 'Переименованный'
+        user.save()
+        self.assertNotEqual(feed_cache.version(), version)
+        self.assertEqual(
+            feed_cache.group_latest(self.group.pk)[0].author.first_name,
+            'Переименованный',
+        )
+        self.assertContains(self.client.get(self.url), 'Переименованный')
+
+
+class SearchTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='searcher')
+        cls.post = Post.objects.create(
+            author=cls.user, text='Морские котики <b>ныряют</b> глубоко')
+        cls.other = Post.objects.create(author=cls.user, text='Про лес')
+        Comment.objects.create(
+            post=cls.other, author=cls.user, text='Котики гуляют в лесу')
+
+    def found(self, query):
+        response = self.client.get(reverse('posts:search'), {'q': query})
+        return response.context['results']
+
+    def test_search_posts_and_comments(self):
+        """Поиск находит посты по тексту поста и комментариев."""
+        self.assertEqual(set(self.found('котики')), {self.post, self.other})
+        self.assertEqual(self.found('морские котики'), [self.post])
+        self.assertEqual(self.found('мор*'), [self.post])
+        self.assertEqual(self.found('жирафы'), [])
+
+    def test_snippet_is_highlighted_and_escaped(self):
+        """Найденные слова подсвечены, а разметка из текста экранирована."""
+        snippet = self.found('ныряют')[0].snippet
+        self.assertIn('<mark>ныряют</mark>', snippet)
+        self.assertIn('&lt;b&gt;', snippet)
+
+    def test_index_follows_changes(self):
+        """Индекс обновляется при правке и удалении."""
+        self.post.text = 'Теперь про жирафов'
+        self.post.save()
+        self.assertEqual(self.found('морские'), [])
+        self.assertEqual(self.found('жирафов'), [self.post])
+        self.other.comments.all().delete()
+        self.assertEqual(self.found('гуляют'), [])
+
+    def test_portable_index(self):
+        """Без FTS5 поиск работает по таблице SearchTerm."""
+        with mock.patch.object(search, '_use_fts', False):
+            search.rebuild()
+            self.assertEqual(self.found('морские котики'), [self.post])
+            self.assertEqual(self.found('лес*'), [self.other])
+            snippet = self.found('ныряют')[0].snippet
+            self.assertIn('<mark>ныряют</mark>', snippet)
+
+    def test_admin_search_stays_in_sql(self):
+        """Поиск в админке фильтрует посты подзапросом, без списка номеров."""
+        for use_fts in (search.uses_fts(), False):
+            with self.subTest(use_fts=use_fts), \
+                    mock.patch.object(search, '_use_fts', use_fts):
+                search.rebuild()
+                found = Post.objects.filter(
+                    pk__in=search.post_ids('котики'))
+                self.assertIn('SELECT', str(found.query).split(' IN ', 1)[1])
+                self.assertEqual(set(found), {self.post, self.other})
+                self.assertFalse(
+                    Post.objects.filter(pk__in=search.post_ids('!!')))
+
+    def test_admin_changelist_search(self):
+        """Список постов в админке ищет через тот же индекс."""
+        admin = User.objects.create_superuser('root', 'root@example.com', 'x')
+        self.client.force_login(admin)
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'котики'})
+        self.assertEqual(
+            set(response.context['cl'].result_list), {self.post, self.other})
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailPipelineTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='painter')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def create_post(self, name='pending.gif'):
+        return Post.objects.create(
+            author=self.user,
+            text='С картинкой',
+            image=SimpleUploadedFile(name, PostTests.small_gif,
+                                     content_type='image/gif'),
+        )
+
+    def test_thumbnails_scheduled_on_save(self):
+        """Миниатюры заказываются при создании поста и смене картинки."""
+        with mock.patch.object(thumbnails, 'schedule') as schedule:
+            post = self.create_post()
+            post.text = 'Только текст'
+            post.save()
+            self.assertEqual(schedule.call_count, 1)
+            # Та же картинка под другим именем — тот же файл и миниатюры.
+            post.image = SimpleUploadedFile(
+                'same.gif', PostTests.small_gif, content_type='image/gif')
+            post.save()
+            self.assertEqual(schedule.call_count, 1)
+            post.image = SimpleUploadedFile(
+                'other.gif', PostTests.small_gif + b'\0',
+                content_type='image/gif')
+            post.save()
+        self.assertEqual(schedule.call_count, 2)
+
+    def test_original_shown_while_pending(self):
+        """Пока миниатюры нет, страница показывает оригинал."""
+        cache.clear()
+        post = self.create_post()
+        with mock.patch.object(thumbnails, 'schedule') as schedule:
+            response = self.client.get(
+                reverse('posts:post_detail', kwargs={'post_id': post.id}))
+        self.assertContains(response, post.image.url)
+        schedule.assert_called_once_with(post.image.name)
+
+    def test_ready_thumbnail_refreshes_cached_pages(self):
+        """Готовая миниатюра сдвигает поколения страниц с этим постом."""
+        post = self.create_post()
+        names = (f'post:{post.pk}', f'profile:{self.user.pk}', 'index')
+        versions = feed_cache.version(*names)
+        with mock.patch.object(thumbnails, 'get_thumbnail'), \
+                mock.patch.object(thumbnails, 'connections'):
+            thumbnails.generate(post.image.name)
+        self.assertNotEqual(feed_cache.version(*names), versions)
+
+
+class ThumbnailScheduleTest(TransactionTestCase):
+    def test_rolled_back_schedule_can_be_repeated(self):
+        """Заказ из откатившейся транзакции не мешает заказать снова."""
+        name = 'posts/rolled_back.gif'
+        self.addCleanup(thumbnails._pending.discard, name)
+        with mock.patch.object(thumbnails, '_submit') as submit:
+            with self.assertRaises(ValueError), transaction.atomic():
+                thumbnails.schedule(name)
+                raise ValueError
+            submit.assert_not_called()
+            thumbnails.schedule(name)
+            thumbnails.schedule(name)
+        submit.assert_called_once_with(name)
+
+
+class CommentPaginationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='talker')
+        cls.post = Post.objects.create(author=cls.user, text='Обсуждаемый')
+        for number in range(45):
+            Comment.objects.create(
+                post=cls.post, author=cls.user, text=f'Ответ номер {number}'
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def more_link(self, response):
+        return response.context['comments'].next_cursor
+
+    def test_comments_load_in_pages(self):
+        """Пост показывает первую страницу, остальные подгружаются."""
+        response = self.client.get(
+            reverse('posts:post_detail', args=[self.post.pk]))
+        self.assertEqual(len(response.context['comments']), 20)
+        self.assertContains(response, 'Ответ номер 44')
+        self.assertEqual(
+            response.context['comments'][-1].text, 'Ответ номер 25')
+        self.assertContains(response, 'Показать ещё (25)')
+        url = reverse('posts:comments', args=[self.post.pk])
+        texts = []
+        cursor, shown = self.more_link(response), 20
+        while cursor:
+            with self.assertNumQueries(2):
+                response = self.client.get(
+                    url, {'cursor': cursor, 'shown': shown})
+            comments = response.context['comments']
+            texts.extend(comment.text for comment in comments)
+            cursor, shown = comments.next_cursor, comments.shown
+        self.assertEqual(
+            texts, [f'Ответ номер {number}' for number in range(24, -1, -1)]
+        )
+        self.assertNotContains(response, 'Показать ещё')
+
+    def test_cached_comments_not_queried(self):
+        """Если фрагмент комментариев в кэше, их страница не читается."""
+        url = reverse('posts:post_detail', args=[self.post.pk])
+        self.client.force_login(self.user)
+        self.client.get(url)
+        with mock.patch('posts.utils.comment_page') as comment_page:
+            self.client.get(url)
+        comment_page.assert_not_called()
+
+
+class PostCardCacheTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='carded')
+        cls.group = Group.objects.create(title='Карточки', slug='cards')
+        cls.post = Post.objects.create(
+            author=cls.user, group=cls.group, text='Карточка')
+
+    def setUp(self):
+        cache.clear()
+
+    def render_count(self, *urls):
+        with mock.patch(
+            'posts.cards.render_to_string', wraps=cards.render_to_string
+        ) as render:
+            for url in urls:
+                self.assertContains(self.client.get(url), 'Карточка')
+        return render.call_count
+
+    def test_card_rendered_once_per_kind(self):
+        """
+        Карточка поста рендерится один раз для каждого вида: главная и
+        подписки показывают одну и ту же, группа и профиль — свои.
+        """
+        reader = User.objects.create_user(username='card_reader')
+        Follow.objects.create(user=reader, author=self.user)
+        self.client.force_login(reader)
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:follow_index'),
+            reverse('posts:groups', args=[self.group.slug]),
+            reverse('posts:profile', args=[self.user.username]),
+            reverse('posts:index'),
+        ]
+        self.assertEqual(self.render_count(*urls), 3)
+
+    def test_card_follows_post_version(self):
+        """Правка поста меняет ключ карточки, она рендерится заново."""
+        url = reverse('posts:profile', args=[self.user.username])
+        self.render_count(url)
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Карточка после правки'
+        post.save()
+        self.assertEqual(self.render_count(url), 1)
+        self.assertContains(self.client.get(url), 'Карточка после правки')
+
+    def test_cards_read_in_one_call(self):
+        """Все карточки страницы читаются из кэша одним get_many."""
+        posts = list(Post.objects.for_feed()) + [
+            Post.objects.create(author=self.user, text=f'Ещё {number}')
+            for number in range(3)
+        ]
+        cards.render(posts)
+        with mock.patch.object(
+            cards.cache, 'get_many', wraps=cards.cache.get_many
+        ) as get_many, self.assertNumQueries(0):
+            self.assertEqual(len(cards.render(posts)), 4)
+        card_reads = [
+            call for call in get_many.call_args_list
+            if call[0][0][0].startswith('card:')
+        ]
+        self.assertEqual(len(card_reads), 1)
+
+    def test_card_without_thumbnail_not_cached(self):
+        """Карточку с картинкой без готовой миниатюры рендерят заново."""
+        Post.objects.filter(pk=self.post.pk).update(image='posts/a.gif')
+        post = Post.objects.for_feed().get(pk=self.post.pk)
+        with mock.patch.object(thumbnails, 'ready', return_value=None), \
+                mock.patch.object(thumbnails, 'schedule'):
+            cards.render([post])
+            key = cards.card_key(post, feed_cache.version())
+            self.assertIsNone(cache.get(key))
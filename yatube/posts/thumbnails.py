@@ -0,0 +1,133 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections, transaction
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import EMPTY_VALUE
+from sorl.thumbnail.models import KVStore
+
+from . import feed_cache
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+# Все миниатюры, которые показывают шаблоны ленты и страницы поста.
+GEOMETRIES = (
+    ('960x339', {'upscale': True}),
+    ('960x339', {'crop': 'center', 'upscale': True}),
+)
+
+_executor = None
+_pending = set()
+_lock = threading.Lock()
+
+
+def _thumbnail_file(name, geometry, options):
+    """Файл миниатюры с теми же именем и опциями, что выберет sorl."""
+    backend = default.backend
+    source = ImageFile(name)
+    options = dict(options)
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(key, value)
+    return ImageFile(
+        backend._get_thumbnail_filename(source, geometry, options),
+        default.storage,
+    )
+
+
+def ready(name, geometry, **options):
+    """Готовая миниатюра из хранилища sorl или None, ничего не создаёт."""
+    return default.kvstore.get(_thumbnail_file(name, geometry, options))
+
+
+def prefetch(names):
+    """
+    Загружает в кэш sorl записи о миниатюрах всех картинок ленты одним
+    запросом, чтобы ready() для каждой из них не ходил в базу отдельно.
+    """
+    kv_cache = getattr(default.kvstore, 'cache', None)
+    keys = [
+        add_prefix(_thumbnail_file(name, geometry, options).key)
+        for name in set(filter(None, names))
+        for geometry, options in GEOMETRIES
+    ]
+    if kv_cache is None or not keys:
+        return
+    missing = set(keys) - set(kv_cache.get_many(keys))
+    if not missing:
+        return
+    found = dict(
+        KVStore.objects.filter(key__in=missing).values_list('key', 'value')
+    )
+    kv_cache.set_many(
+        {key: found.get(key, EMPTY_VALUE) for key in missing},
+        sorl_settings.THUMBNAIL_CACHE_TIMEOUT,
+    )
+
+
+def refresh_posts(name):
+    """
+    Сдвигает поколения лент и страниц с постами этой картинки: их
+    фрагменты, закэшированные до миниатюры, показывают оригинал.
+    """
+    names = set()
+    posts = Post.objects.filter(image=name).only('pk', 'author', 'group')
+    for post in posts.iterator():
+        names.update(feed_cache.post_names(post, post.group_id))
+    feed_cache.bump(*names)
+
+
+def generate(name):
+    """Создаёт все миниатюры картинки из GEOMETRIES."""
+    try:
+        for geometry, options in GEOMETRIES:
+            get_thumbnail(name, geometry, **options)
+        refresh_posts(name)
+    except Exception:
+        logger.exception('Не удалось создать миниатюры для %s', name)
+    finally:
+        with _lock:
+            _pending.discard(name)
+        connections.close_all()
+
+
+def _submit(name):
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails',
+            )
+    _executor.submit(generate, name)
+
+
+def schedule(name):
+    """
+    Ставит картинку в очередь фоновых потоков, если её там ещё нет.
+    Задача уходит после фиксации транзакции, чтобы поток видел файл и пост.
+    """
+    if not name:
+        return
+
+    def submit():
+        # Имя попадает в очередь только после фиксации: при откате
+        # транзакции картинку можно будет заказать снова.
+        with _lock:
+            if name in _pending:
+                return
+            _pending.add(name)
+        _submit(name)
+    transaction.on_commit(submit)
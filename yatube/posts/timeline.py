@@ -0,0 +1,145 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import F, Q
+
+from core import swr
+
+from .models import Follow, Post, TimelineEntry, UserStats
+
+BATCH_SIZE = 500
+# Как долго кэшируется список популярных авторов, в секундах.
+PROLIFIC_TIMEOUT = 5 * 60
+PROLIFIC_KEY = 'timeline:prolific_authors'
+# Ключ сортировки ленты подписок для CursorPaginator: поля записи ленты.
+ORDERING = ('feed_date', 'feed_id')
+
+
+def prolific_authors():
+    """
+    Популярные авторы: их посты не раскладываются по лентам при записи,
+    а подмешиваются при чтении, иначе каждый пост стоил бы тысяч вставок.
+    Множество кэшируется для чтения; лишний автор в устаревшем множестве
+    безвреден, поэтому запись решает по флагу в базе (is_prolific).
+    """
+    def collect():
+        return set(UserStats.objects.filter(
+            prolific=True
+        ).values_list('user_id', flat=True))
+    return swr.get_or_compute(PROLIFIC_KEY, collect, PROLIFIC_TIMEOUT)
+
+
+def is_prolific(author_id):
+    return UserStats.objects.filter(user_id=author_id, prolific=True).exists()
+
+
+def promote(author_id):
+    """
+    Помечает автора популярным, когда подписчиков стало не меньше
+    TIMELINE_FANOUT_LIMIT. Флаг не снимается при отписках: посты и
+    подписки, пропущенные при раскладке, иначе пропали бы из лент.
+    Снимает флаги только rebuild(), заново раскладывая все ленты.
+    """
+    promoted = UserStats.objects.filter(
+        user_id=author_id,
+        prolific=False,
+        followers_count__gte=settings.TIMELINE_FANOUT_LIMIT,
+    ).update(prolific=True)
+    if promoted:
+        cache.delete(PROLIFIC_KEY)
+
+
+def _bulk_add(entries):
+    TimelineEntry.objects.bulk_create(
+        entries, batch_size=BATCH_SIZE, ignore_conflicts=True
+    )
+
+
+def fan_out(post):
+    """Добавляет новый пост в ленты всех подписчиков автора."""
+    if is_prolific(post.author_id):
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True)
+    _bulk_add(
+        TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+        for user_id in followers.iterator()
+    )
+
+
+def backfill(user_id, author_id):
+    """Заполняет ленту подписчика постами автора, на которого он подписался."""
+    if is_prolific(author_id):
+        return
+    posts = Post.objects.filter(
+        author_id=author_id
+    ).values_list('id', 'pub_date')
+    _bulk_add(
+        TimelineEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+        for post_id, pub_date in posts.iterator()
+    )
+
+
+def prune(user_id, author_id):
+    """Убирает из ленты посты автора после отписки."""
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id
+    ).delete()
+
+
+def rebuild():
+    """
+    Заново раскладывает посты по лентам всех подписчиков одним запросом
+    INSERT ... SELECT, например после массовой загрузки данных, и заново
+    расставляет флаги популярных авторов по числу подписчиков.
+    Возвращает число записей в лентах.
+    """
+    popular = Q(followers_count__gte=settings.TIMELINE_FANOUT_LIMIT)
+    UserStats.objects.filter(popular).update(prolific=True)
+    UserStats.objects.exclude(popular).update(prolific=False)
+    cache.delete(PROLIFIC_KEY)
+    TimelineEntry.objects.all().delete()
+    pairs = Follow.objects.exclude(
+        author_id__in=prolific_authors()
+    ).filter(author__posts__isnull=False).values_list(
+        'user_id', 'author__posts__id', 'author__posts__pub_date'
+    ).order_by()
+    sql, params = pairs.query.sql_with_params()
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'INSERT INTO {} ({}, {}, {}) {}'.format(
+                quote(TimelineEntry._meta.db_table),
+                quote(TimelineEntry._meta.get_field('user').column),
+                quote(TimelineEntry._meta.get_field('post').column),
+                quote(TimelineEntry._meta.get_field('pub_date').column),
+                sql,
+            ),
+            params,
+        )
+    return TimelineEntry.objects.count()
+
+
+def feed(user):
+    """
+    Посты ленты подписок, отсортированные по ORDERING: предрассчитанные
+    записи пользователя плюс посты популярных авторов, на которых он
+    подписан (гибридный режим). Без популярных авторов лента листается
+    по индексу (user, pub_date, post) записей ленты.
+    """
+    prolific = prolific_authors()
+    if not prolific:
+        posts = Post.objects.filter(timeline_entries__user=user).annotate(
+            feed_date=F('timeline_entries__pub_date'),
+            feed_id=F('timeline_entries__post_id'),
+        )
+    else:
+        entries = TimelineEntry.objects.filter(user=user).values('post')
+        followed = Follow.objects.filter(
+            user=user, author__in=prolific
+        ).values('author')
+        posts = Post.objects.filter(
+            Q(id__in=entries) | Q(author__in=followed)
+        ).annotate(feed_date=F('pub_date'), feed_id=F('id'))
+    return posts.order_by('-feed_date', '-feed_id')
@@ -0,0 +1,218 @@
+import gzip
+import json
+import os
+from datetime import datetime
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.db.models import F
+from django.utils.dateparse import parse_datetime
+
+from . import seeding
+from .models import Comment, Follow, Group, Post, User
+
+FORMAT = 'yatube-content'
+VERSION = 1
+CHUNK_SIZE = 2000
+
+
+class TransferError(Exception):
+    pass
+
+
+def _exports():
+    # Пользователи и группы передаются по естественным ключам (username и
+    # slug), посты и комментарии — по id, которые при импорте сдвигаются.
+    return (
+        ('user', User.objects.values(
+            'username', 'first_name', 'last_name', 'email', 'date_joined')),
+        ('group', Group.objects.values('slug', 'title', 'description')),
+        ('post', Post.objects.values(
+            'id', 'text', 'pub_date', 'image',
+            author_name=F('author__username'), group_slug=F('group__slug'))),
+        ('comment', Comment.objects.values(
+            'id', 'post_id', 'text', 'created',
+            author_name=F('author__username'))),
+        ('follow', Follow.objects.values(
+            user_name=F('user__username'),
+            author_name=F('author__username'))),
+    )
+
+
+def _encode(value):
+    # DjangoJSONEncoder обрезает время до миллисекунд, а даты должны
+    # переехать точно.
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} не сериализуется в JSON')
+
+
+def export(path, chunk_size=CHUNK_SIZE):
+    """
+    Выгружает содержимое в NDJSON, сжатый gzip. Строки читаются из базы
+    порциями через iterator(), поэтому память не зависит от объёма данных.
+    Возвращает число выгруженных объектов каждого вида.
+    """
+    counts = {}
+    with gzip.open(path, 'wt', encoding='utf-8') as output:
+        output.write(json.dumps({'format': FORMAT, 'version': VERSION}))
+        output.write('\n')
+        for kind, rows in _exports():
+            counts[kind] = 0
+            for row in rows.order_by('pk').iterator(chunk_size=chunk_size):
+                output.write(json.dumps(
+                    {'kind': kind, **row},
+                    default=_encode, ensure_ascii=False,
+                ))
+                output.write('\n')
+                counts[kind] += 1
+    return counts
+
+
+def _ids(model, field, values):
+    return dict(
+        model.objects.filter(**{f'{field}__in': set(values)})
+        .values_list(field, 'pk')
+    )
+
+
+class Importer:
+    """
+    Загружает выгрузку export() пачками через bulk_create. Номер последней
+    записанной строки и сдвиги id хранятся в файле состояния, поэтому
+    прерванную загрузку можно продолжить: повторно записанная пачка ничего
+    не меняет, так как у постов и комментариев id заданы явно, а остальное
+    сверяется по естественным ключам.
+    """
+
+    def __init__(self, path, batch_size=CHUNK_SIZE, restart=False):
+        self.path = path
+        self.state_path = f'{path}.state'
+        self.batch_size = batch_size
+        if restart and os.path.exists(self.state_path):
+            os.remove(self.state_path)
+        self.state = self.load_state()
+        self.password = make_password(None)
+        self.counts = {}
+
+    def load_state(self):
+        if os.path.exists(self.state_path):
+            with open(self.state_path) as state:
+                return json.load(state)
+        return {
+            'line': 0,
+            'post_offset': seeding.last_id(Post),
+            'comment_offset': seeding.last_id(Comment),
+        }
+
+    def save_state(self):
+        with open(self.state_path, 'w') as state:
+            json.dump(self.state, state)
+
+    def run(self):
+        """Загружает выгрузку; возвращает число строк каждого вида."""
+        self.save_state()
+        with gzip.open(self.path, 'rt', encoding='utf-8') as lines:
+            self.check_header(next(lines, None))
+            kind, batch, number = None, [], 0
+            for number, line in enumerate(lines, 1):
+                if number <= self.state['line']:
+                    continue
+                row = json.loads(line)
+                if batch and (row['kind'] != kind
+                              or len(batch) >= self.batch_size):
+                    self.flush(kind, batch, number - 1)
+                    batch = []
+                kind = row.pop('kind')
+                batch.append(row)
+            if batch:
+                self.flush(kind, batch, number)
+        for model in (Post, Comment):
+            seeding.reset_sequences(model)
+        os.remove(self.state_path)
+        return self.counts
+
+    def check_header(self, line):
+        try:
+            header = json.loads(line or '')
+        except ValueError:
+            header = None
+        if not isinstance(header, dict) or header.get('format') != FORMAT:
+            raise TransferError(f'{self.path}: это не выгрузка {FORMAT}')
+        if header.get('version') != VERSION:
+            raise TransferError(
+                f'{self.path}: неизвестная версия {header.get("version")}'
+            )
+
+    def flush(self, kind, batch, last_line):
+        handler = getattr(self, f'import_{kind}', None)
+        if handler is None:
+            raise TransferError(f'Неизвестный вид объектов: {kind}')
+        try:
+            with transaction.atomic():
+                handler(batch)
+        except KeyError as error:
+            raise TransferError(
+                f'Строки до {last_line}: нет объекта с ключом {error}'
+            )
+        self.counts[kind] = self.counts.get(kind, 0) + len(batch)
+        self.state['line'] = last_line
+        self.save_state()
+
+    def import_user(self, rows):
+        existing = _ids(User, 'username', [row['username'] for row in rows])
+        User.objects.bulk_create(
+            User(password=self.password, date_joined=parse_datetime(
+                row.pop('date_joined')), **row)
+            for row in rows if row['username'] not in existing
+        )
+
+    def import_group(self, rows):
+        existing = _ids(Group, 'slug', [row['slug'] for row in rows])
+        Group.objects.bulk_create(
+            Group(**row) for row in rows if row['slug'] not in existing
+        )
+
+    def import_post(self, rows):
+        authors = _ids(User, 'username', [row['author_name'] for row in rows])
+        groups = _ids(Group, 'slug', [row['group_slug'] for row in rows])
+        offset = self.state['post_offset']
+        with seeding.manual_dates(Post._meta.get_field('pub_date')):
+            Post.objects.bulk_create((
+                Post(
+                    pk=row['id'] + offset,
+                    text=row['text'],
+                    pub_date=parse_datetime(row['pub_date']),
+                    image=row['image'],
+                    author_id=authors[row['author_name']],
+                    group_id=groups.get(row['group_slug']),
+                )
+                for row in rows
+            ), ignore_conflicts=True)
+
+    def import_comment(self, rows):
+        authors = _ids(User, 'username', [row['author_name'] for row in rows])
+        with seeding.manual_dates(Comment._meta.get_field('created')):
+            Comment.objects.bulk_create((
+                Comment(
+                    pk=row['id'] + self.state['comment_offset'],
+                    post_id=row['post_id'] + self.state['post_offset'],
+                    text=row['text'],
+                    created=parse_datetime(row['created']),
+                    author_id=authors[row['author_name']],
+                )
+                for row in rows
+            ), ignore_conflicts=True)
+
+    def import_follow(self, rows):
+        users = _ids(User, 'username', [
+            name for row in rows
+            for name in (row['user_name'], row['author_name'])
+        ])
+        Follow.objects.bulk_create((
+            Follow(
+                user_id=users[row['user_name']],
+                author_id=users[row['author_name']],
+            )
+            for row in rows
+        ), ignore_conflicts=True)
@@ -1,10 +1,256 @@
-from django.core.paginator import Paginator
+import base64
+import binascii
+import hashlib
+import json
+from types import MethodType
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import EmptyPage, Page, Paginator
+from django.db import models
+from django.db.models import Max, Q
+
+from core import swr
 
 COUNT = 10
+# Сколько комментариев показывается сразу и подгружается за раз.
+COMMENTS_COUNT = 20
+# Сколько секунд хранится число записей отфильтрованной ленты.
+APPROXIMATE_COUNT_TIMEOUT = 60
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def encode_cursor(values, reverse=False):
+    """Упаковывает значения ключа сортировки в непрозрачный токен."""
+    payload = json.dumps(
+        [[value.isoformat() if hasattr(value, 'isoformat') else value
+          for value in values], reverse],
+        separators=(',', ':'),
+    )
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Распаковывает токен курсора в кортеж (значения, направление)."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values, reverse = json.loads(base64.urlsafe_b64decode(padded))
+        return values, bool(reverse)
+    except (TypeError, ValueError, binascii.Error, UnicodeDecodeError):
+        raise InvalidCursor(token)
+
+
+class CursorPageMethods:
+    """
+    Помощники Page для курсорной страницы. Номера у неё нет, поэтому они
+    отвечают по курсорам соседних страниц. Страница остаётся экземпляром
+    Page (его ждут шаблоны и тесты ленты), а методы подменяются на ней.
+    """
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def next_page_number(self):
+        """Курсор следующей страницы вместо её номера."""
+        if not self.has_next():
+            raise EmptyPage('Это последняя страница')
+        return self.next_cursor
+
+    def previous_page_number(self):
+        """Курсор предыдущей страницы вместо её номера."""
+        if not self.has_previous():
+            raise EmptyPage('Это первая страница')
+        return self.previous_cursor
+
+    def start_index(self):
+        """
+        Позиция первой записи в ленте (с 1). Она известна только на
+        первой странице, на остальных — None.
+        """
+        if not self.object_list:
+            return 0
+        return None if self.has_previous() else 1
+
+    def end_index(self):
+        start = self.start_index()
+        return start and start + len(self) - 1
 
+    @classmethod
+    def bind(cls, page):
+        for name in ('has_next', 'has_previous', 'next_page_number',
+                     'previous_page_number', 'start_index', 'end_index'):
+            setattr(page, name, MethodType(getattr(cls, name), page))
+        return page
 
-def paginating(request, post_list):
-    paginator = Paginator(post_list, COUNT)
+
+class CursorPaginator(Paginator):
+    """
+    Постраничный вывод по ключу (keyset): вместо OFFSET каждая страница
+    начинается с записи, следующей за курсором, поэтому стоимость запроса
+    не зависит от глубины страницы.
+    """
+
+    def __init__(self, object_list, per_page, ordering=('pub_date', 'id'),
+                 approximate_count=False):
+        super().__init__(object_list, per_page)
+        self.ordering = ordering
+        self.approximate = approximate_count
+
+    def _value(self, item, field):
+        if isinstance(item, dict):
+            return item[field]
+        return getattr(item, field)
+
+    def _convert(self, field, value):
+        # Токен приходит от клиента: тип значения проверяется до
+        # to_python, который на чужих типах падает с TypeError.
+        if isinstance(field, (models.AutoField, models.IntegerField)):
+            valid = isinstance(value, int) and not isinstance(value, bool)
+        else:
+            valid = isinstance(value, str)
+        if not valid:
+            raise InvalidCursor(value)
+        value = field.to_python(value)
+        if value is None:
+            raise InvalidCursor(value)
+        return value
+
+    def _field(self, name):
+        """Поле модели или аннотации запроса, по которому идёт сортировка."""
+        annotation = self.object_list.query.annotations.get(name)
+        if annotation is not None:
+            return annotation.output_field
+        return self.object_list.model._meta.get_field(name)
+
+    def _parse(self, values):
+        if (not isinstance(values, list)
+                or len(values) != len(self.ordering)):
+            raise InvalidCursor(values)
+        try:
+            return [
+                self._convert(self._field(field), value)
+                for field, value in zip(self.ordering, values)
+            ]
+        except (ValidationError, TypeError, ValueError):
+            raise InvalidCursor(values)
+
+    def _seek(self, values, reverse):
+        """Условие «строго после курсора» для составного ключа."""
+        lookup = 'gt' if reverse else 'lt'
+        condition = Q()
+        for position, field in enumerate(self.ordering):
+            step = Q(**{f'{field}__{lookup}': values[position]})
+            for previous, value in zip(self.ordering[:position], values):
+                step &= Q(**{previous: value})
+            condition |= step
+        return condition
+
+    def _position(self, token):
+        if token:
+            try:
+                values, reverse = decode_cursor(token)
+                return self._parse(values), reverse
+            except InvalidCursor:
+                pass
+        return None, False
+
+    def page_queryset(self, token=None):
+        """Запрос одной страницы после курсора: ORDER BY ключа и LIMIT."""
+        values, reverse = self._position(token)
+        order = [field if reverse else f'-{field}' for field in self.ordering]
+        queryset = self.object_list.order_by(*order)
+        if values is not None:
+            queryset = queryset.filter(self._seek(values, reverse))
+        return queryset[:self.per_page + 1]
+
+    def cursor_page(self, token=None, rows=None):
+        """
+        Возвращает страницу, следующую за курсором (или первую). Готовые
+        строки первой страницы, например из кэша, можно передать в rows.
+        """
+        values, reverse = self._position(token)
+        if values is not None or rows is None:
+            rows = list(self.page_queryset(token))
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if reverse:
+            rows.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, values is not None
+        page = CursorPageMethods.bind(Page(rows, None, self))
+        page.is_cursor = True
+        page.next_cursor = page.previous_cursor = None
+        if rows and has_next:
+            page.next_cursor = self._token(rows[-1])
+        if rows and has_previous:
+            page.previous_cursor = self._token(rows[0], reverse=True)
+        page.approximate_count = (
+            self.approximate_count() if self.approximate else None
+        )
+        return page
+
+    def _token(self, item, reverse=False):
+        return encode_cursor(
+            [self._value(item, field) for field in self.ordering], reverse
+        )
+
+    def approximate_count(self):
+        """
+        Оценка числа записей без COUNT(*) по всей таблице: для ленты без
+        фильтров это наибольший первичный ключ (удалённые записи в неё
+        тоже входят). Отфильтрованная лента считается точно, но не чаще
+        раза в APPROXIMATE_COUNT_TIMEOUT секунд.
+        """
+        queryset = self.object_list.order_by()
+        if not queryset.query.where:
+            return queryset.aggregate(last=Max('pk'))['last'] or 0
+        query = str(queryset.query).encode()
+        key = 'paginator_count:' + hashlib.md5(query).hexdigest()
+        return swr.get_or_compute(
+            key, queryset.count, APPROXIMATE_COUNT_TIMEOUT
+        )
+
+
+def paginating(request, post_list, approximate_count=False,
+               first_rows=None, ordering=('pub_date', 'id')):
+    """
+    Страница ленты: по умолчанию курсорная, а для старых ссылок вида
+    ?page=N сохраняется обычная нумерованная пагинация. first_rows
+    возвращает COUNT + 1 первых записей ленты, если они уже есть в кэше.
+    """
+    paginator = CursorPaginator(
+        post_list, COUNT, ordering=ordering,
+        approximate_count=approximate_count,
+    )
     page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    return page_obj
+    if page_number is not None and 'cursor' not in request.GET:
+        page_obj = paginator.get_page(page_number)
+        page_obj.is_cursor = False
+        return page_obj
+    token = request.GET.get('cursor')
+    if not token and first_rows is not None:
+        return paginator.cursor_page(rows=first_rows())
+    return paginator.cursor_page(token)
+
+
+def comment_page(post, token=None, shown=0):
+    """
+    Страница комментариев поста от новых к старым, с авторами. shown —
+    сколько комментариев уже показано до неё: по нему и хранимому
+    счётчику поста видно, сколько осталось, без COUNT по комментариям.
+    """
+    comments = post.comments.select_related('author').only(
+        'id', 'text', 'created', 'post_id', 'author__username',
+    )
+    page = CursorPaginator(
+        comments, COMMENTS_COUNT, ordering=('created', 'id')
+    ).cursor_page(token)
+    page.shown = shown + len(page)
+    page.remaining = max(post.comments_count - page.shown, 0)
+    return page
@@ -5,60 +5,116 @@ from django.shortcuts import get_object_or_404
 from django.contrib.auth import get_user_model
 from .forms import PostForm, CommentForm
 from django.contrib.auth.decorators import login_required
-from posts import utils
+from django.utils.functional import SimpleLazyObject
+from posts import feed_cache, search, timeline, utils
+from posts.decorators import cache_for_anonymous
 
 
 User = get_user_model()
 
 
+def is_following(user, author):
+    """Подписан ли пользователь на автора; аноним не подписан ни на кого."""
+    return user.is_authenticated and Follow.objects.filter(
+        author=author,
+        user=user
+    ).exists()
+
+
+@cache_for_anonymous
 def index(request):
-    post_list = Post.objects.all().order_by('-pub_date')
-    page_obj = utils.paginating(request, post_list)
+    post_list = Post.objects.for_feed()
+    page_obj = utils.paginating(request, post_list, approximate_count=True)
     context = {
         'page_obj': page_obj,
+        **feed_cache.context('index'),
     }
     return render(request, 'posts/index.html', context)
 
 
+@cache_for_anonymous
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    post_list = Post.objects.all().order_by('-pub_date')
-    page_obj = utils.paginating(request, post_list)
+    post_list = group.posts.for_feed()
+    page_obj = utils.paginating(
+        request, post_list,
+        first_rows=lambda: feed_cache.group_latest(group.pk),
+    )
     context = {
         'group': group,
         'page_obj': page_obj,
+        **feed_cache.context(f'group:{group.pk}'),
     }
     return render(request, 'posts/group_list.html', context)
 
 
+@cache_for_anonymous
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    post_list = author.posts.select_related('group')
-    following = request.user.is_authenticated and Follow.objects.filter(
-        author=author,
-        user=request.user
-    ).exists()
+    author = get_object_or_404(
+        User.objects.select_related('stats'),
+        username=username
+    )
+    post_list = author.posts.for_feed()
+    following = is_following(request.user, author)
     page_obj = utils.paginating(request, post_list)
     context = {
         'author': author,
         'page_obj': page_obj,
-        'following': following
+        'following': following,
+        **feed_cache.context(f'profile:{author.pk}'),
     }
     return render(request, 'posts/profile.html', context)
 
 
+@cache_for_anonymous
 def post_detail(request, post_id):
-    post = get_object_or_404(Post.objects.select_related(), id=post_id)
-    comments = post.comments.all()
+    post = get_object_or_404(
+        Post.objects.for_feed().select_related('author__stats'),
+        id=post_id
+    )
     form = CommentForm()
     context = {
         'post': post,
         'form': form,
-        'comments': comments
+        # Страница комментариев читается, только если их фрагмента нет
+        # в кэше.
+        'comments': SimpleLazyObject(lambda: utils.comment_page(post)),
+        **feed_cache.context(f'post:{post.pk}'),
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+@cache_for_anonymous
+def post_comments(request, post_id):
+    """
+    Следующая страница комментариев HTML-фрагментом для кнопки «Показать
+    ещё». Те же комментарии в JSON отдаёт api:comment_list.
+    """
+    post = get_object_or_404(
+        Post.objects.only('id', 'comments_count'), id=post_id
+    )
+    try:
+        shown = max(int(request.GET.get('shown', 0)), 0)
+    except ValueError:
+        shown = 0
+    context = {
+        'post': post,
+        'comments': utils.comment_page(
+            post, request.GET.get('cursor'), shown
+        ),
+    }
+    return render(request, 'posts/includes/comments.html', context)
+
+
+def post_search(request):
+    query = request.GET.get('q', '').strip()
+    context = {
+        'query': query,
+        'results': search.search(query) if query else [],
+    }
+    return render(request, 'posts/search.html', context)
+
+
 @login_required
 def post_create(request):
     form = PostForm(
@@ -110,8 +166,10 @@ def add_comment(request, post_id):
 
 @login_required
 def follow_index(request):
-    posts = Post.objects.filter(author__following__user=request.user)
-    page_obj = utils.paginating(request, posts)
+    posts = timeline.feed(request.user).for_feed()
+    page_obj = utils.paginating(
+        request, posts, ordering=timeline.ORDERING
+    )
     context = {
         'page_obj': page_obj
     }
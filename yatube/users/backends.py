@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+
+
+def user_key(user_id):
+    return f'auth_user:{user_id}'
+
+
+def forget_user(user_id):
+    cache.delete(user_key(user_id))
+
+
+class CachedModelBackend(ModelBackend):
+    """
+    ModelBackend, который берёт пользователя для запроса из кэша, а не из
+    auth_user. Запись сбрасывают сигналы при сохранении и удалении
+    пользователя, в том числе при смене пароля, и при выходе.
+    """
+
+    def get_user(self, user_id):
+        key = user_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is None:
+                return None
+            cache.set(key, user, settings.AUTH_USER_CACHE_TIMEOUT)
+        return user if self.user_can_authenticate(user) else None
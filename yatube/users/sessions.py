@@ -0,0 +1,64 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth import HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.sessions.backends import cached_db
+from django.contrib.sessions.backends.db import SessionStore as DBStore
+
+
+class SessionStore(cached_db.SessionStore):
+    """
+    Сессии в кэше со сквозной записью: каждое сохранение сразу попадает в
+    кэш, а строка django_session обновляется, только когда сессия новая,
+    когда сменился вошедший пользователь или хэш его пароля и когда с
+    прошлой записи в базу прошло SESSION_DB_REFRESH секунд. Если кэш
+    потеряет сессию, пропадут изменения не старше этого срока.
+    """
+    cache_key_prefix = 'django.contrib.sessions.users'
+
+    def __init__(self, session_key=None):
+        super().__init__(session_key)
+        # Когда сессия в последний раз записывалась в базу.
+        self._synced = None
+        self._loaded_auth = (None, None)
+
+    def _auth(self, data):
+        return data.get(SESSION_KEY), data.get(HASH_SESSION_KEY)
+
+    def load(self):
+        try:
+            entry = self._cache.get(self.cache_key)
+        except Exception:
+            entry = None
+        if entry is not None:
+            data, self._synced = entry
+        else:
+            session = self._get_session_from_db()
+            data = self.decode(session.session_data) if session else {}
+            if session:
+                self._synced = time.time()
+                self._cache.set(
+                    self.cache_key, (data, self._synced),
+                    self.get_expiry_age(expiry=session.expire_date),
+                )
+        self._loaded_auth = self._auth(data)
+        return data
+
+    def _db_outdated(self):
+        return (
+            self._synced is None
+            or self._auth(self._get_session()) != self._loaded_auth
+            or time.time() - self._synced >= settings.SESSION_DB_REFRESH
+        )
+
+    def save(self, must_create=False):
+        if self.session_key is None:
+            return self.create()
+        if must_create or self._db_outdated():
+            DBStore.save(self, must_create)
+            self._synced = time.time()
+            self._loaded_auth = self._auth(self._get_session())
+        self._cache.set(
+            self.cache_key, (self._get_session(), self._synced),
+            self.get_expiry_age(),
+        )
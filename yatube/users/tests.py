@@ -0,0 +1,85 @@
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from users.backends import CachedModelBackend, user_key
+from users.sessions import SessionStore
+
+User = get_user_model()
+
+
+class CachedSessionTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='session', password='old-password'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.login(username='session', password='old-password')
+        self.url = reverse('about:author')
+
+    def session_data(self):
+        key = self.client.cookies['sessionid'].value
+        return SessionStore().decode(
+            Session.objects.get(session_key=key).session_data
+        )
+
+    def test_authenticated_request_skips_session_and_user_queries(self):
+        """Сессия и пользователь запроса берутся из кэша."""
+        self.client.get(self.url)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertEqual(response.wsgi_request.user, self.user)
+
+    def test_session_written_to_db_after_refresh_interval(self):
+        """Сессия пишется в базу не чаще, чем раз в SESSION_DB_REFRESH."""
+        session = self.client.session
+        session['theme'] = 'dark'
+        session.save()
+        self.assertNotIn('theme', self.session_data())
+        self.assertEqual(self.client.session['theme'], 'dark')
+        with override_settings(SESSION_DB_REFRESH=0):
+            session.save()
+        self.assertEqual(self.session_data()['theme'], 'dark')
+
+    def test_session_survives_cache_loss(self):
+        """После очистки кэша сессия читается из базы."""
+        cache.clear()
+        response = self.client.get(self.url)
+        self.assertEqual(response.wsgi_request.user, self.user)
+
+    def test_logout_drops_session(self):
+        """Выход удаляет сессию из кэша и базы и забывает пользователя."""
+        key = self.client.cookies['sessionid'].value
+        self.client.get(reverse('users:logout'))
+        self.assertFalse(SessionStore().exists(key))
+        self.assertFalse(Session.objects.filter(session_key=key).exists())
+        self.assertIsNone(cache.get(user_key(self.user.pk)))
+
+    def test_password_change_logs_out_other_sessions(self):
+        """Смена пароля завершает остальные сессии пользователя."""
+        self.client.get(self.url)
+        user = User.objects.get(pk=self.user.pk)
+        user.set_password('new-password')
+        user.save()
+        response = self.client.get(self.url)
+        self.assertFalse(response.wsgi_request.user.is_authenticated)
+
+    def test_user_edit_refreshes_cached_user(self):
+        """Сохранение пользователя обновляет его копию в кэше."""
+        backend = CachedModelBackend()
+        backend.get_user(self.user.pk)
+        User.objects.filter(pk=self.user.pk).update(first_name='Тихо')
+        self.assertEqual(backend.get_user(self.user.pk).first_name, '')
+        user = User.objects.get(pk=self.user.pk)
+        user.first_name = 'Имя'
+        user.save()
+        self.assertEqual(backend.get_user(self.user.pk).first_name, 'Имя')
+        user.is_active = False
+        user.save()
+        self.assertIsNone(backend.get_user(self.user.pk))
@@ -0,0 +1,9 @@
+import os
+
+from django.core.wsgi import get_wsgi_application
+
+from core.asgi import ASGIHandler
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+
+application = ASGIHandler(get_wsgi_application())
@@ -35,15 +35,97 @@ ALLOWED_HOSTS = [
     'testserver',
 ]
 
+# Сессии и пользователи запросов читаются из кэша, см. users.sessions и
+# users.backends. Строка сессии в базе обновляется не чаще раза в
+# SESSION_DB_REFRESH секунд, если не сменился вошедший пользователь.
+SESSION_ENGINE = 'users.sessions'
+SESSION_DB_REFRESH = 5 * 60
+AUTHENTICATION_BACKENDS = ['users.backends.CachedModelBackend']
+AUTH_USER_CACHE_TIMEOUT = 60 * 60
+
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
 
+MB = 2 ** 20
+# Области кэша по префиксам ключей, у каждой свой бюджет памяти: фрагменты
+# лент не вытесняют записи о миниатюрах, сессии и счётчики поколений.
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache.InstrumentedNamespacedLRUCache',
+        'OPTIONS': {
+            'NAMESPACES': {
+                'feeds': {
+                    'PREFIXES': ['page:', 'swr.', 'group_latest:', 'card:'],
+                    'MAX_BYTES': 64 * MB,
+                },
+                'thumbnails': {
+                    'PREFIXES': ['sorl-thumbnail'],
+                    'MAX_BYTES': 8 * MB,
+                },
+                'sessions': {
+                    'PREFIXES': ['django.contrib.sessions', 'auth_user:'],
+                    'MAX_BYTES': 16 * MB,
+                },
+                'counters': {
+                    'PREFIXES': [
+                        'feed_version:', 'paginator_count:', 'timeline:',
+                    ],
+                    'MAX_BYTES': 2 * MB,
+                },
+            },
+            'MAX_BYTES': 16 * MB,
+            'COMPRESS_MIN_SIZE': 4096,
+        },
     }
 }
 
+# Посты авторов, у которых подписчиков не меньше этого числа, не
+# раскладываются по лентам подписчиков, а подмешиваются при чтении.
+TIMELINE_FANOUT_LIMIT = 1000
+
+# Фрагменты лент сбрасываются сигналами моделей, поэтому их можно
+# хранить долго.
+FEED_CACHE_TIMEOUT = 60 * 60 * 6
+
+# Защита кэша от одновременного пересчёта, см. core.swr: сколько живёт
+# замок пересчёта, сколько после срока хранится устаревшее значение,
+# сколько ждать чужого пересчёта, если отдать нечего, и насколько рано
+# (XFetch) значения пересчитываются до срока.
+SWR_LOCK_TIMEOUT = 10
+SWR_STALE_TIMEOUT = 60 * 60
+SWR_WAIT = 2
+SWR_BETA = 1.0
+
+# Сколько фоновых потоков создают миниатюры картинок постов.
+THUMBNAIL_WORKERS = 2
+
+# Сколько потоков выполняют представления за точкой входа ASGI.
+ASGI_THREADS = 8
+
+# Сколько SQL-запросов может сделать страница с холодным кэшем: с чтением
+# сессии, пользователя и записей sorl о миниатюрах. В тестах превышение
+# бюджета — ошибка (см. core.test_runner и conftest.py), иначе —
+# предупреждение в логе core.metrics.
+QUERY_BUDGETS = {
+    'posts:index': 5,
+    'posts:groups': 5,
+    'posts:profile': 6,
+    'posts:post_detail': 5,
+    'posts:comments': 4,
+    'posts:follow_index': 5,
+    'posts:search': 4,
+    'api:post_list': 3,
+    'api:post_detail': 3,
+    'api:comment_list': 4,
+    'api:group_detail': 3,
+    'api:group_posts': 4,
+    'api:profile_detail': 4,
+    'api:profile_posts': 4,
+    'api:follow_list': 4,
+}
+QUERY_BUDGET_STRICT = False
+TEST_RUNNER = 'core.test_runner.StrictBudgetRunner'
+
 #  подключаем движок filebased.EmailBackend
 EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 # указываем директорию, в которую будут складываться файлы писем
@@ -66,6 +148,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -82,7 +165,7 @@ ROOT_URLCONF = 'yatube.urls'
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.template_backends.DjangoTemplates',
         # Добавлено: Искать шаблоны на уровне проекта
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
@@ -101,6 +184,31 @@ TEMPLATES = [
 WSGI_APPLICATION = 'yatube.wsgi.application'
 
 
+# Строки метрик запросов пишутся в консоль только в режиме разработки.
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'require_debug_true': {
+            '()': 'django.utils.log.RequireDebugTrue',
+        },
+    },
+    'handlers': {
+        'metrics': {
+            'level': 'INFO',
+            'filters': ['require_debug_true'],
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'core.metrics': {
+            'handlers': ['metrics'],
+            'level': 'INFO',
+        },
+    },
+}
+
+
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
@@ -110,6 +218,39 @@ DATABASES = {
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
     }
 }
+# Настройки SQLite для нагруженного сайта: читатели не ждут писателей.
+SQLITE_TUNED_PRAGMAS = {
+    # Ожидание блокировки вместо мгновенной ошибки «database is locked».
+    'busy_timeout': 5000,
+    'journal_mode': 'WAL',
+    # В режиме WAL падение процесса не теряет данных, а коммит не ждёт
+    # fsync.
+    'synchronous': 'NORMAL',
+    # Отрицательное значение — в килобайтах: 64 МБ кэша страниц.
+    'cache_size': -64000,
+    'mmap_size': 256 * 2 ** 20,
+    'temp_store': 'MEMORY',
+}
+# PRAGMA для каждого нового соединения SQLite, см. core.db.
+SQLITE_PRAGMAS = {}
+
+# YATUBE_PROFILE=production включает постоянные соединения с базой,
+# которые проверяются перед каждым запросом, и настройки SQLite выше.
+PROFILE = os.environ.get('YATUBE_PROFILE', 'development')
+if PROFILE == 'production':
+    DATABASES['default']['CONN_MAX_AGE'] = 600
+    SQLITE_PRAGMAS = SQLITE_TUNED_PRAGMAS
+    # Процессы сервера делят кэш через файл на том же хосте, а частые
+    # ключи читают из памяти своего процесса.
+    CACHES['default'] = {
+        'BACKEND': 'core.cache.InstrumentedTieredCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+            'L1_MAX_ENTRIES': 1000,
+            'L1_TIMEOUT': 300,
+        },
+    }
 
 
 # Password validation
@@ -155,3 +296,12 @@ STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 MEDIA_URL = '/media/'
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# Хранилище картинок постов: одинаковые файлы хранятся один раз.
+POST_IMAGE_STORAGE = 'posts.storage.ContentAddressedStorage'
+# Загруженные картинки уменьшаются до этого размера и сохраняются заново
+# в этом формате; картинки больше POST_IMAGE_MAX_PIXELS не принимаются.
+POST_IMAGE_MAX_SIZE = (1920, 1920)
+POST_IMAGE_MAX_PIXELS = 40_000_000
+POST_IMAGE_FORMAT = 'JPEG'
+POST_IMAGE_QUALITY = 85